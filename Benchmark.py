@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from typing import Callable, List, Union
+from time import perf_counter
+import subprocess
+import platform
+import tracemalloc
+import resource
+import timeit
+import json
+import sys
+import os
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+def _make_sim(size: int, batched: bool, seed: int = 0):
+    from Sim import Simulation, BatchSimulation
+    from MapUtils import Vector
+    # Keep the density of the default 200x200 field with 50 food
+    side = 200*max(1, (size/50)**0.5)
+    sim_class = BatchSimulation if batched else Simulation
+    return sim_class((Vector(0, 0), Vector(side, side)), seed=seed,
+                     start={'count': size, 'food': size})
+
+def measure(step: Callable[[], Union[bool, int, None]], min_time: float, min_runs: int = 3,
+            reset: Callable[[], None] = None) -> dict:
+    # Calls step until min_time has passed (and at least min_runs times),
+    # or until it returns False. With a reset, False instead means reset
+    # (untimed) and carry on. If step returns how much work it did,
+    # per_second counts that rather than calls. Then runs it a few more
+    # times under tracemalloc to see what memory it needs.
+    runs = units = 0
+    counted = fresh = False
+    elapsed = 0.0
+    start = perf_counter()
+    while runs < min_runs or elapsed + perf_counter() - start < min_time:
+        done = step()
+        if done is False:
+            if reset is None or fresh:
+                break
+            elapsed += perf_counter() - start
+            reset()
+            fresh = True
+            start = perf_counter()
+            continue
+        fresh = False
+        runs += 1
+        if done is not None and done is not True:
+            counted = True
+            units += done
+    elapsed += perf_counter() - start
+
+    blocks = sys.getallocatedblocks()
+    peak = 0
+    tracemalloc.start()
+    traced = 0
+    fresh = False
+    while traced < min(runs, min_runs):
+        if step() is False:
+            if reset is None or fresh:
+                break
+            # Building the next one isn't what is being measured
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            reset()
+            fresh = True
+            tracemalloc.start()
+            continue
+        fresh = False
+        traced += 1
+    peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    return {
+        'runs': runs,
+        'seconds': elapsed,
+        'per_second': (units if counted else runs)/elapsed if elapsed else float('inf'),
+        'peak_traced_kib': peak/1024,
+        'net_blocks': sys.getallocatedblocks() - blocks,
+    }
+
+def bench_tick(size: int, min_time: float, batched: bool = False) -> dict:
+    # A finished generation is started again from scratch, so every call
+    # measured is a real tick of the same workload
+    sim = _make_sim(size, batched)
+    def step():
+        if sim.generation_finished():
+            return False
+        sim.tick_once()
+    def reset():
+        nonlocal sim
+        sim = _make_sim(size, batched)
+    return measure(step, min_time, reset=reset)
+
+def bench_tick_batched(size: int, min_time: float) -> dict:
+    return bench_tick(size, min_time, batched=True)
+
+def bench_sense(size: int, min_time: float) -> dict:
+    # Everything every creature can sense, food and other creatures, as
+    # done once a tick. per_second counts whole population queries.
+    from Sensing import sense
+    sim = _make_sim(size, True)
+    population, food = sim.population, sim.food_batch
+    # Spread them out over the field rather than all on the walls
+    population.positions[:] = sim.np_rng.uniform(
+        (sim.field_space[0].x, sim.field_space[0].y),
+        (sim.field_space[1].x, sim.field_space[1].y), (len(population), 2))
+    def step():
+        sense(population, food, sim.field_space)
+    return measure(step, min_time)
+
+def bench_calculate_turn(size: int, min_time: float) -> dict:
+    # Per creature decisions only, no observers. per_second counts calls
+    # to calculate_turn, only creatures still going are called and the
+    # creatures and food start over once they are all done.
+    sim = active = None
+    def reset():
+        nonlocal sim, active
+        sim = _make_sim(size, False)
+        active = sim.creatures
+    def step():
+        nonlocal active
+        if not active:
+            return False
+        food, field_space, sense_limited = sim.food, sim.field_space, sim.sense_limited
+        for creature in active:
+            creature.calculate_turn(food, field_space, sense_limited)
+        calls = len(active)
+        active = [c for c in active if not c.task_finished and c.energy > 0]
+        return calls
+    reset()
+    return measure(step, min_time, reset=reset)
+
+def bench_geometry(size: int, min_time: float) -> dict:
+    # Micro benchmarks of the geometry types, size is the length of the
+    # VectorArray used for the batch case. Results are operations/second.
+    from MapUtils import Vector, PolarVector, RadianAngle, VectorArray, dist, dist_many
+    import numpy as np
+    a, b = Vector(1.5, 2.5), Vector(3.0, 4.0)
+    p = PolarVector(RadianAngle(0.3), 2.0)
+    points = VectorArray(np.random.default_rng(0).uniform(0, 200, (size, 2)))
+    cases = {
+        'Vector':        lambda: Vector(1.0, 2.0),
+        'Vector.__add__': lambda: a + b,
+        'Vector.__sub__': lambda: a - b,
+        'dist':          lambda: dist(a, b),
+        'PolarVector':   lambda: PolarVector(RadianAngle(0.3), 2.0),
+        'PolarVector.fromVector': lambda: PolarVector.fromVector(a),
+        'PolarVector.angle': lambda: p.angle,
+        'RadianAngle.__add__': lambda: p.angle + 0.1,
+        'dist_many':     lambda: dist_many(points, a),
+    }
+    result = {}
+    for name, fn in cases.items():
+        number, elapsed = timeit.Timer(fn).autorange()
+        while elapsed < min_time/len(cases):
+            number *= 2
+            elapsed = timeit.timeit(fn, number=number)
+        result[name] = number/elapsed
+    return {'per_second': result}
+
+def bench_render(size: int, min_time: float) -> dict:
+    # Draws snapshots with the instanced renderer into an offscreen EGL
+    # context, per_second is frames/second
+    import OffscreenGL
+    from GLRenderer import InstancedRenderer
+    from OpenGL.GL import glFinish
+    sim = _make_sim(size, True)
+    context = OffscreenGL.OffscreenContext(640, 360)
+    renderer = InstancedRenderer(sim.field_space, 640/360)
+    snapshot = sim.snapshot()
+    def step():
+        renderer.render(snapshot, 0.0)
+        glFinish()
+    try:
+        return measure(step, min_time)
+    finally:
+        context.close()
+
+def bench_render_immediate(size: int, min_time: float) -> dict:
+    # The old glBegin/glVertex path of Graphics for comparison, drawn into
+    # an offscreen context without opening a window
+    import OffscreenGL
+    from Graphics import Graphics
+    from MapUtils import Vector
+    from OpenGL.GL import glFinish
+    sim = _make_sim(size, False)
+    context = OffscreenGL.OffscreenContext(640, 360)
+    graphics = Graphics(sim.field_space, Vector(640, 360), instanced=False, fps=None, window=False)
+    creatures, foods = sim.creatures, list(sim.food)
+    def step():
+        graphics.draw_objects(creatures, foods)
+        glFinish()
+    try:
+        return measure(step, min_time)
+    finally:
+        context.close()
+
+BENCHMARKS = {
+    'tick':           bench_tick,
+    'tick_batched':   bench_tick_batched,
+    'sense':          bench_sense,
+    'calculate_turn': bench_calculate_turn,
+    'geometry':       bench_geometry,
+    'render':         bench_render,
+    'render_immediate': bench_render_immediate,
+}
+
+def run(names: List[str], sizes: List[int], min_time: float) -> dict:
+    results = []
+    for name in names:
+        for size in sizes:
+            entry = {'benchmark': name, 'size': size}
+            try:
+                entry.update(BENCHMARKS[name](size, min_time))
+            except Exception as e:
+                # e.g. no OpenGL for the render benchmark
+                entry['skipped'] = f"{type(e).__name__}: {e}"
+            results.append(entry)
+            print(_describe(entry), file=sys.stderr)
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'max_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'results': results,
+    }
+
+def _describe(entry: dict) -> str:
+    head = f"{entry['benchmark']:>16} {entry['size']:>7}"
+    if 'skipped' in entry:
+        return f"{head}  skipped ({entry['skipped']})"
+    if isinstance(entry['per_second'], dict):
+        return head + '  ' + ', '.join(f"{k} {v:,.0f}/s" for k, v in entry['per_second'].items())
+    return f"{head}  {entry['per_second']:>12,.1f}/s  peak {entry['peak_traced_kib']:,.0f} KiB"
+
+def compare(old: dict, new: dict) -> List[str]:
+    # new/old speed ratio for every benchmark present in both, >1 is faster
+    def rates(report):
+        table = {}
+        for entry in report['results']:
+            if 'skipped' in entry:
+                continue
+            per_second = entry['per_second']
+            if not isinstance(per_second, dict):
+                per_second = {'': per_second}
+            for case, value in per_second.items():
+                table[(entry['benchmark'], case, entry['size'])] = value
+        return table
+    before, after = rates(old), rates(new)
+    lines = []
+    for key in sorted(before.keys() & after.keys()):
+        name, case, size = key
+        label = f"{name}{'/' + case if case else ''}"
+        lines.append(f"{label:>40} {size:>7}  x{after[key]/before[key]:.2f}")
+    return lines
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths, headless")
+    parser.add_argument('benchmarks', nargs='*', default=list(BENCHMARKS),
+                        help=f"any of {', '.join(BENCHMARKS)} (default all)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="population and food sizes to run at")
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help="seconds to spend on each benchmark/size")
+    parser.add_argument('--out', help="write the JSON results here instead of stdout")
+    parser.add_argument('--compare', help="JSON results from an earlier run to compare against")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = run(args.benchmarks, args.sizes, args.min_time)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print('\n'.join(compare(old, report)), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from Sim import Simulation, BatchSimulation
+from Tiling import TiledSimulation
+from Observer import Observer
+from Creature import Creature, Food
+from Genome import Genome
+from MapUtils import Vector, RadianAngle
+from Stats import population_arrays
+from typing import Dict, List, Tuple
+from queue import Queue
+import numpy as np
+import threading
+import pickle
+import json
+import io
+import os
+
+FORMAT_VERSION = 1
+ENGINES = {'Simulation': Simulation, 'BatchSimulation': BatchSimulation,
+           'TiledSimulation': TiledSimulation}
+# Engines that keep their state the same way, so one can carry on where
+# another left off with the same results
+BATCHED = ('BatchSimulation', 'TiledSimulation')
+
+def capture(simulation: Simulation) -> Tuple[Dict[str, np.ndarray], dict]:
+    # Copies the full state of a simulation into plain arrays plus a JSON
+    # friendly dict. Cheap enough to do on the simulation thread, the slow
+    # part (compressing and writing) can then happen elsewhere.
+    arrays = {}
+    population = getattr(simulation, 'population', None)
+    if population is not None:
+        arrays['positions'] = population.positions.copy()
+        arrays['headings'] = population.headings.copy()
+        arrays['got_food'] = population.got_food.copy()
+        arrays['task_finished'] = population.task_finished.copy()
+        food = simulation.food_batch
+        arrays['food_positions'] = food.positions.copy()
+        arrays['food_angles'] = food.angles.copy()
+        arrays['food_energy'] = food.energy.copy()
+        arrays['food_slots'] = np.where(food.alive, np.arange(len(food.alive)), -1)
+    else:
+        creatures = simulation.creatures
+        arrays['positions'] = np.array([(c.position.x, c.position.y) for c in creatures],
+                                       dtype=np.float64).reshape(-1, 2)
+        arrays['headings'] = np.array([c.heading for c in creatures], dtype=np.float64)
+        arrays['got_food'] = np.array([c.got_food for c in creatures], dtype=bool)
+        arrays['task_finished'] = np.array([c.task_finished for c in creatures], dtype=bool)
+        # Spawn order and slots, eaten food included, so the food is
+        # numbered and looked up the same after resuming
+        food = simulation.food.spawned
+        arrays['food_slots'] = np.array([-1 if f.slot is None else f.slot for f in food],
+                                        dtype=np.int64)
+        arrays['food_positions'] = np.array([(f.position.x, f.position.y) for f in food],
+                                            dtype=np.float64).reshape(-1, 2)
+        arrays['food_angles'] = np.array([f.angle for f in food], dtype=np.float64)
+        arrays['food_energy'] = np.array([f.energy for f in food], dtype=np.float64)
+    for name, values in population_arrays(simulation).items():
+        arrays[name] = values.copy()
+    genome = simulation.genome
+    genes = population.genes() if population is not None else genome.pack(creatures)
+    for i, name in enumerate(genome.columns):
+        arrays[name] = genes[:, i].copy()
+    arrays['spawner'] = np.frombuffer(pickle.dumps(simulation.spawner), dtype=np.uint8)
+    arrays['selection'] = np.frombuffer(pickle.dumps(simulation.selection), dtype=np.uint8)
+
+    version, state, gauss = simulation.rng.getstate()
+    meta = {
+        'format': FORMAT_VERSION,
+        'engine': type(simulation).__name__,
+        'generation': simulation.generation,
+        'ticks': simulation.ticks,
+        'field_space': [[v.x, v.y] for v in simulation.field_space],
+        'sense_limited': simulation.sense_limited,
+        'fast_forward': simulation.fast_forward,
+        'trig_table': getattr(simulation, 'trig_table', False),
+        'sensing': getattr(simulation, 'sensing', False),
+        'start': simulation.start,
+        'genome': genome.to_json(),
+        'rng': [version, list(state), gauss],
+        'np_rng': simulation.np_rng.bit_generator.state,
+    }
+    if isinstance(simulation, TiledSimulation):
+        meta['tiles'] = list(simulation.tiles)
+        meta['halo'] = simulation.halo
+    return arrays, meta
+
+def write(path: str, arrays: Dict[str, np.ndarray], meta: dict):
+    # Written to a temporary file first so a crash mid-write never
+    # leaves a broken checkpoint behind
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+                        **arrays)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(buffer.getbuffer())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def save_checkpoint(simulation: Simulation, path: str):
+    write(path, *capture(simulation))
+
+def load_checkpoint(path: str, observers: List[Observer] = None, engine: str = None,
+                    **kwargs) -> Simulation:
+    # Rebuilds the simulation saved at path, continuing it gives the same
+    # results as the original run would have. engine switches between the
+    # batched engines (e.g. to spread a batched run over tiles). Extra
+    # keyword arguments (e.g. profiler, tiles) are passed to the
+    # simulation's constructor and win over what the checkpoint says.
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    meta = json.loads(arrays.pop('meta').tobytes())
+    if meta['format'] != FORMAT_VERSION:
+        raise ValueError(f"unsupported checkpoint format {meta['format']}")
+
+    field_space = tuple(Vector(x, y) for x, y in meta['field_space'])
+    spawner = pickle.loads(arrays['spawner'].tobytes())
+    selection = pickle.loads(arrays['selection'].tobytes())
+    if engine is None:
+        engine = meta['engine']
+    elif engine != meta['engine'] and not (engine in BATCHED and meta['engine'] in BATCHED):
+        raise ValueError(f"a {meta['engine']} checkpoint can't be resumed as {engine}")
+    sim_class = ENGINES[engine]
+    if engine == 'TiledSimulation' and meta['engine'] == 'TiledSimulation':
+        kwargs.setdefault('tiles', tuple(meta['tiles']))
+        kwargs.setdefault('halo', meta['halo'])
+    if meta['fast_forward']:
+        kwargs.setdefault('fast_forward', True)
+    if meta.get('trig_table'):
+        kwargs.setdefault('trig_table', True)
+    if meta.get('sensing'):
+        kwargs.setdefault('sensing', True)
+    genome = Genome.from_json(meta['genome'])
+    simulation = sim_class(field_space, observers, meta['sense_limited'], meta['start'],
+                           spawner=spawner, genome=genome, selection=selection, **kwargs)
+
+    genes = np.stack([arrays[name] for name in genome.columns], axis=1).tolist()
+    creatures = []
+    for i in range(len(arrays['headings'])):
+        x, y = arrays['positions'][i].tolist()
+        g = genome.unpack(genes[i])
+        c = Creature(Vector(x, y), float(arrays['energy'][i]), g['senseg'], g['sizeg'], g['speedg'],
+                     RadianAngle(float(arrays['headings'][i])))
+        c.got_food = bool(arrays['got_food'][i])
+        c.task_finished = bool(arrays['task_finished'][i])
+        creatures.append(c)
+    simulation.creatures = creatures
+    population = getattr(simulation, 'population', None)
+
+    food = []
+    slots = arrays['food_slots'].tolist()
+    for (x, y), angle, energy, slot in zip(arrays['food_positions'].tolist(),
+                                           arrays['food_angles'].tolist(),
+                                           arrays['food_energy'].tolist(), slots):
+        f = Food(Vector(x, y), angle)
+        f.energy = energy
+        f.eaten = slot < 0
+        food.append(f)
+    if population is None:
+        simulation.food.restore(food, slots)
+    else:
+        simulation.food = food
+
+    version, state, gauss = meta['rng']
+    simulation.rng.setstate((version, tuple(state), gauss))
+    simulation.np_rng.bit_generator.state = meta['np_rng']
+    simulation.generation = meta['generation']
+    simulation.ticks = meta['ticks']
+    return simulation
+
+class Checkpointer(Observer):
+    # Saves a checkpoint every `every` generations. The state is copied on
+    # the simulation thread and compressed/written on a background thread,
+    # if the previous write hasn't finished yet the simulation waits for it
+    # rather than queueing up copies.
+    def __init__(self, path: str, every: int = 10):
+        self.path = path
+        self.every = every
+        self._queue: Queue = Queue(maxsize=1)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='checkpoint', daemon=True)
+        self._thread.start()
+
+    def on_generation(self, simulation: Simulation):
+        if self._error is not None:
+            raise self._error
+        if simulation.generation % self.every == 0:
+            self._queue.put(capture(simulation))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                write(self.path, *item)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        # Blocks until everything handed over so far is on disk
+        self._queue.join()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
@@ -1,36 +1,42 @@
 #!/usr/bin/env python
 from __future__ import annotations
 
-from MapUtils import Vector, PolarVector, dist
+from MapUtils import Vector, PolarVector, UnitHeading, dist
+from Genome import GeneSpec
 from abc import ABC, abstractmethod
-from typing import Callable, List, Any, Tuple
-from random import randint, uniform
+from typing import List, Any, Tuple
+from random import Random
+from copy import copy
+from time import perf_counter
 import math
 
 BASE_TURN_SPEED = math.radians(20)
 BASE_MOVE_SPEED = 1
 BASE_TURN_ENRGY = 1
 BASE_MOVE_ENRGY = 1
+FOOD_ENERGY     = 100
+# Energy a parent gives up for each child, and what the child starts with
+BIRTH_COST      = 50
+CHILD_ENERGY    = 100
+
+# Used when no generator is passed in, pass your own seeded Random for
+# reproducible runs
+DEFAULT_RNG = Random()
 
 class Gene(object):
-    __slots__ = ["val", "mutation_chance", "mutation_change"]
-    def __init__(self, val: Any, mutation_chance: int, mutation_change: Callable[[Any], Any]):
+    # A gene's value and the GeneSpec saying how it mutates
+    __slots__ = ["val", "spec"]
+    def __init__(self, val: Any, spec: GeneSpec):
         self.val = val
-        self.mutation_chance = mutation_chance
-        self.mutation_change = mutation_change
-        
-        def _mutate(self) -> Gene:
-            return Gene(self.mutation_change(self.val), self.mutation_chance, mutation_change)
-        
-        def reproduce(self) -> Gene:
-            if randint(0, 100) < self.mutation_chance:
-                return self._mutate()
-            return copy(self)
+        self.spec = spec
+    
+    def reproduce(self, rng: Random = DEFAULT_RNG) -> Gene:
+        return Gene(self.spec.reproduce(self.val, rng), self.spec)
         
     def __copy__(self):
-        return type(self)(copy(self.val), self.mutation_chance, self.mutation_change)
+        return type(self)(copy(self.val), self.spec)
         
-class Creature(object):
+class Creature(UnitHeading):
     def __init__(self, start_position: Position, start_energy: int, 
                sense_gene: Gene, size_gene: Gene, speed_gene: Gene,
                start_heading: RadianAngle):
@@ -43,89 +49,134 @@ class Creature(object):
         
         self.task_finished = False
         self.got_food = False
+        # Food being chased on the last turn, None when wandering or going home
+        self.target = None
         
-    def reproduce(self) -> Creature:
-        self.energy -= 50
-        return Creature(self.position, 100,
-                   self.senseg.reproduce(),
-                   self.sizeg.reproduce(),
-                   self.speedg.reproduce())
+    def reproduce(self, rng: Random = DEFAULT_RNG) -> Creature:
+        return self.give_birth(self.senseg.reproduce(rng),
+                               self.sizeg.reproduce(rng),
+                               self.speedg.reproduce(rng))
+    
+    def give_birth(self, sense_gene: Gene, size_gene: Gene, speed_gene: Gene) -> Creature:
+        # Child with the given (already mutated) genes
+        self.energy -= BIRTH_COST
+        return Creature(self.position, CHILD_ENERGY, sense_gene, size_gene, speed_gene, self.heading)
+    
+    def reset(self):
+        # Start a new day
+        self.task_finished = False
+        self.got_food = False
+        self.target = None
+    
+    def home_target(self, field_space: Tuple[Vector, Vector]) -> Vector:
+        # The nearest point on the nearest wall
+        wall_dists = {
+            1: abs(field_space[1].y - self.position.y),
+            2: abs(field_space[1].x - self.position.x),
+            3: abs(self.position.y - field_space[0].y),
+            4: abs(self.position.x - field_space[0].x)
+        }
+        closest_wall = min(wall_dists, key=lambda x: wall_dists[x])
+        if closest_wall == 1:
+            return Vector(self.position.x, field_space[1].y)
+        if closest_wall == 2:
+            return Vector(field_space[1].x, self.position.y)
+        if closest_wall == 3:
+            return Vector(self.position.x, field_space[0].y)
+        return Vector(field_space[0].x, self.position.y)
     
     def move(self, target: Vector) -> Tuple[Vector, PolarVector]:
         # Find change in heading
-        new_course = PolarVector.fromVector(self.position - target)
-        course_correction = new_course.angle - self.heading
+        dx, dy = target.x - self.position.x, target.y - self.position.y
+        distance = math.hypot(dx, dy)
+        if distance > 0:
+            # Take the shortest way round, in the range [-pi, pi)
+            course_correction = (math.atan2(dy, dx) - self.heading + math.pi) % (2*math.pi) - math.pi
+        else:
+            course_correction = 0.0
        # print(f"Angle change: {course_correction}")
-        muli = -1 if course_correction > math.pi else 1
-        if (2*math.pi) - course_correction < self.speedg.val.angle:
-            correction_to_make = muli*(2*math.pi - course_correction)
+        if abs(course_correction) < self.speedg.val.angle:
+            correction_to_make = course_correction
         else:
-            correction_to_make = muli*self.speedg.val.angle
+            correction_to_make = math.copysign(self.speedg.val.angle, course_correction)
         
         # Now change the heading
-        self.heading = (self.heading + correction_to_make) % 2*math.pi
-        self.energy -= BASE_TURN_ENRGY*(correction_to_make/BASE_TURN_SPEED)
+        self.heading = (self.heading + correction_to_make) % (2*math.pi)
+        self.energy -= BASE_TURN_ENRGY*(abs(correction_to_make)/BASE_TURN_SPEED)
         
-        # Find the change in position
-        move_speed = new_course.magnitude if new_course.magnitude < self.speedg.val.magnitude else self.speedg.val.magnitude
-        pos_diff = Vector.fromPolar(PolarVector(self.heading, move_speed))
+        # Find the change in position, cos/sin only recomputed if we turned
+        move_speed = distance if distance < self.speedg.val.magnitude else self.speedg.val.magnitude
+        c, s = self.heading_vector()
+        step = PolarVector.fromParts(self.heading, move_speed, move_speed*c, move_speed*s)
         
         # Now change tho position
-        self.position += pos_diff
+        self.position += step
         self.energy -= BASE_MOVE_ENRGY*(move_speed/BASE_MOVE_SPEED)
         
-        return self.position, PolarVector(self.heading, move_speed)
+        return self.position, step
     
     def eat(self, target: Food):
         target.eaten = True
+        self.got_food = True
         self.energy += target.energy
     
-    def calculate_turn(self, food_options: List[Food], field_space: Tuple[Vector, Vector]):
+    def wander(self, field_space: Tuple[Vector, Vector]):
+        # Nothing in sight, so keep going the way we're heading and
+        # bounce off the walls
+        speed = self.speedg.val.magnitude
+        c, s = self.heading_vector()
+        dx, dy = speed*c, speed*s
+        ahead = self.position + Vector(dx, dy)
+        if not field_space[0].x <= ahead.x <= field_space[1].x:
+            dx = -dx
+        if not field_space[0].y <= ahead.y <= field_space[1].y:
+            dy = -dy
+        self.move(self.position + Vector(dx, dy))
+    
+    def calculate_turn(self, food_options: FoodStore, field_space: Tuple[Vector, Vector],
+                       sense_limited: bool = False, profiler: Profiler = None):
         #print("Job: ", end='')
         if (not self.task_finished) and self.energy > 0:
             # Need to get food and go home
-            if not self.got_food:
+            if not self.got_food and len(food_options):
          #       print('Getting Food')
         #        print(f'Energy: {self.energy}')
                 # Need to get food
-                # Find closest food
-                closest = food_options[0]
-                cdist = dist(self.position, closest.position)
-                for food in food_options[1:]:
-                    new_dist = dist(self.position, food.position)
-                    if new_dist < cdist:
-                        closest = food
-                        cdist = new_dist
-                # Go get food
-       #         print(f'Closest: {closest.position}, Dist: {cdist}')
-      #          print(f'X: {self.position.x}\nY: {self.position.y}')
-                self.move(closest.position)
-     #           print(f'nX: {self.position.x}\nnY: {self.position.y}')
+                # Find closest food, only as far as we can sense if limited
+                if profiler is not None:
+                    start = perf_counter()
+                closest, cdist = food_options.nearest(
+                    self.position, self.senseg.val if sense_limited else None)
+                self.target = closest
+                if profiler is not None:
+                    profiler.add('nearest', perf_counter() - start)
+                    start = perf_counter()
+                if closest is None:
+                    self.wander(field_space)
+                else:
+                    # Go get food
+       #             print(f'Closest: {closest.position}, Dist: {cdist}')
+                    self.move(closest.position)
+                if profiler is not None:
+                    profiler.add('move', perf_counter() - start)
                 # Eat that food
-                if dist(self.position, food.position) < self.sizeg.val*2:
+                if closest is not None and dist(self.position, closest.position) < self.sizeg.val*2:
+                    if profiler is not None:
+                        start = perf_counter()
                     self.eat(closest)
+                    food_options.remove(closest)
+                    if profiler is not None:
+                        profiler.add('eat', perf_counter() - start)
             else:
     #            print('Going Home')
                 # Need to get to the wall
-                
-                # find the closest wall
-                wall_dists = {
-                    1: abs(field_space[1].y - self.position.y),
-                    2: abs(field_space[1].x - self.position.x),
-                    3: abs(self.position.y - field_space[0].y),
-                    4: abs(self.position.x - field_space[0].x)
-                }
-                closest_wall = min(wall_dists, key=lambda x: wall_dists[x])
-                
-                # Move to wall
-                if closest_wall == 1:
-                    self.move(Vector(self.position.x, field_space[1].y))
-                elif closest_wall == 2:
-                    self.move(Vector(field_space[1].x, self.position.y))
-                elif closest_wall == 3:
-                    self.move(Vector(self.position.x, field_space[0].y))
-                elif closest_wall == 4:
-                    self.move(Vector(field_space[0].x, self.position.y))
+                self.target = None
+                target = self.home_target(field_space)
+                if profiler is not None:
+                    start = perf_counter()
+                self.move(target)
+                if profiler is not None:
+                    profiler.add('move', perf_counter() - start)
 
                 wall_dists = [
                     abs(field_space[1].y - self.position.y),
@@ -133,8 +184,8 @@ class Creature(object):
                     abs(self.position.y - field_space[0].y),
                     abs(self.position.x - field_space[0].x)
                 ]
-                if any(map(lambda x: x < self.sizeg.val)):
-                    self.finished_task = True
+                if any(map(lambda x: x < self.sizeg.val, wall_dists)):
+                    self.task_finished = True
        # else:
    #         print('None')
         if self.position.x < field_space[0].x:
@@ -150,24 +201,26 @@ class Creature(object):
 class Food:
     def __init__(self, position: Vector, angle: RadianAngle):
         self.eaten = False
-        self.energy = 100
+        self.energy = FOOD_ENERGY
         self.position = position
         self.angle = angle
+        # Slot in the FoodStore holding this food, None once removed
+        self.slot = None
         
 
-def randvector(start, end):
-    X = uniform(start.x, end.x)
-    Y = uniform(start.y, end.y)
+def randvector(start, end, rng: Random = DEFAULT_RNG):
+    X = rng.uniform(start.x, end.x)
+    Y = rng.uniform(start.y, end.y)
     return Vector(X, Y)
 
-def generate_food_list(field_space, food_amount):
+def generate_food_list(field_space, food_amount, rng: Random = DEFAULT_RNG):
     x_space = abs(field_space[1].x - field_space[0].x)
     y_space = abs(field_space[1].y - field_space[0].y)
     
     spawn_space = [Vector(field_space[0].x + 0.1*x_space, field_space[0].y + 0.1*y_space),
                    Vector(field_space[1].x - 0.1*x_space, field_space[1].y - 0.1*y_space)]
     
-    foods = [Food(randvector(spawn_space[0], spawn_space[1]), uniform(0, 2*math.pi)) for i in range(food_amount)]
+    foods = [Food(randvector(spawn_space[0], spawn_space[1], rng), rng.uniform(0, 2*math.pi)) for i in range(food_amount)]
     return foods
     
 def main():
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from MapUtils import Vector
+from Creature import Creature, Food, BASE_MOVE_ENRGY, BASE_MOVE_SPEED
+from typing import Dict, List, Tuple
+import heapq
+import math
+
+# How far (radians) a creature's heading may be off its course and still
+# count as already facing its target
+ALIGN_TOLERANCE = 1e-9
+
+class Cruise:
+    # A creature moving in a straight line at full speed to a fixed target,
+    # where it and its energy will be on any later tick is a closed form.
+    # It ends on end_tick, by arriving (or dying on the way).
+    __slots__ = ['creature', 'start_tick', 'start', 'direction', 'speed', 'distance',
+                 'energy', 'food', 'end_tick', 'dies', 'done']
+
+    def __init__(self, creature: Creature, tick: int, target: Vector, food: Food,
+                 reach: float):
+        self.creature = creature
+        self.start_tick = tick
+        self.start = creature.position
+        course = target - creature.position
+        self.distance = math.hypot(course.x, course.y)
+        self.direction = course/self.distance
+        self.speed = creature.speedg.val.magnitude
+        self.energy = creature.energy
+        self.food = food
+        # Ticks until within reach of the target, and until out of energy
+        arrive = max(1, math.floor((self.distance - reach)/self.speed) + 1)
+        die = math.ceil(self.energy/(self.speed*BASE_MOVE_ENRGY/BASE_MOVE_SPEED))
+        self.dies = die < arrive
+        self.end_tick = tick + min(arrive, die)
+        self.done = False
+
+    def state(self, tick: int) -> Tuple[Vector, float]:
+        # Position and energy at the end of the given tick
+        moved = min((tick - self.start_tick)*self.speed, self.distance)
+        return (self.start + self.direction*moved,
+                self.energy - BASE_MOVE_ENRGY*(moved/BASE_MOVE_SPEED))
+
+    def __lt__(self, other: Cruise) -> bool:
+        return self.end_tick < other.end_tick
+
+class FastForward:
+    # Takes creatures that are lined up on a target off the per tick loop.
+    #
+    # Going home the target is the nearest point on the nearest wall, which
+    # stays the nearest as the creature heads straight for it. Chasing food,
+    # if F is the closest food to P then no other food is closer than F to
+    # any point between P and F (all such food would be inside the circle
+    # around P through F), so the only thing that can change the plan is F
+    # being eaten by someone else. Either way the arrival tick and energy
+    # use are worked out up front and the creature is put back (or marked
+    # finished) when it arrives or its food disappears.
+    def __init__(self, field_space: Tuple[Vector, Vector]):
+        self.field_space = field_space
+        self._queue: List[Cruise] = []
+        self._by_food: Dict[Food, List[Cruise]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def start(self, creature: Creature, tick: int, food_store: FoodStore) -> bool:
+        # Starts a cruise if the creature's next turn would be straight
+        # ahead, returns whether it did
+        if creature.got_food:
+            target, food, reach = creature.home_target(self.field_space), None, creature.sizeg.val
+        else:
+            food = creature.target
+            if food is None or food not in food_store:
+                return False
+            target, reach = food.position, creature.sizeg.val*2
+        course = target - creature.position
+        if course.x == 0 and course.y == 0:
+            return False
+        error = (math.atan2(course.y, course.x) - creature.heading + math.pi) % (2*math.pi) - math.pi
+        if abs(error) > ALIGN_TOLERANCE:
+            return False
+        cruise = Cruise(creature, tick, target, food, reach)
+        heapq.heappush(self._queue, cruise)
+        if food is not None:
+            self._by_food.setdefault(food, []).append(cruise)
+        self._count += 1
+        return True
+
+    def next_tick(self) -> int:
+        # The tick the next cruise ends on
+        while self._queue[0].done:
+            heapq.heappop(self._queue)
+        return self._queue[0].end_tick
+
+    def _finish(self, cruise: Cruise, tick: int):
+        creature = cruise.creature
+        creature.position, creature.energy = cruise.state(tick)
+        cruise.done = True
+        self._count -= 1
+        if cruise.food is not None:
+            waiting = self._by_food[cruise.food]
+            waiting.remove(cruise)
+            if not waiting:
+                del self._by_food[cruise.food]
+
+    def arrivals(self, tick: int, food_store: FoodStore) -> List[Creature]:
+        # Ends the cruises due on this tick, returns the creatures that carry
+        # on: those that got their food and now need to go home, and any
+        # that were heading for the same food
+        resumed = []
+        queue = self._queue
+        while queue and queue[0].end_tick <= tick:
+            cruise = heapq.heappop(queue)
+            if cruise.done:
+                continue
+            self._finish(cruise, tick)
+            creature = cruise.creature
+            if cruise.dies:
+                continue
+            if cruise.food is None:
+                creature.task_finished = True
+            else:
+                creature.eat(cruise.food)
+                food_store.remove(cruise.food)
+                resumed.append(creature)
+                resumed += self.eaten(cruise.food, tick)
+        return resumed
+
+    def eaten(self, food: Food, tick: int) -> List[Creature]:
+        # Food someone else got to first, the creatures heading for it go
+        # back to looking around each tick
+        resumed = []
+        for cruise in list(self._by_food.get(food, ())):
+            self._finish(cruise, tick)
+            resumed.append(cruise.creature)
+        return resumed
+
+    def sync(self, tick: int):
+        # Moves every cruising creature to where it is on this tick, only
+        # needed when something wants to look at them
+        for cruise in self._queue:
+            if not cruise.done:
+                cruise.creature.position, cruise.creature.energy = cruise.state(tick)
+
+    def clear(self):
+        self._queue.clear()
+        self._by_food.clear()
+        self._count = 0
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from MapUtils import Vector
+from SpatialIndex import FoodGrid
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+class FoodStore:
+    # The food left in the field. Each Food remembers its slot in the
+    # list so it can be swap-removed in O(1) when eaten, and the spatial
+    # index is updated at the same time. Order is not preserved.
+    def __init__(self, field_space: Tuple[Vector, Vector], foods: Iterable[Food] = ()):
+        self.field_space = field_space
+        self.index = FoodGrid(field_space)
+        self.reset(foods)
+
+    def reset(self, foods: Iterable[Food]):
+        self.items: List[Food] = list(foods)
+        # The food as it was put down, in order, eaten or not
+        self.spawned: List[Food] = self.items.copy()
+        for slot, food in enumerate(self.items):
+            food.slot = slot
+        self.index.rebuild(self.items)
+        self.eaten = 0
+
+    def restore(self, spawned: Iterable[Food], slots: Sequence[int]):
+        # Puts back a store as it was mid-generation, from the food in spawn
+        # order and the slot each one was in (-1 once eaten). The index is
+        # built as reset built it, then loses the eaten food, so lookups go
+        # exactly as they would have.
+        self.reset(spawned)
+        self.items = [None]*sum(slot >= 0 for slot in slots)
+        for food, slot in zip(self.spawned, slots):
+            if slot < 0:
+                food.slot = None
+                self.index.remove(food)
+                self.eaten += 1
+            else:
+                food.slot = slot
+                self.items[slot] = food
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, slot: int) -> Food:
+        return self.items[slot]
+
+    def __contains__(self, food: Food) -> bool:
+        slot = food.slot
+        return slot is not None and slot < len(self.items) and self.items[slot] is food
+
+    def remove(self, food: Food):
+        slot = food.slot
+        last = self.items.pop()
+        if last is not food:
+            self.items[slot] = last
+            last.slot = slot
+        food.slot = None
+        self.index.remove(food)
+        self.eaten += 1
+
+    def nearest(self, position: Vector, max_dist: float = None) -> Tuple[Optional[Food], float]:
+        return self.index.nearest(position, max_dist)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from Observer import Observer
+from Snapshot import Snapshot
+from MapUtils import Vector
+from typing import Container, Deque, Optional, Tuple
+from collections import deque
+import multiprocessing
+import numpy as np
+import struct
+import zlib
+import os
+
+FORMATS = ('png', 'raw')
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return (struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+def encode_png(image: np.ndarray, level: int = 6) -> bytes:
+    # (height, width, 3) uint8 image as an 8 bit RGB PNG
+    height, width, _ = image.shape
+    rows = np.zeros((height, width*3 + 1), dtype=np.uint8)  # filter byte 0 on each row
+    rows[:, 1:] = image.reshape(height, width*3)
+    return (b'\x89PNG\r\n\x1a\n' +
+            _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            _chunk(b'IDAT', zlib.compress(rows.tobytes(), level)) +
+            _chunk(b'IEND', b''))
+
+# Each worker process has its own offscreen context and renderer
+_worker = None
+
+def _init_worker(field_space: Tuple[Vector, Vector], size: Tuple[int, int]):
+    global _worker
+    # Must come before anything imports OpenGL
+    import OffscreenGL
+    from GLRenderer import InstancedRenderer
+    width, height = size
+    context = OffscreenGL.OffscreenContext(width, height)
+    _worker = (context, InstancedRenderer(field_space, width/height))
+
+def _render(snapshot: Snapshot, camera: float, path: str, index: int, format: str):
+    context, renderer = _worker
+    renderer.render(snapshot, camera)
+    image = context.read_pixels()
+    if format == 'png':
+        with open(os.path.join(path, f'frame_{index:06d}.png'), 'wb') as f:
+            f.write(encode_png(image))
+    else:
+        # One rgb24 stream, every frame has its own place in it so workers
+        # can write in any order
+        fd = os.open(os.path.join(path, 'frames.rgb'), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, np.ascontiguousarray(image).tobytes(), index*image.nbytes)
+        finally:
+            os.close(fd)
+
+class FrameExporter(Observer):
+    # Renders ticks to numbered PNGs (frame_000000.png, ...) or one raw
+    # rgb24 file (frames.rgb) in `path` without a window, for making movies
+    # of headless runs. Drawing happens in `workers` processes each with an
+    # offscreen EGL context, the simulation only takes a snapshot and hands
+    # it over. At most `pending` frames are in flight, after that the
+    # simulation waits for the oldest rather than pile snapshots up.
+    #
+    # Every `every`th tick is drawn (0 for none), plus the start of each
+    # generation if `generations` is set. `only` limits drawing to those
+    # generation numbers.
+    def __init__(self, path: str, size: Tuple[int, int] = (1280, 720), every: int = 1,
+                 generations: bool = False, only: Optional[Container[int]] = None,
+                 format: str = 'png', workers: int = 2, pending: int = None, camera: float = 0.0):
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.size = size
+        self.every = every
+        self.generations = generations
+        self.only = only
+        self.format = format
+        self.workers = workers
+        self.pending = pending or 2*workers
+        self.camera = camera
+        self.frames = 0
+        self._pool = None
+        self._results: Deque[multiprocessing.pool.AsyncResult] = deque()
+
+    def submit(self, snapshot: Snapshot, field_space: Tuple[Vector, Vector]):
+        # Queues one frame, numbered in the order submitted
+        if self._pool is None:
+            # Spawned so the workers start without OpenGL already imported
+            context = multiprocessing.get_context('spawn')
+            self._pool = context.Pool(self.workers, _init_worker, (field_space, self.size))
+        while len(self._results) >= self.pending:
+            self._results.popleft().get()
+        self._results.append(self._pool.apply_async(
+            _render, (snapshot, self.camera, self.path, self.frames, self.format)))
+        self.frames += 1
+        while self._results and self._results[0].ready():
+            self._results.popleft().get()  # raises if the worker failed
+
+    def _wanted(self, simulation: Simulation) -> bool:
+        return self.only is None or simulation.generation in self.only
+
+    def on_tick(self, simulation: Simulation):
+        if self.every and simulation.ticks % self.every == 0 and self._wanted(simulation):
+            self.submit(simulation.snapshot(), simulation.field_space)
+
+    def on_generation(self, simulation: Simulation):
+        if self.generations and self._wanted(simulation):
+            self.submit(simulation.snapshot(), simulation.field_space)
+
+    def close(self):
+        # Waits for every queued frame to be written
+        if self._pool is None:
+            return
+        try:
+            while self._results:
+                self._results.popleft().get()
+        finally:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
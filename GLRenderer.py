@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from OpenGL.GL import *
+from OpenGL.GL.shaders import compileProgram, compileShader
+from MapUtils import Vector
+from Snapshot import Snapshot
+from typing import Tuple
+import numpy as np
+import ctypes
+import math
+
+VERTEX_SHADER = """
+#version 330 core
+layout(location = 0) in vec3 a_vertex;
+layout(location = 1) in vec3 a_color;
+layout(location = 2) in vec2 i_position;
+layout(location = 3) in float i_angle;
+layout(location = 4) in vec3 i_color;
+
+uniform mat4 u_view_proj;
+uniform float u_camera;
+uniform vec2 u_field_lo;
+uniform vec2 u_field_size;
+
+out vec3 v_color;
+
+mat3 rotate_y(float a) {
+    float c = cos(a);
+    float s = sin(a);
+    return mat3(c, 0.0, s,  0.0, 1.0, 0.0,  -s, 0.0, c);
+}
+
+void main() {
+    // Same mapping as Graphics.scale_vector, the field becomes -5..5
+    vec2 p = -5.0 + (i_position - u_field_lo)/u_field_size*10.0;
+    vec3 world = rotate_y(u_camera)*(rotate_y(i_angle)*a_vertex + vec3(p.x, 0.0, p.y));
+    gl_Position = u_view_proj*vec4(world, 1.0);
+    v_color = a_color*i_color;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 330 core
+in vec3 v_color;
+out vec4 f_color;
+
+void main() {
+    f_color = vec4(v_color, 1.0);
+}
+"""
+
+# Quads making up the top and sides of a box, same as Graphics uses
+SURFACES = (
+    (0,1,2,3),
+    (0,1,5,4),
+    (3,0,4,7),
+    (2,3,7,6),
+    (1,2,6,5)
+)
+
+CREATURE_COLOR = (0, 1, 0)
+FOOD_COLOR     = (1, 0, 0)
+
+def box_mesh(half_width: float, top: float, bottom: float,
+             top_color=(1, 1, 1), bottom_color=(1, 1, 1)) -> np.ndarray:
+    # Triangles for a box without a bottom face, as rows of x, y, z, r, g, b
+    w = half_width
+    corners = (
+        (-w, top, -w), ( w, top, -w), ( w, top,  w), (-w, top,  w),
+        (-w, bottom, -w), ( w, bottom, -w), ( w, bottom,  w), (-w, bottom,  w),
+    )
+    colors = (top_color,)*4 + (bottom_color,)*4
+    rows = []
+    for a, b, c, d in SURFACES:
+        for i in (a, b, c, a, c, d):
+            rows.append(corners[i] + tuple(colors[i]))
+    return np.array(rows, dtype=np.float32)
+
+def perspective(fovy: float, aspect: float, near: float, far: float) -> np.ndarray:
+    f = 1/math.tan(math.radians(fovy)/2)
+    return np.array([
+        [f/aspect, 0,                           0,                           0],
+        [       0, f,                           0,                           0],
+        [       0, 0, (far + near)/(near - far), 2*far*near/(near - far)],
+        [       0, 0,                          -1,                           0],
+    ])
+
+def translate(x: float, y: float, z: float) -> np.ndarray:
+    m = np.identity(4)
+    m[:3, 3] = (x, y, z)
+    return m
+
+def rotate(angle: float, x: float, y: float, z: float) -> np.ndarray:
+    # Same as glRotatef
+    x, y, z = np.array((x, y, z))/math.sqrt(x*x + y*y + z*z)
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    m = np.identity(4)
+    m[:3, :3] = [
+        [x*x*(1-c) + c,   x*y*(1-c) - z*s, x*z*(1-c) + y*s],
+        [y*x*(1-c) + z*s, y*y*(1-c) + c,   y*z*(1-c) - x*s],
+        [x*z*(1-c) - y*s, y*z*(1-c) + x*s, z*z*(1-c) + c  ],
+    ]
+    return m
+
+def view_projection(aspect: float) -> np.ndarray:
+    # The camera Graphics sets up with gluPerspective/glTranslatef/glRotatef
+    return perspective(45, aspect, 0.1, 50.0) @ translate(0.0, 0.0, -15) @ rotate(25, 2, 1, 0)
+
+class _Batch:
+    # One mesh uploaded once plus a per-instance buffer refilled each frame
+    INSTANCE_FLOATS = 6  # x, y, angle, r, g, b
+
+    def __init__(self, mesh: np.ndarray):
+        self.vertex_count = len(mesh)
+        self.vao = glGenVertexArrays(1)
+        self.mesh_vbo, self.instance_vbo = glGenBuffers(2)
+        glBindVertexArray(self.vao)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.mesh_vbo)
+        glBufferData(GL_ARRAY_BUFFER, mesh.nbytes, mesh, GL_STATIC_DRAW)
+        stride = 6*4
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(0))
+        glEnableVertexAttribArray(1)
+        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(3*4))
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        stride = self.INSTANCE_FLOATS*4
+        for location, size, offset in ((2, 2, 0), (3, 1, 2), (4, 3, 3)):
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, stride,
+                                  ctypes.c_void_p(offset*4))
+            glVertexAttribDivisor(location, 1)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.instances = np.zeros((0, self.INSTANCE_FLOATS), dtype=np.float32)
+
+    def fill(self, positions: np.ndarray, angles: np.ndarray, color):
+        n = len(angles)
+        if len(self.instances) != n:
+            self.instances = np.empty((n, self.INSTANCE_FLOATS), dtype=np.float32)
+        self.instances[:, 0:2] = positions
+        self.instances[:, 2] = angles
+        self.instances[:, 3:6] = color
+
+    def draw(self):
+        n = len(self.instances)
+        if not n:
+            return
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        # Orphan the old storage so we never wait on the previous frame
+        glBufferData(GL_ARRAY_BUFFER, self.instances.nbytes, None, GL_STREAM_DRAW)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, self.instances.nbytes, self.instances)
+        glBindVertexArray(self.vao)
+        glDrawArraysInstanced(GL_TRIANGLES, 0, self.vertex_count, n)
+        glBindVertexArray(0)
+
+class InstancedRenderer:
+    # Retained mode renderer: the box meshes live on the GPU and each frame
+    # only the per-instance position/heading/colour buffers are streamed,
+    # so every creature and every food is drawn with a single call each.
+    # Needs a current OpenGL 3.3+ context, but not pygame.
+    def __init__(self, field_space: Tuple[Vector, Vector], aspect: float):
+        self.field_space = field_space
+        self.program = compileProgram(compileShader(VERTEX_SHADER, GL_VERTEX_SHADER),
+                                      compileShader(FRAGMENT_SHADER, GL_FRAGMENT_SHADER),
+                                      validate=False)
+        self.u_view_proj  = glGetUniformLocation(self.program, 'u_view_proj')
+        self.u_camera     = glGetUniformLocation(self.program, 'u_camera')
+        self.u_field_lo   = glGetUniformLocation(self.program, 'u_field_lo')
+        self.u_field_size = glGetUniformLocation(self.program, 'u_field_size')
+        self.set_aspect(aspect)
+
+        self.creatures = _Batch(box_mesh(0.2, 0.4, 0))
+        self.food      = _Batch(box_mesh(0.1, 0.2, 0))
+        self.field     = _Batch(box_mesh(5, 0, -5, (1, 1, 1), (0, 0, 0)))
+        # The field is a single instance sitting in the middle
+        centre = np.array([[(field_space[0].x + field_space[1].x)/2,
+                            (field_space[0].y + field_space[1].y)/2]])
+        self.field.fill(centre, np.zeros(1), (1, 1, 1))
+
+    def set_aspect(self, aspect: float):
+        self.view_proj = view_projection(aspect).astype(np.float32)
+
+    def render(self, snapshot: Snapshot, camera_angle: float):
+        self.creatures.fill(snapshot.creature_positions, snapshot.creature_headings, CREATURE_COLOR)
+        self.food.fill(snapshot.food_positions, snapshot.food_angles, FOOD_COLOR)
+
+        glEnable(GL_DEPTH_TEST)
+        glDepthFunc(GL_LEQUAL)
+        glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
+        glUseProgram(self.program)
+        glUniformMatrix4fv(self.u_view_proj, 1, GL_TRUE, self.view_proj)
+        glUniform1f(self.u_camera, camera_angle)
+        lo, hi = self.field_space
+        glUniform2f(self.u_field_lo, lo.x, lo.y)
+        glUniform2f(self.u_field_size, hi.x - lo.x, hi.y - lo.y)
+        self.creatures.draw()
+        self.food.draw()
+        self.field.draw()
+        glUseProgram(0)
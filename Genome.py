@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from MapUtils import PolarVector, RadianAngle
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+from random import Random
+from math import inf, pi, radians
+import numpy as np
+
+class GeneColumn(NamedTuple):
+    # One number of a genome. A mutation adds a whole number of units in
+    # [-step, step], then ints and floats are clamped to [low, high] and
+    # angles are wrapped into [0, 2*pi).
+    name: str
+    kind: str           # 'int', 'float' or 'angle'
+    step: int
+    unit: float = 1.0
+    low: float = -inf
+    high: float = inf
+
+class GeneSpec(NamedTuple):
+    # A Creature gene (e.g. 'speedg') and the columns it is made of. All
+    # columns of a gene mutate together, with `chance` out of 101 (the
+    # odds Gene.reproduce has always used).
+    name: str
+    chance: float
+    columns: Tuple[GeneColumn, ...]
+
+    def value(self, values: Sequence[float]) -> Any:
+        # Gene.val from column values, two column genes are PolarVectors
+        if len(self.columns) == 1:
+            return values[0]
+        return PolarVector(RadianAngle(values[0]), values[1])
+
+    def values(self, val: Any) -> Tuple[float, ...]:
+        if len(self.columns) == 1:
+            return (val,)
+        return (val.angle, val.magnitude)
+
+    def reproduce(self, val: Any, rng: Random) -> Any:
+        # Scalar version of Genome.mutate for a single gene
+        if rng.randint(0, 100) >= self.chance:
+            return self.value(self.values(val))
+        return self.value([_bound(column, x + rng.randint(-column.step, column.step)*column.unit)
+                           for column, x in zip(self.columns, self.values(val))])
+
+def _bound(column: GeneColumn, x: float) -> float:
+    if column.kind == 'angle':
+        return x % (2*pi)
+    x = min(max(x, column.low), column.high)
+    return round(x) if column.kind == 'int' else x
+
+class Genome:
+    # The genes every creature carries, laid out as the columns of a packed
+    # (n, len(columns)) float64 array so a whole generation of offspring can
+    # be mutated in one go. Column names match the Population arrays.
+    def __init__(self, genes: Sequence[GeneSpec]):
+        self.genes = tuple(genes)
+        self.specs = {gene.name: gene for gene in self.genes}
+        self.columns = tuple(column.name for gene in self.genes for column in gene.columns)
+
+    def pack(self, creatures: List[Creature]) -> np.ndarray:
+        values = [[x for gene in self.genes for x in gene.values(getattr(c, gene.name).val)]
+                  for c in creatures]
+        return np.array(values, dtype=np.float64).reshape(len(creatures), len(self.columns))
+
+    def unpack(self, row: Sequence[float]) -> Dict[str, Gene]:
+        # Gene objects for one packed row, keyed by Creature attribute
+        from Creature import Gene
+        genes, i = {}, 0
+        for gene in self.genes:
+            n = len(gene.columns)
+            genes[gene.name] = Gene(gene.value(row[i:i+n]), gene)
+            i += n
+        return genes
+
+    def mutate(self, values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        # Mutated copy of packed genomes, one draw per gene and row for
+        # whether it mutates and one per column and row for the change
+        values = np.array(values, dtype=np.float64)
+        n = len(values)
+        i = 0
+        for gene in self.genes:
+            mutated = rng.integers(0, 101, n) < gene.chance
+            for column in gene.columns:
+                steps = rng.integers(-column.step, column.step + 1, n)*column.unit
+                x = values[:, i] + steps
+                if column.kind == 'angle':
+                    x %= 2*pi
+                else:
+                    np.clip(x, column.low, column.high, out=x)
+                    if column.kind == 'int':
+                        np.round(x, out=x)
+                values[:, i] = np.where(mutated, x, values[:, i])
+                i += 1
+        return values
+
+    def to_json(self) -> list:
+        return [{'name': gene.name, 'chance': gene.chance,
+                 'columns': [column._asdict() for column in gene.columns]}
+                for gene in self.genes]
+
+    @classmethod
+    def from_json(cls, genes: list) -> Genome:
+        return cls([GeneSpec(gene['name'], gene['chance'],
+                             tuple(GeneColumn(**column) for column in gene['columns']))
+                    for gene in genes])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Genome) and self.genes == other.genes
+
+    def __repr__(self) -> str:
+        return f"Genome({list(self.genes)!r})"
+
+DEFAULT_GENOME = Genome([
+    GeneSpec('senseg', 0,  (GeneColumn('sense', 'int', 1, low=0),)),
+    GeneSpec('sizeg',  20, (GeneColumn('size', 'int', 5, low=1),)),
+    GeneSpec('speedg', 10, (GeneColumn('turn_speed', 'angle', 2, radians(1)),
+                            GeneColumn('move_speed', 'float', 2, low=0.1))),
+])
@@ -5,27 +5,45 @@ import pygame
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
-from MapUtils import Vector, RadianAngle
+from MapUtils import Vector, RadianAngle, UnitHeading
 from typing import Tuple, List
 from math import degrees as to_degrees
 from math import cos, sin, pi
-from random import randint
+from time import perf_counter, sleep
+import threading
+import _thread
 from Creature import Food
+from Observer import Observer
 import numpy as np
 
-class Graphics:
-    def __init__(self, field_space: Tuple[Vector, Vector], display_size: Vector):
+class Graphics(Observer):
+    # Without a window the caller provides a current GL context to draw
+    # into (e.g. OffscreenGL.OffscreenContext) and nothing is flipped.
+    def __init__(self, field_space: Tuple[Vector, Vector], display_size: Vector,
+                 instanced: bool = True, fps: float = 60, window: bool = True):
         self.SCALING = Vector(10/abs(field_space[1].x - field_space[0].x),
                               10/abs(field_space[1].y - field_space[0].y))
         self.field_space = field_space
         
         self.c_velocity = RadianAngle(0)
         self.c_pos = 0
+        # Angle, cos and sin the camera was last drawn at
+        self._camera = (None, 1.0, 0.0)
         
-        pygame.init()
-        pygame.display.set_mode(
-            (int(display_size.x), int(display_size.y)),
-            DOUBLEBUF|OPENGL)
+        # When attached to a simulation, ticks that come in faster than
+        # this are not drawn. None draws every tick.
+        self.fps = fps
+        self._next_frame = 0
+        self.closed = False
+        # Extra actions for key presses, pygame key -> callable
+        self.key_handlers = {}
+        
+        self.window = window
+        if window:
+            pygame.init()
+            pygame.display.set_mode(
+                (int(display_size.x), int(display_size.y)),
+                DOUBLEBUF|OPENGL)
         gluPerspective(45, (display_size.x/display_size.y), 0.1, 50.0)
         glTranslatef(0.0,0.0,-15)
         glRotatef(25, 2, 1, 0)
@@ -33,6 +51,13 @@ class Graphics:
         glEnable(GL_DEPTH_TEST)
         glDepthFunc(GL_LEQUAL)
         
+        # Draw with VBOs and instancing unless asked for the old
+        # immediate mode path
+        self.renderer = None
+        if instanced:
+            from GLRenderer import InstancedRenderer
+            self.renderer = InstancedRenderer(field_space, display_size.x/display_size.y)
+        
         
     def scale_vector(self, vector: Vector) -> Vector:
         new_x = -5 + (((vector.x-self.field_space[0].x)
@@ -41,6 +66,16 @@ class Graphics:
                        /(self.field_space[1].y-self.field_space[0].y)*10))
         return Vector(new_x, new_y)
     
+    def camera_vector(self) -> Tuple[float, float]:
+        # cos and sin of the camera angle, worked out once a frame rather
+        # than for every object drawn
+        angle, c, s = self._camera
+        if angle != self.c_pos:
+            angle = self.c_pos
+            c, s = cos(angle), sin(angle)
+            self._camera = (angle, c, s)
+        return c, s
+    
     def draw_food(self, food: Food):
         glPushMatrix()
         
@@ -128,20 +163,20 @@ class Graphics:
         pos = self.scale_vector(creature.position)
         glPushMatrix()
         
-        # Get rotation of the creature
-        cangle = creature.heading #+ self.c_pos
+        # Get rotation of the creature, cached on it between heading changes
+        cc, cs = creature.heading_vector()
         rotate_matrix_c = np.array([
-            [cos(cangle), 0, -sin(cangle), 0],
-            [         0, 1,           0, 0],
-            [sin(cangle), 0,  cos(cangle), 0],
-            [         0, 0,           0, 1]
+            [cc, 0, -cs, 0],
+            [ 0, 1,   0, 0],
+            [cs, 0,  cc, 0],
+            [ 0, 0,   0, 1]
         ])
-        wangle = self.c_pos
+        wc, ws = self.camera_vector()
         rotate_matrix_f = np.array([
-            [cos(wangle), 0, -sin(wangle), 0],
-            [         0, 1,           0, 0],
-            [sin(wangle), 0,  cos(wangle), 0],
-            [         0, 0,           0, 1]
+            [wc, 0, -ws, 0],
+            [ 0, 1,   0, 0],
+            [ws, 0,  wc, 0],
+            [ 0, 0,   0, 1]
         ])
         translate_matrix = np.array([
             [1, 0, 0, pos.x],
@@ -196,11 +231,12 @@ class Graphics:
     def draw_field(self):
         glPushMatrix()
         
+        c, s = self.camera_vector()
         tm = np.array([
-            [cos(self.c_pos), 0, -sin(self.c_pos), 0],
-            [              0, 1,                0, 0],
-            [sin(self.c_pos), 0,  cos(self.c_pos), 0],
-            [              0, 0,                0, 1]
+            [c, 0, -s, 0],
+            [0, 1,  0, 0],
+            [s, 0,  c, 0],
+            [0, 0,  0, 1]
         ])
         glBegin(GL_QUADS)
         vertices = (
@@ -242,13 +278,14 @@ class Graphics:
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
+                self.closed = True
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_LEFT:
                     self.c_velocity = 0.025
                 elif event.key == pygame.K_RIGHT:
                     self.c_velocity = -0.025
+                elif event.key in self.key_handlers:
+                    self.key_handlers[event.key]()
                 
             elif event.type == pygame.KEYUP:
                 if event.key == pygame.K_LEFT:
@@ -257,19 +294,175 @@ class Graphics:
                     self.c_velocity = 0
 
         
-    def draw(self, creatures: List[Creature], foods: List[Food]):
-        self.handle_events()
+    def _exit_if_closed(self):
+        if self.closed:
+            pygame.quit()
+            quit()
+        
+    def draw_objects(self, creatures: List[Creature], foods: List[Food]):
+        # One immediate mode frame
         glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
-        self.c_pos = (self.c_pos + self.c_velocity) % (2*pi)
         for creature in creatures:
             self.draw_creature(creature)
         for food in foods:
             self.draw_food(food)
         self.draw_field()
-        pygame.display.flip()
-        pygame.time.wait(10)
+
+    def flip(self):
+        if self.window:
+            pygame.display.flip()
+
+    def draw(self, creatures: List[Creature], foods: List[Food]):
+        self.handle_events()
+        self._exit_if_closed()
+        self.c_pos = (self.c_pos + self.c_velocity) % (2*pi)
+        self.draw_objects(creatures, foods)
+        self.flip()
+        
+    def render(self, snapshot: Snapshot):
+        # Draw a snapshot without touching the event queue
+        if self.renderer is None:
+            # Immediate mode wants objects
+            creatures = [DummyCreature(Vector(x, y), h) for (x, y), h in
+                         zip(snapshot.creature_positions.tolist(), snapshot.creature_headings.tolist())]
+            foods = [Food(Vector(x, y), a) for (x, y), a in
+                     zip(snapshot.food_positions.tolist(), snapshot.food_angles.tolist())]
+            self.c_pos = (self.c_pos + self.c_velocity) % (2*pi)
+            self.draw_objects(creatures, foods)
+        else:
+            self.c_pos = (self.c_pos + self.c_velocity) % (2*pi)
+            self.renderer.render(snapshot, self.c_pos)
+        self.flip()
+
+    def draw_snapshot(self, snapshot: Snapshot):
+        self.handle_events()
+        self._exit_if_closed()
+        self.render(snapshot)
+        
+    def frame_due(self) -> bool:
+        if self.fps is None:
+            return True
+        now = perf_counter()
+        if now < self._next_frame:
+            return False
+        self._next_frame = now + 1/self.fps
+        return True
+        
+    def on_tick(self, simulation: Simulation):
+        # Skip frames rather than slow the simulation down
+        if not self.frame_due():
+            return
+        if self.renderer is not None:
+            self.draw_snapshot(simulation.snapshot())
+        else:
+            self.draw(simulation.creatures, simulation.food)
+        
+class ThreadedGraphics(Observer):
+    # Runs the window on its own thread at a capped frame rate. The
+    # simulation only pays for a snapshot when the render thread is ready
+    # for a new frame, every other tick costs one attribute check.
+    # Closing the window raises KeyboardInterrupt in the main thread.
+    def __init__(self, field_space: Tuple[Vector, Vector], display_size: Vector,
+                 fps: float = 60, instanced: bool = True):
+        self.fps = fps
+        self.closed = False
+        self._want_frame = False
+        self._snapshot = None
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        args=(field_space, display_size, instanced),
+                                        name='render', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        
+    def on_tick(self, simulation: Simulation):
+        if self._want_frame:
+            self._want_frame = False
+            self._snapshot = simulation.snapshot()
+            
+    on_generation = on_tick
+    
+    def close(self):
+        self.closed = True
+        self._thread.join()
+        
+    def _run(self, field_space: Tuple[Vector, Vector], display_size: Vector, instanced: bool):
+        # The GL context belongs to whichever thread created it so the
+        # window has to be made here
+        try:
+            graphics = Graphics(field_space, display_size, instanced, fps=None)
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        clock = pygame.time.Clock()
+        snapshot = None
+        while not self.closed:
+            self._want_frame = True
+            graphics.handle_events()
+            if graphics.closed:
+                self.closed = True
+                _thread.interrupt_main()
+                break
+            if self._snapshot is not None:
+                snapshot, self._snapshot = self._snapshot, None
+            if snapshot is not None:
+                graphics.render(snapshot)
+            clock.tick(self.fps)
+        pygame.quit()
         
-class DummyCreature:
+def replay(path: str, display_size: Vector = Vector(1920, 1080), speed: float = 60,
+           generation: int = 0, fps: float = 60):
+    # Plays back a trajectory log at `speed` ticks per second. Space pauses,
+    # up/down double/halve the speed, page up/down jump a generation,
+    # home goes back to the start. Fast speeds skip ticks rather than
+    # decoding every one.
+    from Trajectory import TrajectoryReader
+    reader = TrajectoryReader(path)
+    if not len(reader):
+        raise ValueError(f"{path} has no ticks in it")
+    graphics = Graphics(reader.field_space, display_size, fps=None)
+    state = {'frame': float(reader.generation_start(generation)), 'speed': speed, 'paused': False}
+
+    def seek_generation(step: int):
+        current = reader.generation_of(int(state['frame']))
+        state['frame'] = float(reader.generation_start(current + step))
+
+    def scale_speed(factor: float):
+        state['speed'] *= factor
+
+    def toggle_pause():
+        state['paused'] = not state['paused']
+
+    graphics.key_handlers.update({
+        pygame.K_SPACE:    toggle_pause,
+        pygame.K_UP:       lambda: scale_speed(2),
+        pygame.K_DOWN:     lambda: scale_speed(0.5),
+        pygame.K_PAGEUP:   lambda: seek_generation(1),
+        pygame.K_PAGEDOWN: lambda: seek_generation(-1),
+        pygame.K_HOME:     lambda: state.update(frame=0.0),
+    })
+    shown = None
+    last = perf_counter()
+    while True:
+        now = perf_counter()
+        if not state['paused']:
+            state['frame'] = min(state['frame'] + (now - last)*state['speed'], len(reader) - 1)
+        last = now
+        frame = int(state['frame'])
+        if frame != shown:
+            snapshot = reader.frame(frame)
+            pygame.display.set_caption(f'Generation {snapshot.generation}, tick {snapshot.tick}'
+                                       f' at {state["speed"]:g} ticks/s')
+            shown = frame
+        graphics.draw_snapshot(snapshot)
+        sleep(max(0, 1/fps - (perf_counter() - now)))
+
+class DummyCreature(UnitHeading):
     def __init__(self, pos: Vector, heading: RadianAngle):
         self.position = pos
         self.heading = heading
@@ -299,3 +492,4 @@ if __name__ == '__main__':
         else:
             creature.position = creature.position - Vector(5,0)
         g.draw([creature], food)
+        pygame.time.wait(10)
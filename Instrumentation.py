@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Deque, Dict, TextIO
+import sys
+
+class Profiler:
+    # Timers and counters for the phases of the simulation loop. Attach
+    # with Simulation(profiler=...), with no profiler attached the loop
+    # only pays for an 'is None' check per phase.
+    #
+    # Phases are timed inclusively, so 'calculate_turn' contains 'move'
+    # and 'eat'. At the end of every generation the totals are rolled into
+    # a summary dict, kept in .summaries (the last `keep` of them) and
+    # passed to on_generation if given.
+    def __init__(self, on_generation: Callable[[dict], None] = None, keep: int = 1000):
+        self.on_generation = on_generation
+        self.summaries: Deque[dict] = deque(maxlen=keep)
+        self._reset()
+
+    def _reset(self):
+        self.times: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._started = perf_counter()
+
+    def add(self, phase: str, seconds: float):
+        self.times[phase] += seconds
+        self.calls[phase] += 1
+
+    def count(self, counter: str, n: int = 1):
+        self.counters[counter] += n
+
+    @contextmanager
+    def phase(self, phase: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, perf_counter() - start)
+
+    def end_generation(self, generation: int) -> dict:
+        summary = {
+            'generation': generation,
+            'wall': perf_counter() - self._started,
+            'phases': {name: {'seconds': self.times[name], 'calls': self.calls[name]}
+                       for name in self.times},
+            'counters': dict(self.counters),
+        }
+        self.summaries.append(summary)
+        if self.on_generation is not None:
+            self.on_generation(summary)
+        self._reset()
+        return summary
+
+def format_summary(summary: dict) -> str:
+    wall = summary['wall'] or float('inf')
+    lines = [f"generation {summary['generation']}: {summary['wall']:.3f}s"
+             + ''.join(f", {k} {v}" for k, v in summary['counters'].items())]
+    phases = sorted(summary['phases'].items(), key=lambda p: -p[1]['seconds'])
+    for name, phase in phases:
+        per_call = phase['seconds']/phase['calls']*1e6 if phase['calls'] else 0
+        lines.append(f"  {name:<24} {phase['seconds']:9.4f}s {100*phase['seconds']/wall:5.1f}%"
+                     f" {phase['calls']:>10} calls {per_call:9.2f}us/call")
+    return '\n'.join(lines)
+
+def print_summary(summary: dict, file: TextIO = None):
+    print(format_summary(summary), file=file or sys.stderr)
@@ -2,64 +2,74 @@
 
 from __future__ import annotations
 import math
-from typing import Union, Tuple
+import numpy as np
+from typing import Iterable, List, Union, Tuple
 
 NumericType = Union[float, int]
 AngleType   = Union[float, int, 'RadianAngle']
 VectorType  = Union['Vector', 'PolarVector']
 
-class Vector(tuple):
-    def __new__(cls, x: float, y: float):
-        if type(x) == int:
-             x = float(x)
-        if type(x) in (float, property):
-             if type(y) == int:
-                 y = float(y)
-             if type(y) in (float, property):
-                 return tuple.__new__(cls, (x, y))
-             raise TypeError(f"y has incorrect type of: {type(y)}")
-        raise TypeError(f"x has incorrect type of {type(x)}")
+class Vector:
+    # Plain slotted pair of floats. Treat as immutable, every operation
+    # returns a new Vector. Arithmetic builds results through _vector()
+    # which skips the float conversion done by the public constructor.
+    # Not hashable, nothing actually stops x and y being assigned.
+    __slots__ = ('x', 'y')
+    
+    def __init__(self, x: NumericType, y: NumericType):
+        self.x = float(x)
+        self.y = float(y)
+        
+    def __iter__(self):
+        yield self.x
+        yield self.y
         
+    def __getitem__(self, item):
+        raise TypeError
     
-    @property
-    def x(self):
-        return tuple.__getitem__(self, 0)
+    def __copy__(self) -> Vector:
+        # Vectors are immutable so there is nothing to copy
+        return self
     
-    @property
-    def y(self):
-        return tuple.__getitem__(self, 1)
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Vector):
+            return self.x == other.x and self.y == other.y
+        return NotImplemented
     
-    def __getitem__(self, item):
-        raise TypeError
+    def __repr__(self) -> str:
+        return f"({self.x}, {self.y})"
         
     def __add__(self, other: Union[NumericType, VectorType]) -> Vector:
-        if type(other) in [int, float]:
-            return Vector(self.x + other, self.y + other)
-        elif isinstance(other, Vector):
-            return Vector(self.x + other.x, self.y + other.y)
+        if isinstance(other, Vector):
+            return _vector(self.x + other.x, self.y + other.y)
+        if type(other) in (int, float):
+            return _vector(self.x + other, self.y + other)
+        return NotImplemented
             
-    def __radd__(self, other: Union[NumericType, VectorType]) -> Vector:
-        if type(other) in [int, float]:
-            return Vector(self.x + other, self.y + other)
-        elif isinstance(other, Vector):
-            return Vector(self.x + other.x, self.y + other.y)
-        
+    __radd__ = __add__
         
     def __sub__(self, other: Union[NumericType, VectorType]) -> Vector:
-        if type(other) in [int, float]:
-            return Vector(self.x - other, self.y - other)
-        elif isinstance(other, Vector):
-            return Vector(self.x - other.x, self.y - other.y)
+        if isinstance(other, Vector):
+            return _vector(self.x - other.x, self.y - other.y)
+        if type(other) in (int, float):
+            return _vector(self.x - other, self.y - other)
+        return NotImplemented
             
     def __rsub__(self, other: Union[NumericType, VectorType]) -> Vector:
-        if type(other) in [int, float]:
-            return Vector(self.x - other, self.y - other)
-        elif isinstance(other, Vector):
-            return Vector(self.x - other.x, self.y - other.y)
+        if type(other) in (int, float):
+            return _vector(other - self.x, other - self.y)
+        return NotImplemented
+    
+    def __mul__(self, other: NumericType) -> Vector:
+        if type(other) in (int, float):
+            return _vector(self.x*other, self.y*other)
+        return NotImplemented
+    
+    __rmul__ = __mul__
         
     def __truediv__(self, other: Numeric) -> Vector:
-        if type(other) in [int, float]:
-            return Vector(self.x/other, self.y/other)
+        if type(other) in (int, float):
+            return _vector(self.x/other, self.y/other)
         raise TypeError(f"unsupported operand types(s) for /: 'Vector' and '{type(other)}'")
     
     def __rtruediv__(self, other: Numeric) -> Vector:
@@ -67,81 +77,218 @@ class Vector(tuple):
     
     @classmethod
     def fromPolar(cls, vector):
-        return Vector(vector.x, vector.y)
+        return _vector(vector.x, vector.y)
+
+_new_object = object.__new__
+
+def _vector(x: float, y: float) -> Vector:
+    v = _new_object(Vector)
+    v.x = x
+    v.y = y
+    return v
         
 class RadianAngle(float):
+    __slots__ = ()
+    
     def __new__(cls, v0: NumericType) -> RadianAngle:
         if type(v0) is RadianAngle:
             return v0
-        if type(v0) is int:
-            v0 = float(v0)
-        if not type(v0) is float:
+        if not isinstance(v0, (float, int)):
             raise TypeError(f"Unexpected type for angle: {type(v0)}")
-        return float.__new__(cls, v0)
+        return _new_float(cls, v0)
         
     def __add__(self, other: AngleType) -> RadianAngle:
-        return RadianAngle(self.real + other)
+        return _new_float(RadianAngle, _float_add(self, other))
     
-    def __radd__(self, other: AngleType) -> RadianAngle:
-        return RadianAngle(self.real + other)
+    __radd__ = __add__
     
     def __mul__(self, other: AngleType) -> RadianAngle:
-        return RadianAngle(self.real * other)
+        return _new_float(RadianAngle, _float_mul(self, other))
 
-    def __rmul__(self, other: AngleType) -> RadianAngle:
-        return RadianAngle(self.real * other)
+    __rmul__ = __mul__
     
     def __repr__(self) -> str:
         return str(self.real)
     
-    def __lt__(self, other: AngleType) -> bool:
-        return self.real < other
-    
-    def __rlt__(self, other: AngleType) -> bool:
-        return other < self.real
-    
-    def __gt__(self, other: AngleType) -> bool:
-        return self.real > other
-    
-    def __rgt__(self, other: AngleType) -> bool:
-        return other > self.real
-    
     @classmethod
     def from_degrees(cls, value: Union[int, float]) -> RadianAngle:
         return RadianAngle(math.radians(value))
+
+_new_float = float.__new__
+_float_add = float.__add__
+_float_mul = float.__mul__
     
 class PolarVector(Vector):
-    def __new__(cls, angle: AngleType, magnitude: int) -> PolarVector:
-        if not type(angle) in [int, float, RadianAngle]:
-            raise TypeError(f"Unexpected type for polar vector: {type(angle)}")
-        elif type(angle) in [float, int]:
-            angle = RadianAngle(angle % 2*math.pi)
+    # Keeps the angle and magnitude it was built from alongside the
+    # cartesian components so neither form has to be recomputed.
+    __slots__ = ('_angle', '_magnitude')
+    
+    def __init__(self, angle: AngleType, magnitude: NumericType):
+        if type(angle) is not RadianAngle:
+            if not isinstance(angle, (int, float)):
+                raise TypeError(f"Unexpected type for polar vector: {type(angle)}")
+            angle = RadianAngle(angle % (2*math.pi))
         if magnitude < 0:
             raise ValueError(f"Passed value {magnitude} is not 0 or greater.")
-        
-        return Vector.__new__(cls,
-            magnitude*math.cos(angle),
-            magnitude*math.sin(angle))
+        self._angle = angle
+        self._magnitude = magnitude = float(magnitude)
+        self.x = magnitude*math.cos(angle)
+        self.y = magnitude*math.sin(angle)
         
     @property
     def angle(self) -> RadianAngle:
-        return RadianAngle(math.atan2(self.y, self.x))
+        return self._angle
         
     @property
     def magnitude(self) -> float:
-        return math.hypot(self.x, self.y)
+        return self._magnitude
 
     def __repr__(self) -> str:
         return f"Angle: {self.angle}, Magnitude: {self.magnitude}"
     
     @classmethod
     def fromVector(cls, vector: Vector) -> PolarVector:
-        return PolarVector(RadianAngle(math.atan2(vector.y, vector.x)), math.hypot(vector.x, vector.y))
+        # Reuse the components we already have instead of going back
+        # through cos/sin
+        x, y = vector.x, vector.y
+        p = _new_object(PolarVector)
+        p._angle = _new_float(RadianAngle, math.atan2(y, x))
+        p._magnitude = math.hypot(x, y)
+        p.x = x
+        p.y = y
+        return p
+    
+    @classmethod
+    def fromParts(cls, angle: AngleType, magnitude: float, x: float, y: float) -> PolarVector:
+        # When the caller already has both forms, e.g. from a cached
+        # cos/sin, angle is assumed to be in [0, 2pi)
+        p = _new_object(PolarVector)
+        p._angle = _new_float(RadianAngle, angle)
+        p._magnitude = magnitude
+        p.x = x
+        p.y = y
+        return p
+
+class UnitHeading:
+    # Mixin for anything with a `heading` angle: heading_vector() gives its
+    # cos and sin, worked out again only when the heading has changed since
+    # the last call. Steering and drawing both use it.
+    _unit = (None, 1.0, 0.0)
+    
+    def heading_vector(self) -> Tuple[float, float]:
+        heading, c, s = self._unit
+        if heading != self.heading:
+            heading = self.heading
+            c, s = math.cos(heading), math.sin(heading)
+            self._unit = (heading, c, s)
+        return c, s
+
+class TrigTable:
+    # cos and sin looked up from 2**bits evenly spaced angles instead of
+    # computed, several times faster on arrays but only good to about
+    # pi/2**bits radians. Opt in for the vectorised paths.
+    def __init__(self, bits: int = 16):
+        self.bits = bits
+        self.size = 1 << bits
+        self.scale = self.size/(2*math.pi)
+        angles = np.arange(self.size)/self.scale
+        self.cos = np.cos(angles)
+        self.sin = np.sin(angles)
+        
+    def cos_sin(self, angles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Any angle, not just [0, 2pi), as the index wraps round
+        i = np.rint(np.asarray(angles)*self.scale).astype(np.intp)
+        i &= self.size - 1
+        return self.cos[i], self.sin[i]
+        
+    def __reduce__(self):
+        # Rebuilt rather than pickled with its tables
+        return (TrigTable, (self.bits,))
+
+class VectorArray:
+    # Many vectors at once as an (n, 2) float array, for the batched code
+    # paths. Supports the same accessors as Vector/PolarVector, each
+    # returning an array.
+    __slots__ = ('xy',)
+    
+    def __init__(self, xy: np.ndarray):
+        self.xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        
+    def __len__(self) -> int:
+        return len(self.xy)
+    
+    def __getitem__(self, item) -> Union[Vector, VectorArray]:
+        if isinstance(item, (int, np.integer)):
+            return _vector(float(self.xy[item, 0]), float(self.xy[item, 1]))
+        return VectorArray(self.xy[item])
+    
+    def __iter__(self):
+        for x, y in self.xy.tolist():
+            yield _vector(x, y)
+    
+    @property
+    def x(self) -> np.ndarray:
+        return self.xy[:, 0]
+    
+    @property
+    def y(self) -> np.ndarray:
+        return self.xy[:, 1]
+    
+    @property
+    def angle(self) -> np.ndarray:
+        return np.arctan2(self.xy[:, 1], self.xy[:, 0])
+    
+    @property
+    def magnitude(self) -> np.ndarray:
+        return np.hypot(self.xy[:, 0], self.xy[:, 1])
+    
+    def _operand(self, other):
+        if isinstance(other, VectorArray):
+            return other.xy
+        if isinstance(other, Vector):
+            return np.array((other.x, other.y))
+        return other
+    
+    def __add__(self, other) -> VectorArray:
+        return VectorArray(self.xy + self._operand(other))
+    
+    __radd__ = __add__
+    
+    def __sub__(self, other) -> VectorArray:
+        return VectorArray(self.xy - self._operand(other))
+    
+    def __rsub__(self, other) -> VectorArray:
+        return VectorArray(self._operand(other) - self.xy)
+    
+    def __mul__(self, other) -> VectorArray:
+        return VectorArray(self.xy*np.reshape(other, (-1, 1)) if np.ndim(other) else self.xy*other)
+    
+    __rmul__ = __mul__
+    
+    def __truediv__(self, other) -> VectorArray:
+        return VectorArray(self.xy/np.reshape(other, (-1, 1)) if np.ndim(other) else self.xy/other)
+    
+    @classmethod
+    def from_vectors(cls, vectors: Iterable[Vector]) -> VectorArray:
+        return cls(np.array([(v.x, v.y) for v in vectors], dtype=np.float64))
+    
+    @classmethod
+    def from_polar(cls, angles: np.ndarray, magnitudes: np.ndarray) -> VectorArray:
+        angles = np.asarray(angles, dtype=np.float64)
+        magnitudes = np.asarray(magnitudes, dtype=np.float64)
+        return cls(np.stack((magnitudes*np.cos(angles), magnitudes*np.sin(angles)), axis=-1))
+    
+    def to_vectors(self) -> List[Vector]:
+        return list(self)
 
     
 def dist(x: VectorType, y: VectorType) -> float:
     return math.hypot(x.x - y.x, x.y - y.y)
 
+def dist_many(points: VectorArray, point: VectorType) -> np.ndarray:
+    # Distance from every vector in points to a single point
+    return np.hypot(points.xy[:, 0] - point.x, points.xy[:, 1] - point.y)
+
 def intersectionq(line1: Tuple[VectorType, VectorType], line2: Tuple[VectorType, VectorType]) -> Vector:
     X1, X2 = line1[0].x, line1[1].x
     X3, X4 = line2[0].x, line2[1].x
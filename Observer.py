@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+
+class Observer:
+    # Base class for anything that wants to watch a Simulation without
+    # the simulation having to know about it (renderers, loggers, ...).
+    # Both hooks are no-ops so subclasses only override what they need.
+    def on_tick(self, simulation: Simulation):
+        pass
+
+    def on_generation(self, simulation: Simulation):
+        pass
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+import os
+import sys
+
+# PyOpenGL picks its platform on first import, so this module has to be
+# imported before anything else pulls in OpenGL
+if 'OpenGL' in sys.modules and os.environ.get('PYOPENGL_PLATFORM') != 'egl':
+    raise ImportError("OffscreenGL must be imported before OpenGL is")
+os.environ['PYOPENGL_PLATFORM'] = 'egl'
+# Mesa: don't go looking for an X or Wayland server
+os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+from OpenGL import EGL
+from OpenGL.GL import *
+import numpy as np
+import ctypes
+
+class OffscreenContext:
+    # An OpenGL context drawing into an EGL pbuffer, needs no display
+    # server. Made current on the thread that creates it.
+    def __init__(self, width: int, height: int):
+        self.width, self.height = width, height
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        if not EGL.eglInitialize(self.display, None, None):
+            raise RuntimeError("could not initialise EGL")
+        attribs = (
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_NONE)
+        attribs = (EGL.EGLint*len(attribs))(*attribs)
+        config, count = EGL.EGLConfig(), EGL.EGLint()
+        if not EGL.eglChooseConfig(self.display, attribs, ctypes.pointer(config), 1,
+                                   ctypes.pointer(count)) or not count.value:
+            raise RuntimeError("no EGL config for offscreen OpenGL")
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, None)
+        size = (EGL.EGLint*5)(EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE)
+        self.surface = EGL.eglCreatePbufferSurface(self.display, config, size)
+        self.make_current()
+        glViewport(0, 0, width, height)
+
+    def make_current(self):
+        EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context)
+
+    def read_pixels(self) -> np.ndarray:
+        # (height, width, 3) uint8 image, top row first
+        glFinish()
+        data = glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE)
+        image = np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)
+        return image[::-1]
+
+    def close(self):
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroySurface(self.display, self.surface)
+        EGL.eglDestroyContext(self.display, self.context)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from MapUtils import Vector, RadianAngle, TrigTable
+from Creature import (Creature, Food, BASE_TURN_SPEED, BASE_MOVE_SPEED,
+                      BASE_TURN_ENRGY, BASE_MOVE_ENRGY, FOOD_ENERGY)
+from Spawning import FoodSpawner
+from Genome import Genome, DEFAULT_GENOME
+from Sensing import PointGrid, Radii, BRUTE_FORCE_PAIRS, brute_nearest
+from typing import List, Tuple
+from time import perf_counter
+import numpy as np
+import math
+
+class FoodBatch:
+    # All the food in the field as flat arrays, eaten food is masked out
+    # rather than removed so indices stay valid for the whole generation.
+    def __init__(self, positions: np.ndarray, angles: np.ndarray, energy: np.ndarray):
+        self.positions = np.ascontiguousarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.angles    = np.ascontiguousarray(angles, dtype=np.float64)
+        self.energy    = np.ascontiguousarray(energy, dtype=np.float64)
+        self.alive     = np.ones(len(self.angles), dtype=bool)
+        # Spatial index over the food that was left when it was built, see grid
+        self._grid = self._grid_idx = None
+
+    def __len__(self) -> int:
+        return int(self.alive.sum())
+
+    @classmethod
+    def spawn(cls, spawner: FoodSpawner, field_space: Tuple[Vector, Vector], amount: int,
+              rng: np.random.Generator) -> FoodBatch:
+        positions, angles = spawner.spawn(field_space, amount, rng)
+        return cls(positions, angles, np.full(amount, float(FOOD_ENERGY)))
+
+    @classmethod
+    def from_food(cls, foods: List[Food]) -> FoodBatch:
+        batch = cls(np.array([(f.position.x, f.position.y) for f in foods], dtype=np.float64),
+                    np.array([f.angle for f in foods], dtype=np.float64),
+                    np.array([f.energy for f in foods], dtype=np.float64))
+        batch.alive[:] = [not f.eaten for f in foods]
+        return batch
+
+    def to_food(self) -> List[Food]:
+        foods = []
+        for i in np.flatnonzero(self.alive):
+            food = Food(Vector(float(self.positions[i, 0]), float(self.positions[i, 1])),
+                        float(self.angles[i]))
+            food.energy = float(self.energy[i])
+            foods.append(food)
+        return foods
+
+    def grid(self) -> Tuple[PointGrid, np.ndarray]:
+        # PointGrid over the uneaten food and the food index of each of its
+        # points. Positions never change, so it is only rebuilt once half
+        # the food in it has been eaten, to keep searches from wading
+        # through eaten food.
+        if self._grid is None or 2*np.count_nonzero(self.alive[self._grid_idx]) < len(self._grid_idx):
+            self._grid_idx = np.flatnonzero(self.alive)
+            self._grid = PointGrid(self.positions[self._grid_idx])
+        return self._grid, self._grid_idx
+
+    def nearest(self, points: np.ndarray, max_dist: Radii = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Index of and distance to the closest uneaten food for each point,
+        # -1 and inf if there is none within max_dist
+        if self._grid is None and len(points)*len(self.alive) <= BRUTE_FORCE_PAIRS:
+            # Too few to be worth a grid
+            return brute_nearest(points, self.positions, np.flatnonzero(self.alive), max_dist)
+        grid, idx = self.grid()
+        closest, cdist = grid.nearest(points, max_dist, self.alive[idx])
+        found = closest >= 0
+        closest[found] = idx[closest[found]]
+        return closest, cdist
+
+    def within(self, points: np.ndarray, radii: Radii) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # (point, food, distance) for all uneaten food within radii of points
+        grid, idx = self.grid()
+        point, food, distance = grid.within(points, radii, self.alive[idx])
+        return point, idx[food], distance
+
+
+class Population:
+    # Structure-of-arrays version of a list of Creatures. Row i of every
+    # array belongs to the same creature.
+    def __init__(self, positions: np.ndarray, headings: np.ndarray, energy: np.ndarray,
+                 sense: np.ndarray, size: np.ndarray,
+                 turn_speed: np.ndarray, move_speed: np.ndarray,
+                 genome: Genome = DEFAULT_GENOME):
+        n = len(headings)
+        self.positions     = np.ascontiguousarray(positions, dtype=np.float64).reshape(n, 2)
+        self.headings      = np.ascontiguousarray(headings, dtype=np.float64)
+        self.energy        = np.ascontiguousarray(energy, dtype=np.float64)
+        self.sense         = np.ascontiguousarray(sense, dtype=np.float64)
+        self.size          = np.ascontiguousarray(size, dtype=np.float64)
+        self.turn_speed    = np.ascontiguousarray(turn_speed, dtype=np.float64)
+        self.move_speed    = np.ascontiguousarray(move_speed, dtype=np.float64)
+        self.got_food      = np.zeros(n, dtype=bool)
+        self.task_finished = np.zeros(n, dtype=bool)
+        # How the gene arrays (sense, size, ...) mutate, shared by the whole
+        # population as every creature descends from the same genes
+        self.genome = genome
+        # Indices of the creatures still active this generation, worked out
+        # on first use and then narrowed down by step
+        self._active_idx = None
+
+    def __len__(self) -> int:
+        return len(self.headings)
+
+    @property
+    def active(self) -> np.ndarray:
+        return ~self.task_finished & (self.energy > 0)
+
+    @property
+    def active_indices(self) -> np.ndarray:
+        if self._active_idx is None:
+            self._active_idx = np.flatnonzero(self.active)
+        return self._active_idx
+
+    def refresh_active(self):
+        # Call after changing task_finished or energy from outside step
+        self._active_idx = None
+
+    @classmethod
+    def from_creatures(cls, creatures: List[Creature], genome: Genome = DEFAULT_GENOME) -> Population:
+        genes = genome.pack(creatures)
+        pop = cls(np.array([(c.position.x, c.position.y) for c in creatures], dtype=np.float64),
+                  np.array([c.heading for c in creatures], dtype=np.float64),
+                  np.array([c.energy for c in creatures], dtype=np.float64),
+                  genome=genome, **{name: genes[:, i] for i, name in enumerate(genome.columns)})
+        pop.got_food[:] = [c.got_food for c in creatures]
+        pop.task_finished[:] = [c.task_finished for c in creatures]
+        return pop
+
+    def genes(self) -> np.ndarray:
+        # Packed (n, len(genome.columns)) copy of the gene arrays
+        return np.stack([getattr(self, name) for name in self.genome.columns], axis=1)
+
+    def to_creatures(self) -> List[Creature]:
+        genome = self.genome
+        genes = self.genes().tolist()
+        creatures = []
+        for i in range(len(self)):
+            g = genome.unpack(genes[i])
+            c = Creature(Vector(float(self.positions[i, 0]), float(self.positions[i, 1])),
+                         float(self.energy[i]), g['senseg'], g['sizeg'], g['speedg'],
+                         RadianAngle(float(self.headings[i])))
+            c.got_food = bool(self.got_food[i])
+            c.task_finished = bool(self.task_finished[i])
+            creatures.append(c)
+        return creatures
+
+    def move(self, idx: np.ndarray, targets: np.ndarray, trig: TrigTable = None):
+        # Vectorised Creature.move for the creatures in idx, cos/sin come
+        # from trig if given
+        pos = self.positions[idx]
+        heading = self.headings[idx]
+        turn_speed = self.turn_speed[idx]
+        course = targets - pos
+        distance = np.hypot(course[:, 0], course[:, 1])
+        angle = np.arctan2(course[:, 1], course[:, 0])
+        course_correction = np.where(distance > 0,
+            (angle - heading + math.pi) % (2*math.pi) - math.pi, 0.0)
+        correction = np.where(np.abs(course_correction) < turn_speed,
+            course_correction, np.copysign(turn_speed, course_correction))
+
+        heading = (heading + correction) % (2*math.pi)
+        self.energy[idx] -= BASE_TURN_ENRGY*(np.abs(correction)/BASE_TURN_SPEED)
+
+        move_speed = np.minimum(distance, self.move_speed[idx])
+        c, s = (np.cos(heading), np.sin(heading)) if trig is None else trig.cos_sin(heading)
+        pos[:, 0] += move_speed*c
+        pos[:, 1] += move_speed*s
+        self.energy[idx] -= BASE_MOVE_ENRGY*(move_speed/BASE_MOVE_SPEED)
+
+        self.headings[idx] = heading
+        self.positions[idx] = pos
+
+    def wander(self, idx: np.ndarray, lo: np.ndarray, hi: np.ndarray, trig: TrigTable = None):
+        # Vectorised Creature.wander
+        pos = self.positions[idx]
+        heading = self.headings[idx]
+        c, s = (np.cos(heading), np.sin(heading)) if trig is None else trig.cos_sin(heading)
+        step = self.move_speed[idx, None]*np.stack((c, s), axis=1)
+        ahead = pos + step
+        step = np.where((ahead < lo) | (ahead > hi), -step, step)
+        self.move(idx, pos + step, trig)
+
+    def step(self, food: FoodBatch, field_space: Tuple[Vector, Vector],
+             sense_limited: bool = False, profiler: Profiler = None, trig: TrigTable = None):
+        # One tick for the whole population, the batched equivalent of
+        # calling Creature.calculate_turn on each creature. Every creature
+        # picks its target from the food left at the start of the tick, if
+        # several reach the same food the one earliest in the arrays eats it.
+        # Finished and dead creatures are left out entirely. With a TrigTable
+        # headings are turned into steps with its approximate cos/sin.
+        lo = np.array((field_space[0].x, field_space[0].y))
+        hi = np.array((field_space[1].x, field_space[1].y))
+        seekers, homers = self.split(food.alive.any())
+        eaters, eaten = self.seek(food, seekers, lo, hi, sense_limited, profiler, trig)
+        self.feed(food, eaters, eaten)
+        self.home(homers, lo, hi, profiler, trig)
+        self.end_tick(lo, hi)
+
+    # The phases of step, separate so a tick can be coordinated with other
+    # populations (see Tiling) between seeking and eating
+
+    def split(self, food_left: bool) -> Tuple[np.ndarray, np.ndarray]:
+        # Active creatures still looking for food, and those going home
+        active = self.active_indices
+        if not food_left:
+            return active[:0], active
+        got_food = self.got_food[active]
+        return active[~got_food], active[got_food]
+
+    def seek(self, food: FoodBatch, seekers: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+             sense_limited: bool = False, profiler: Profiler = None,
+             trig: TrigTable = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Moves the seekers towards their closest food (or wanders them if
+        # none is in sight), returns the (creature, food) pairs close enough
+        # to eat with each food going to the earliest creature
+        if not len(seekers):
+            return seekers, seekers
+        if not food.alive.any():
+            self.wander(seekers, lo, hi, trig)
+            return seekers[:0], seekers[:0]
+        if profiler is not None:
+            start = perf_counter()
+        # Only as far as they can sense if limited
+        closest, cdist = food.nearest(self.positions[seekers], self.sense[seekers] if sense_limited else None)
+        if profiler is not None:
+            profiler.add('nearest', perf_counter() - start)
+            start = perf_counter()
+        if sense_limited:
+            in_sight = cdist <= self.sense[seekers]
+            self.wander(seekers[~in_sight], lo, hi, trig)
+            seekers, closest = seekers[in_sight], closest[in_sight]
+        self.move(seekers, food.positions[closest], trig)
+        if profiler is not None:
+            profiler.add('move', perf_counter() - start)
+            start = perf_counter()
+        diff = self.positions[seekers] - food.positions[closest]
+        reached = np.hypot(diff[:, 0], diff[:, 1]) < self.size[seekers]*2
+        eaters, eaten = seekers[reached], closest[reached]
+        eaten, first = np.unique(eaten, return_index=True)
+        if profiler is not None:
+            profiler.add('eat', perf_counter() - start)
+        return eaters[first], eaten
+
+    def feed(self, food: FoodBatch, eaters: np.ndarray, eaten: np.ndarray):
+        food.alive[eaten] = False
+        self.got_food[eaters] = True
+        self.energy[eaters] += food.energy[eaten]
+
+    def home(self, homers: np.ndarray, lo: np.ndarray, hi: np.ndarray, profiler: Profiler = None,
+             trig: TrigTable = None):
+        if not len(homers):
+            return
+        if profiler is not None:
+            start = perf_counter()
+        pos = self.positions[homers]
+        # Same wall order as calculate_turn: top, right, bottom, left
+        wall_dists = np.stack((hi[1] - pos[:, 1], hi[0] - pos[:, 0],
+                               pos[:, 1] - lo[1], pos[:, 0] - lo[0]), axis=1)
+        closest_wall = np.argmin(np.abs(wall_dists), axis=1)
+        targets = pos.copy()
+        targets[closest_wall == 0, 1] = hi[1]
+        targets[closest_wall == 1, 0] = hi[0]
+        targets[closest_wall == 2, 1] = lo[1]
+        targets[closest_wall == 3, 0] = lo[0]
+        self.move(homers, targets, trig)
+
+        pos = self.positions[homers]
+        wall_dists = np.abs(np.stack((hi[1] - pos[:, 1], hi[0] - pos[:, 0],
+                                      pos[:, 1] - lo[1], pos[:, 0] - lo[0]), axis=1))
+        finished = (wall_dists < self.size[homers, None]).any(axis=1)
+        self.task_finished[homers[finished]] = True
+        if profiler is not None:
+            profiler.add('home', perf_counter() - start)
+
+    def end_tick(self, lo: np.ndarray, hi: np.ndarray):
+        # Keeps everyone in the field and drops the creatures that
+        # finished or died this tick from the active set
+        active = self.active_indices
+        self.positions[active] = np.clip(self.positions[active], lo, hi)
+        self._active_idx = active[~self.task_finished[active] & (self.energy[active] > 0)]
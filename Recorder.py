@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from Observer import Observer
+from Stats import GENE_COLUMNS, population_arrays
+from typing import Dict, Tuple
+import numpy as np
+import json
+import math
+import os
+import struct
+
+MAGIC = b'EVOGEN1\n'
+
+# (low, high, bins) of the histogram kept for each column, values outside
+# the range are counted in the end bins
+DEFAULT_BINS = {
+    'sense':      (0, 50, 50),
+    'size':       (0, 50, 50),
+    'turn_speed': (0, 2*math.pi, 36),
+    'move_speed': (0, 20, 40),
+    'energy':     (0, 20000, 40),
+}
+
+def record_dtype(bins: Dict[str, Tuple[float, float, int]]) -> np.dtype:
+    fields = [('generation', '<i8'), ('ticks', '<i8'), ('population', '<i8'), ('food', '<i8')]
+    for name in GENE_COLUMNS:
+        fields += [(f'{name}_mean', '<f8'), (f'{name}_std', '<f8'),
+                   (f'{name}_min', '<f8'), (f'{name}_max', '<f8'),
+                   (f'{name}_hist', '<i4', (bins[name][2],))]
+    return np.dtype(fields)
+
+class GenerationRecorder(Observer):
+    # Appends one fixed size binary record per generation to a file.
+    # Records are buffered in a small preallocated array and written out
+    # whenever it fills (and on flush/close), so memory use doesn't grow
+    # with the length of the run.
+    #
+    # File layout: MAGIC, a little endian uint32 header length, a JSON
+    # header (dtype and histogram bins), then the packed records. Opening
+    # an existing file with the same layout and bins appends to it.
+    def __init__(self, path: str, buffer_rows: int = 256,
+                 bins: Dict[str, Tuple[float, float, int]] = None):
+        self.path = path
+        self.bins = {**DEFAULT_BINS, **(bins or {})}
+        self.dtype = record_dtype(self.bins)
+        self.buffer = np.zeros(buffer_rows, dtype=self.dtype)
+        self.pending = 0
+
+        header = json.dumps({'dtype': self.dtype.descr, 'bins': self.bins}).encode()
+        if os.path.exists(path) and os.path.getsize(path):
+            existing, _ = read_header(path)
+            wanted = json.loads(header)
+            if existing['dtype'] != wanted['dtype']:
+                raise ValueError(f"{path} was written with a different record layout")
+            # Same bin counts but different ranges would fit the layout and
+            # still mean something else
+            changed = [name for name in GENE_COLUMNS
+                       if existing['bins'].get(name) != wanted['bins'][name]]
+            if changed:
+                raise ValueError(f"{path} was written with different histogram bins for "
+                                 f"{', '.join(changed)}")
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+    def __enter__(self) -> GenerationRecorder:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, simulation: Simulation):
+        arrays = population_arrays(simulation)
+        row = self.buffer[self.pending]
+        row['generation'] = simulation.generation
+        row['ticks'] = simulation.ticks
+        row['population'] = len(arrays['energy'])
+        row['food'] = simulation.food_remaining()
+        for name in GENE_COLUMNS:
+            values = arrays[name]
+            low, high, count = self.bins[name]
+            if len(values):
+                row[f'{name}_mean'] = values.mean()
+                row[f'{name}_std'] = values.std()
+                row[f'{name}_min'] = values.min()
+                row[f'{name}_max'] = values.max()
+                hist, _ = np.histogram(np.clip(values, low, high), count, (low, high))
+                row[f'{name}_hist'] = hist
+            else:
+                row[f'{name}_mean'] = row[f'{name}_std'] = np.nan
+                row[f'{name}_min'] = row[f'{name}_max'] = np.nan
+                row[f'{name}_hist'] = 0
+        self.pending += 1
+        if self.pending == len(self.buffer):
+            self.flush()
+
+    def on_generation(self, simulation: Simulation):
+        self.record(simulation)
+
+    def flush(self):
+        if self.pending:
+            self.file.write(self.buffer[:self.pending].tobytes())
+            self.pending = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+def read_header(path: str) -> Tuple[dict, int]:
+    # The JSON header and the offset the records start at
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a generation record file")
+        length, = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(length))
+    return header, len(MAGIC) + 4 + length
+
+def read_generations(path: str) -> np.ndarray:
+    # Memory maps the records as a structured array, nothing is loaded
+    # until it is used
+    header, offset = read_header(path)
+    dtype = np.dtype([tuple(field) if len(field) == 2 else (field[0], field[1], tuple(field[2]))
+                      for field in header['dtype']])
+    count = (os.path.getsize(path) - offset)//dtype.itemsize
+    if not count:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+
+def histogram_edges(path: str, column: str) -> np.ndarray:
+    header, _ = read_header(path)
+    low, high, count = header['bins'][column]
+    return np.linspace(low, high, count + 1)
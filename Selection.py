@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from Population import Population
+from Creature import BIRTH_COST, CHILD_ENERGY
+from abc import ABC, abstractmethod
+from typing import Callable, Tuple
+import numpy as np
+
+# Creatures that made it home need at least this much energy to breed
+REPRODUCE_ENERGY = 150
+
+def affordable(energy: np.ndarray) -> np.ndarray:
+    # How many children each creature can have and still be left with some
+    # energy after paying BIRTH_COST for each, never less than one
+    return np.maximum(1, np.ceil(energy/BIRTH_COST).astype(np.int64) - 1)
+
+def capped_births(energy: np.ndarray, pool: np.ndarray, rng: np.random.Generator,
+                  draw: Callable[[np.ndarray, int], np.ndarray]) -> np.ndarray:
+    # One birth per creature in pool, handed out by draw(candidates, n)
+    # which picks n parents from candidates. A creature that drew more
+    # births than it can afford keeps what it can and the rest are drawn
+    # again among the others, so nobody starts the next generation broke.
+    counts = np.zeros(len(energy), dtype=np.int64)
+    cap = np.zeros(len(energy), dtype=np.int64)
+    cap[pool] = affordable(energy[pool])
+    remaining = len(pool)
+    while remaining:
+        candidates = pool[counts[pool] < cap[pool]]
+        won = np.bincount(draw(candidates, remaining), minlength=len(energy))
+        won = np.minimum(won, cap - counts)
+        counts += won
+        remaining -= int(won.sum())
+    return counts
+
+class SelectionPolicy(ABC):
+    # Decides at the end of a generation who lives on and how many children
+    # each creature has, from the energy and task_finished arrays of the
+    # whole population at once.
+    #
+    # Every policy has the same number of births, one per creature that
+    # made it home with at least min_energy. They only differ in which of
+    # those creatures become the parents, and no parent has more children
+    # than it can afford (see affordable).
+    def __init__(self, min_energy: float = REPRODUCE_ENERGY):
+        self.min_energy = min_energy
+
+    def select(self, energy: np.ndarray, finished: np.ndarray,
+               rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        # (survivor mask, number of children of each creature)
+        eligible = finished & (energy >= self.min_energy)
+        return finished, self.offspring(energy, eligible, rng)
+
+    @abstractmethod
+    def offspring(self, energy: np.ndarray, eligible: np.ndarray,
+                  rng: np.random.Generator) -> np.ndarray:
+        pass
+
+class ThresholdSelection(SelectionPolicy):
+    # Every eligible creature has exactly one child
+    def offspring(self, energy: np.ndarray, eligible: np.ndarray,
+                  rng: np.random.Generator) -> np.ndarray:
+        return eligible.astype(np.int64)
+
+class TournamentSelection(SelectionPolicy):
+    # Each birth goes to the most energetic of `size` eligible creatures
+    # drawn at random (with replacement)
+    def __init__(self, size: int = 2, min_energy: float = REPRODUCE_ENERGY):
+        super().__init__(min_energy)
+        self.size = size
+
+    def offspring(self, energy: np.ndarray, eligible: np.ndarray,
+                  rng: np.random.Generator) -> np.ndarray:
+        def draw(candidates: np.ndarray, n: int) -> np.ndarray:
+            entrants = candidates[rng.integers(0, len(candidates), (n, self.size))]
+            return entrants[np.arange(n), np.argmax(energy[entrants], axis=1)]
+        return capped_births(energy, np.flatnonzero(eligible), rng, draw)
+
+class ProportionalSelection(SelectionPolicy):
+    # Each birth goes to an eligible creature with probability proportional
+    # to its energy (roulette wheel), or evenly if none of them has any
+    def offspring(self, energy: np.ndarray, eligible: np.ndarray,
+                  rng: np.random.Generator) -> np.ndarray:
+        def draw(candidates: np.ndarray, n: int) -> np.ndarray:
+            weights = np.maximum(energy[candidates], 0)
+            total = weights.sum()
+            return candidates[rng.choice(len(candidates), n, p=weights/total if total > 0 else None)]
+        return capped_births(energy, np.flatnonzero(eligible), rng, draw)
+
+SELECTIONS = {
+    'threshold':    ThresholdSelection,
+    'tournament':   TournamentSelection,
+    'proportional': ProportionalSelection,
+}
+
+def reproduce(population: Population, policy: SelectionPolicy,
+              rng: np.random.Generator) -> Population:
+    # The next generation's population: survivors first (in order), then
+    # the children in the order of their parents. Children start where
+    # their parent is, facing the same way.
+    survivors, counts = policy.select(population.energy, population.task_finished, rng)
+    parents = np.repeat(np.arange(len(population)), counts)
+    energy = population.energy - counts*BIRTH_COST
+    genes = population.genes()
+    child_genes = population.genome.mutate(genes[parents], rng)
+
+    keep = np.flatnonzero(survivors)
+    all_genes = np.concatenate([genes[keep], child_genes])
+    return Population(
+        np.concatenate([population.positions[keep], population.positions[parents]]),
+        np.concatenate([population.headings[keep], population.headings[parents]]),
+        np.concatenate([energy[keep], np.full(len(parents), CHILD_ENERGY, dtype=np.float64)]),
+        genome=population.genome,
+        **{name: all_genes[:, i] for i, name in enumerate(population.genome.columns)})
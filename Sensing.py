@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from MapUtils import Vector
+from typing import NamedTuple, Optional, Tuple, Union
+import numpy as np
+import math
+
+# Below about this many query/point pairs checking every pair is cheaper
+# than going through a grid
+BRUTE_FORCE_PAIRS = 1 << 15
+
+Radii = Union[float, np.ndarray]
+
+def brute_nearest(centers: np.ndarray, positions: np.ndarray, idx: np.ndarray,
+                  max_dist: Optional[Radii] = None) -> Tuple[np.ndarray, np.ndarray]:
+    # PointGrid.nearest over positions[idx] by checking every pair,
+    # returns indices from idx
+    n = len(centers)
+    closest = np.full(n, -1, dtype=np.intp)
+    cdist = np.full(n, np.inf)
+    if not len(idx):
+        return closest, cdist
+    diff = centers[:, None, :] - positions[idx][None, :, :]
+    d2 = np.einsum('ijk,ijk->ij', diff, diff)
+    best = np.argmin(d2, axis=1)
+    distance = np.sqrt(d2[np.arange(n), best])
+    found = distance <= (np.inf if max_dist is None else max_dist)
+    closest[found] = idx[best[found]]
+    cdist[found] = distance[found]
+    return closest, cdist
+
+class PointGrid:
+    # Uniform grid over a fixed set of points for batched radius and
+    # nearest queries, the array counterpart of SpatialIndex.FoodGrid.
+    # Points are sorted by cell (order) with starts[c]:starts[c+1] the
+    # slice of order in cell c, so a query only ever looks at the points in
+    # the cells its circle overlaps: the work grows with how crowded it is
+    # locally, not with how many points there are.
+    #
+    # Without a field_space the grid just covers the points.
+    def __init__(self, positions: np.ndarray, field_space: Tuple[Vector, Vector] = None,
+                 cell_size: float = None):
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        n = len(self.positions)
+        if field_space is not None:
+            self.lo = np.array((field_space[0].x, field_space[0].y))
+            self.hi = np.array((field_space[1].x, field_space[1].y))
+        elif n:
+            self.lo, self.hi = self.positions.min(axis=0), self.positions.max(axis=0)
+        else:
+            self.lo = self.hi = np.zeros(2)
+        width, height = self.hi - self.lo
+        if cell_size is None:
+            # Aim for roughly one point per cell, or per strip of the line
+            # if they are all in a line
+            area = width*height
+            cell_size = math.sqrt(area/max(1, n)) if area > 0 else max(width, height)/max(1, n)
+        self.cell_size = max(cell_size, 1e-9)
+        self.shape = np.array((max(1, math.ceil(width/self.cell_size)),
+                               max(1, math.ceil(height/self.cell_size))))
+        cells = self._cells(self.positions)
+        self.order = np.argsort(cells, kind='stable')
+        self.starts = np.zeros(int(self.shape.prod()) + 1, dtype=np.intp)
+        np.cumsum(np.bincount(cells, minlength=len(self.starts) - 1), out=self.starts[1:])
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def _coords(self, points: np.ndarray) -> np.ndarray:
+        # Cell column and row, anything outside the field goes in the edge cells
+        return np.clip(np.floor((points - self.lo)/self.cell_size), 0, self.shape - 1).astype(np.intp)
+
+    def _cells(self, points: np.ndarray) -> np.ndarray:
+        coords = self._coords(points)
+        return coords[:, 1]*self.shape[0] + coords[:, 0]
+
+    def _pairs(self, centers: np.ndarray, radii: np.ndarray,
+               mask: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # (query, point, squared distance) for every point in the cells
+        # covered by each query's circle, a superset of those within radius
+        reach = radii[:, None]*(1 + 1e-9) + 1e-9
+        first = self._coords(centers - reach)
+        last = self._coords(centers + reach)
+        span = last - first + 1
+        boxes = span[:, 0]*span[:, 1]
+        # One row per (query, cell)
+        query = np.repeat(np.arange(len(centers)), boxes)
+        k = np.arange(len(query)) - np.repeat(np.cumsum(boxes) - boxes, boxes)
+        width = span[query, 0]
+        cell = (first[query, 1] + k//width)*self.shape[0] + first[query, 0] + k % width
+        # One row per (query, point in the cell)
+        start = self.starts[cell]
+        count = self.starts[cell + 1] - start
+        query = np.repeat(query, count)
+        k = np.arange(len(query)) - np.repeat(np.cumsum(count) - count, count)
+        point = self.order[np.repeat(start, count) + k]
+        if mask is not None:
+            keep = mask[point]
+            query, point = query[keep], point[keep]
+        diff = centers[query] - self.positions[point]
+        return query, point, np.einsum('ij,ij->i', diff, diff)
+
+    def within(self, centers: np.ndarray, radii: Radii,
+               mask: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Every (query, point, distance) with the point no further than the
+        # query's radius, grouped by query. mask leaves points out.
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (len(centers),))
+        query, point, d2 = self._pairs(centers, radii, mask)
+        distance = np.sqrt(d2)
+        keep = distance <= radii[query]
+        return query[keep], point[keep], distance[keep]
+
+    def nearest(self, centers: np.ndarray, max_dist: Optional[Radii] = None,
+                mask: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Index of and distance to each query's closest point, -1 and inf
+        # where there is none within max_dist. Ties go to the lowest index.
+        # The search radius starts at one cell and doubles for the queries
+        # that haven't found anything yet.
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        n = len(centers)
+        limit = np.full(n, np.inf) if max_dist is None else \
+            np.broadcast_to(np.asarray(max_dist, dtype=np.float64), (n,))
+        if len(self.positions)*n <= BRUTE_FORCE_PAIRS:
+            idx = np.arange(len(self.positions)) if mask is None else np.flatnonzero(mask)
+            return brute_nearest(centers, self.positions, idx, limit)
+        # Radius at which a query's box takes in the whole grid
+        closest = np.full(n, -1, dtype=np.intp)
+        cdist = np.full(n, np.inf)
+        everything = np.hypot(*np.maximum(np.abs(centers - self.lo), np.abs(centers - self.hi)).T)
+        pending = np.arange(n)
+        radius = self.cell_size
+        while len(pending):
+            radii = np.minimum(radius, limit[pending])
+            query, point, d2 = self._pairs(centers[pending], radii, mask)
+            found = self._settle(query, point, d2, radii, pending, closest, cdist)
+            done = found | (radii >= limit[pending]) | (radii >= everything[pending])
+            pending = pending[~done]
+            radius *= 2
+        return closest, cdist
+
+    @staticmethod
+    def _settle(query: np.ndarray, point: np.ndarray, d2: np.ndarray, radii: np.ndarray,
+                rows: np.ndarray, closest: np.ndarray, cdist: np.ndarray) -> np.ndarray:
+        # Records the closest point within radius for each query (rows maps
+        # query numbers to result rows), returns which queries found one.
+        # Pairs come grouped by query so each group is reduced in place.
+        distance = np.sqrt(d2)
+        keep = distance <= radii[query]
+        query, point, d2, distance = query[keep], point[keep], d2[keep], distance[keep]
+        found = np.zeros(len(rows), dtype=bool)
+        if not len(query):
+            return found
+        starts = np.flatnonzero(np.r_[True, query[1:] != query[:-1]])
+        sizes = np.diff(np.r_[starts, len(query)])
+        best = np.minimum.reduceat(d2, starts)
+        # Lowest point index among those at the closest distance
+        tied = np.where(d2 == np.repeat(best, sizes), point, np.iinfo(np.intp).max)
+        winner = np.minimum.reduceat(tied, starts)
+        query = query[starts]
+        closest[rows[query]] = winner
+        cdist[rows[query]] = np.sqrt(best)
+        found[query] = True
+        return found
+
+class Sensed(NamedTuple):
+    # What creatures sensed, each as (creature, thing, distance) arrays
+    # grouped by creature. Food indices are into the FoodBatch, creature
+    # indices into the Population.
+    food:      Tuple[np.ndarray, np.ndarray, np.ndarray]
+    creatures: Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+def sense(population: Population, food: FoodBatch, field_space: Tuple[Vector, Vector],
+          idx: np.ndarray = None, radii: Radii = None) -> Sensed:
+    # The uneaten food and the other living creatures within sensing range
+    # of each creature in idx (the active ones by default), in one batch.
+    # The range is each creature's sense gene unless radii is given.
+    if idx is None:
+        idx = population.active_indices
+    if radii is None:
+        radii = population.sense[idx]
+    centers = population.positions[idx]
+    who, what, distance = food.within(centers, radii)
+    # Creatures move every tick so their grid is built fresh
+    grid = PointGrid(population.positions, field_space)
+    near, other, apart = grid.within(centers, radii, population.energy > 0)
+    near = idx[near]
+    others = other != near
+    return Sensed((idx[who], what, distance), (near[others], other[others], apart[others]))
@@ -2,75 +2,461 @@
 
 from __future__ import annotations
 
-from Graphics import Graphics
-from typing import Tuple
-from MapUtils import Vector, RadianAngle, PolarVector
-from random import randint, uniform
+from typing import Tuple, List
+from Observer import Observer
+from Snapshot import Snapshot
+from Instrumentation import Profiler, print_summary
+from Population import Population, FoodBatch
+from FoodStore import FoodStore
+from Spawning import FoodSpawner, UniformSpawner, SPAWNERS
+from Genome import Genome, DEFAULT_GENOME
+from Selection import SelectionPolicy, ThresholdSelection, SELECTIONS, reproduce
+from FastForward import FastForward
+from Sensing import Sensed, sense
+from MapUtils import Vector, RadianAngle, TrigTable
+from random import Random
+import numpy as np
 from Creature import *
-from math import pi, radians
+from math import pi
+from time import perf_counter, sleep
 
-class Simulation(Graphics):
-    def __init__(self, field_space: Tuple[Vector, Vector], display_size: Vector):
-        super().__init__(field_space, display_size)
+# Settings for the first generation, override any of them by passing a
+# dict with the same keys as Simulation's start argument
+DEFAULT_START = {
+    'count':      1,
+    'energy':     10000,
+    'food':       50,
+    'sense':      10,
+    'size':       1,
+    'turn_speed': BASE_TURN_SPEED,
+    'move_speed': BASE_MOVE_SPEED,
+}
+
+class Simulation:
+    def __init__(self, field_space: Tuple[Vector, Vector], observers: List[Observer] = None,
+                 sense_limited: bool = False, start: dict = None, seed: int = None,
+                 spawner: FoodSpawner = None, profiler: Profiler = None,
+                 genome: Genome = None, selection: SelectionPolicy = None,
+                 fast_forward: bool = False):
+        self.field_space = field_space
+        # With fast_forward creatures heading straight for a target skip
+        # ahead to when they get there, see FastForward
+        self.fast_forward = fast_forward
+        self._cruising = FastForward(field_space) if fast_forward else None
+        self.genome = genome or DEFAULT_GENOME
+        self.selection = selection or ThresholdSelection()
+        self.profiler = profiler
+        self.spawner = spawner or UniformSpawner()
+        # All randomness comes from these, the NumPy one is for bulk draws
+        # in the batched engine
+        self.rng = Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        self.sense_limited = sense_limited
+        self.start = {**DEFAULT_START, **(start or {})}
+        self.observers = list(observers) if observers else []
+        self.generation = 0
+        self.ticks = 0
+        self._food = FoodStore(field_space)
         self.creatures = self._create_starting_creatures()
-        self.food = generate_food_list(field_space, 50)
+        self.respawn_food(self.start['food'])
+        
+    @property
+    def creatures(self) -> List[Creature]:
+        if self._cruising:
+            self._cruising.sync(self.ticks)
+        return self._creatures
+    
+    @creatures.setter
+    def creatures(self, creatures: List[Creature]):
+        self._creatures = creatures
+        # The creatures still doing something this generation, tick_once
+        # only visits these and drops them as they finish or die
+        self._active = [c for c in creatures if not c.task_finished and c.energy > 0]
+        if self._cruising is not None:
+            self._cruising.clear()
+        
+    @property
+    def food(self) -> FoodStore:
+        return self._food
+    
+    @food.setter
+    def food(self, food: List[Food]):
+        # Respawning refills the store (and its spatial index) in place
+        self._food.reset(food)
+        
+    def add_observer(self, observer: Observer):
+        self.observers.append(observer)
+        
+    def snapshot(self) -> Snapshot:
+        creatures, food = self.creatures, self.food
+        return Snapshot(self.generation, self.ticks,
+                        np.array([(c.position.x, c.position.y) for c in creatures], dtype=np.float64).reshape(-1, 2),
+                        np.array([c.heading for c in creatures], dtype=np.float64),
+                        np.array([(f.position.x, f.position.y) for f in food], dtype=np.float64).reshape(-1, 2),
+                        np.array([f.angle for f in food], dtype=np.float64))
         
     def _create_starting_creatures(self):
         creatures = []
-        for i in range(1):
-            senseg = Gene(10, 0, (lambda x: x+randint(-1, 1)))
-            speedg = Gene(PolarVector(BASE_TURN_SPEED, BASE_MOVE_SPEED), 10,
-                          (lambda x: PolarVector((x.angle+radians(randint(-2,2)) % (2*pi)), x.magnitude+randint(-2,2))))
-            sizeg  = Gene(1, 20, (lambda x: x+randint(-5, 5)))
+        start = self.start
+        values = [start[name] for name in self.genome.columns]
+        for i in range(start['count']):
+            genes = self.genome.unpack(values)
             start_pos, start_heading = self._get_start_pos()
-            creatures.append(Creature(start_pos, 10000,
-                                      senseg, sizeg, speedg,
+            creatures.append(Creature(start_pos, start['energy'],
+                                      genes['senseg'], genes['sizeg'], genes['speedg'],
                                       start_heading))
         return creatures
             
     def tick_once(self) -> bool:
-        for creature in self.creatures:
-            creature.calculate_turn(self.food, self.field_space)
-            # Remove any eaten field
-            self.food = list(filter(lambda x: not x.eaten, self.food))
-        super().draw(self.creatures, self.food)
+        profiler = self.profiler
+        active = self._active
+        if not active and self._cruising:
+            # Nobody to step, jump straight to the next arrival
+            self.ticks = self._cruising.next_tick() - 1
+        if profiler is None:
+            for creature in active:
+                # Eaten food is taken out of the store as it is eaten
+                creature.calculate_turn(self._food, self.field_space, self.sense_limited)
+        else:
+            start = perf_counter()
+            for creature in active:
+                creature.calculate_turn(self._food, self.field_space, self.sense_limited, profiler)
+            profiler.add('calculate_turn', perf_counter() - start)
+            profiler.count('creature_turns', len(active))
+        self.ticks += 1
+        if self._cruising is None:
+            self._active = [c for c in active if not c.task_finished and c.energy > 0]
+        else:
+            self._fast_forward(active)
+        self.notify('on_tick')
+        
+    def _fast_forward(self, stepped: List[Creature]):
+        cruising, tick, food = self._cruising, self.ticks, self._food
+        resumed = []
+        for creature in stepped:
+            if creature.got_food and creature.target is not None:
+                # Ate this tick, anyone else on the way to that food has to
+                # look for another
+                resumed += cruising.eaten(creature.target, tick)
+        resumed += cruising.arrivals(tick, food)
+        self._active = [c for c in stepped + resumed
+                        if not c.task_finished and c.energy > 0 and not cruising.start(c, tick, food)]
+        
+    def notify(self, hook: str):
+        profiler = self.profiler
+        for observer in self.observers:
+            if profiler is None:
+                getattr(observer, hook)(self)
+            else:
+                start = perf_counter()
+                getattr(observer, hook)(self)
+                profiler.add(f'{hook}:{type(observer).__name__}', perf_counter() - start)
+        
+    def food_remaining(self) -> int:
+        return len(self._food)
+        
+    def respawn_food(self, amount: int):
+        positions, angles = self.spawner.spawn(self.field_space, amount, self.np_rng)
+        self.food = [Food(Vector(x, y), a) for (x, y), a in zip(positions.tolist(), angles.tolist())]
+        
+    def generation_finished(self) -> bool:
+        return not self._active and not self._cruising
+        
+    def next_generation(self):
+        # Who survives and breeds is decided on arrays, then applied to the
+        # creature objects
+        creatures = self.creatures
+        survived, counts = self.selection.select(
+            np.array([c.energy for c in creatures], dtype=np.float64),
+            np.array([c.task_finished for c in creatures], dtype=bool), self.np_rng)
+        survivors = [c for c, alive in zip(creatures, survived.tolist()) if alive]
+        for creature in survivors:
+            creature.reset()
+        parents = [creatures[i] for i in np.repeat(np.arange(len(creatures)), counts).tolist()]
+        # All the offspring's genes are mutated in one go
+        genome = self.genome
+        genes = genome.mutate(genome.pack(parents), self.np_rng).tolist()
+        new_creatures = []
+        for parent, row in zip(parents, genes):
+            g = genome.unpack(row)
+            new_creatures.append(parent.give_birth(g['senseg'], g['sizeg'], g['speedg']))
+        self.creatures = survivors + new_creatures
+        self.respawn_food(len(self.creatures))
+        self.generation += 1
         
-    def run(self, trials: int):
+    def run(self, trials: int, tick_rate: float = None):
+        # tick_rate caps the number of ticks per second, None runs as
+        # fast as possible. Falling behind doesn't cause a burst to catch up.
+        period = 1/tick_rate if tick_rate else 0
+        next_tick = perf_counter()
         done_trials = 0
         while done_trials < trials:
-            while not all(map(lambda c: c.task_finished or c.energy == 0, self.creatures)):
+            generation_ticks = self.ticks
+            while not self.generation_finished():
                 self.tick_once()
-            self.creatures = list(filter(lambda c: c.task_finished), self.creatures)
-            new_creatures = []
-            for creature in self.creatures:
-                if creature.energy >= 150:
-                    new_creatures.append(creature.reproduce())
-            self.creatures += new_creatures
-            self.food = generate_food_list(field_space, len(self.creatures))
+                if period:
+                    next_tick += period
+                    delay = next_tick - perf_counter()
+                    if delay > 0:
+                        sleep(delay)
+                    else:
+                        next_tick = perf_counter()
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.count('ticks', self.ticks - generation_ticks)
+                profiler.count('food_left', self.food_remaining())
+                with profiler.phase('reproduction'):
+                    self.next_generation()
+                profiler.count('population', len(self.creatures))
+            else:
+                self.next_generation()
+            done_trials += 1
+            self.notify('on_generation')
+            if profiler is not None:
+                profiler.end_generation(self.generation)
             
             
     def _get_start_pos(self):
-        wall = randint(1,4)
+        rng = self.rng
+        wall = rng.randint(1,4)
         if wall == 1:
             x1, x2 = self.field_space[0].x, self.field_space[1].x
             y = self.field_space[1].y
-            return Vector(randint(x1, x2), y), RadianAngle(uniform(pi/2, pi*(3/2)))
+            return Vector(rng.randint(int(x1), int(x2)), y), RadianAngle(rng.uniform(pi/2, pi*(3/2)))
         if wall == 2:
             y1, y2 = self.field_space[0].y, self.field_space[1].y
             x = self.field_space[1].x
-            return Vector(x, randint(y1, y2)), RadianAngle(uniform(pi, pi*2))
+            return Vector(x, rng.randint(int(y1), int(y2))), RadianAngle(rng.uniform(pi, pi*2))
         if wall == 3:
             x1, x2 = self.field_space[0].x, self.field_space[1].x
             y = self.field_space[0].y
-            return Vector(randint(x1, x2), y), RadianAngle(uniform(pi*(3/2), pi/2) % 2*pi)
+            return Vector(rng.randint(int(x1), int(x2)), y), RadianAngle(rng.uniform(pi*(3/2), pi/2) % 2*pi)
         if wall == 4:
             y1, y2 = self.field_space[0].y, self.field_space[1].y
             x = self.field_space[0].x
-            return Vector(x, randint(y1, y2)), RadianAngle(uniform(0, pi))
+            return Vector(x, rng.randint(int(y1), int(y2))), RadianAngle(rng.uniform(0, pi))
+
+class BatchSimulation(Simulation):
+    # Same simulation, but the creatures and food live in NumPy arrays and
+    # each tick advances the whole population in one vectorised step.
+    # The creatures/food attributes convert to and from the object form so
+    # observers and the generation step work unchanged.
+    #
+    # trig_table swaps cos/sin in the step for a lookup table (see
+    # MapUtils.TrigTable), faster but the results drift from Simulation's.
+    #
+    # With sensing, after every tick `sensed` holds the food and other
+    # creatures each active creature can sense (see Sensing.sense), for
+    # observers to act on. It doesn't change how the creatures move.
+    def __init__(self, *args, fast_forward: bool = False, trig_table: bool = False,
+                 sensing: bool = False, **kwargs):
+        if fast_forward:
+            raise ValueError("fast_forward is only supported by Simulation")
+        self.trig_table = trig_table
+        self.trig = TrigTable() if trig_table else None
+        self.sensing = sensing
+        self.sensed: Sensed = None
+        super().__init__(*args, **kwargs)
+    
+    @property
+    def creatures(self) -> List[Creature]:
+        return self.population.to_creatures()
+    
+    @creatures.setter
+    def creatures(self, creatures: List[Creature]):
+        self.population = Population.from_creatures(creatures, self.genome)
+        
+    @property
+    def food(self) -> List[Food]:
+        return self.food_batch.to_food()
+    
+    @food.setter
+    def food(self, food: List[Food]):
+        self.food_batch = FoodBatch.from_food(food)
+        
+    def snapshot(self) -> Snapshot:
+        population, food = self.population, self.food_batch
+        return Snapshot(self.generation, self.ticks,
+                        population.positions.copy(), population.headings.copy(),
+                        food.positions[food.alive], food.angles[food.alive])
+        
+    def food_remaining(self) -> int:
+        return len(self.food_batch)
+        
+    def respawn_food(self, amount: int):
+        # Bulk draw straight into arrays, no Food objects involved
+        self.food_batch = FoodBatch.spawn(self.spawner, self.field_space, amount, self.np_rng)
+        
+    def generation_finished(self) -> bool:
+        return not len(self.population.active_indices)
+    
+    def next_generation(self):
+        # Selection and reproduction straight on the arrays
+        population = reproduce(self.population, self.selection, self.np_rng)
+        self.population = population
+        self.respawn_food(len(population))
+        self.generation += 1
+        self.sensed = None
+    
+    def tick_once(self):
+        profiler = self.profiler
+        if profiler is not None:
+            start = perf_counter()
+            profiler.count('creature_turns', len(self.population.active_indices))
+        self.population.step(self.food_batch, self.field_space, self.sense_limited, profiler, self.trig)
+        if profiler is not None:
+            profiler.add('step', perf_counter() - start)
+        self.ticks += 1
+        if self.sensing:
+            self._sense()
+        self.notify('on_tick')
+        
+    def _sense(self):
+        profiler = self.profiler
+        if profiler is None:
+            self.sensed = sense(self.population, self.food_batch, self.field_space)
+        else:
+            with profiler.phase('sense'):
+                self.sensed = sense(self.population, self.food_batch, self.field_space)
 
 def main():
-    s = Simulation((Vector(0,0), Vector(200,200)), Vector(1920,1080))
-    s.run(50)
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--headless', action='store_true',
+                        help="run without opening a window (pygame/OpenGL not needed)")
+    parser.add_argument('--trials', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--spawn', choices=sorted(SPAWNERS), default='uniform',
+                        help="how food is spread over the field")
+    parser.add_argument('--selection', choices=sorted(SELECTIONS), default='threshold',
+                        help="which creatures get to breed at the end of a generation")
+    parser.add_argument('--batched', action='store_true',
+                        help="use the vectorised NumPy engine")
+    parser.add_argument('--sense-limited', action='store_true',
+                        help="creatures only see food within their sense gene radius")
+    parser.add_argument('--tiles', type=int, nargs=2, metavar=('COLUMNS', 'ROWS'),
+                        help="split the field into tiles stepped by separate processes (implies --batched)")
+    parser.add_argument('--halo', type=float, default=None,
+                        help="how far past its tile each tile process looks for food")
+    parser.add_argument('--fast-forward', action='store_true',
+                        help="skip creatures ahead when they head straight for a target")
+    parser.add_argument('--trig-table', action='store_true',
+                        help="batched engines: approximate cos/sin with a lookup table")
+    parser.add_argument('--tick-rate', type=float, default=None,
+                        help="target ticks per second, default is as fast as possible")
+    parser.add_argument('--fps', type=float, default=60,
+                        help="cap on frames drawn per second")
+    parser.add_argument('--render-thread', action='store_true',
+                        help="draw from a separate thread instead of between ticks")
+    parser.add_argument('--profile', action='store_true',
+                        help="print where the time went after every generation")
+    parser.add_argument('--record', metavar='PATH',
+                        help="append per generation statistics to this file")
+    parser.add_argument('--share', metavar='PATH', nargs='?', const='',
+                        help="publish snapshots to shared memory for SnapshotRing.py viewers")
+    parser.add_argument('--trajectory', metavar='PATH',
+                        help="log every tick here for replaying with Trajectory.py")
+    parser.add_argument('--frames', metavar='DIR',
+                        help="render ticks offscreen to images in this directory")
+    parser.add_argument('--frames-every', type=int, default=1, metavar='N',
+                        help="render every Nth tick, 0 for only the start of each generation")
+    parser.add_argument('--frames-format', choices=('png', 'raw'), default='png')
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help="save the simulation state here every --checkpoint-every generations")
+    parser.add_argument('--checkpoint-every', type=int, default=10, metavar='N')
+    parser.add_argument('--resume', metavar='PATH',
+                        help="continue from a checkpoint, --trials counts from its start")
+    args = parser.parse_args()
+    if args.fast_forward and (args.batched or args.tiles):
+        parser.error("--fast-forward is not supported with --batched or --tiles")
+    if args.trig_table and not (args.batched or args.tiles):
+        parser.error("--trig-table needs --batched or --tiles")
+    if args.resume:
+        # Everything but the tiling comes from the checkpoint
+        ignored = [flag for flag in ('seed', 'spawn', 'selection', 'batched', 'sense_limited',
+                                     'fast_forward', 'trig_table')
+                   if getattr(args, flag) != parser.get_default(flag)]
+        if ignored:
+            parser.error("--resume takes these from the checkpoint: " +
+                         ", ".join('--' + flag.replace('_', '-') for flag in ignored))
+    if args.halo is not None and not args.tiles:
+        parser.error("--halo needs --tiles")
+
+    field_space = (Vector(0,0), Vector(200,200))
+    observers = []
+    if not args.headless:
+        # Only pull in pygame/OpenGL when we actually want a window
+        from Graphics import Graphics, ThreadedGraphics
+        if args.render_thread:
+            observers.append(ThreadedGraphics(field_space, Vector(1920,1080), args.fps))
+        else:
+            observers.append(Graphics(field_space, Vector(1920,1080), fps=args.fps))
+    # Imported here rather than at the top as Tiling imports this module
+    from Tiling import TiledSimulation
+    sim_class = BatchSimulation if args.batched else Simulation
+    engine_args = {'fast_forward': args.fast_forward}
+    if args.batched:
+        engine_args = {'trig_table': args.trig_table}
+    if args.tiles:
+        sim_class = TiledSimulation
+        engine_args = {'tiles': args.tiles, 'halo': args.halo, 'trig_table': args.trig_table}
+    recorder = None
+    if args.record:
+        from Recorder import GenerationRecorder
+        recorder = GenerationRecorder(args.record)
+        observers.append(recorder)
+    writer = None
+    if args.share is not None:
+        from SnapshotRing import SnapshotWriter
+        writer = SnapshotWriter(args.share or None)
+        observers.append(writer)
+    trajectory = None
+    if args.trajectory:
+        from Trajectory import TrajectoryWriter
+        trajectory = TrajectoryWriter(args.trajectory)
+        observers.append(trajectory)
+    exporter = None
+    if args.frames:
+        from FrameExport import FrameExporter
+        exporter = FrameExporter(args.frames, every=args.frames_every, generations=not args.frames_every,
+                                 format=args.frames_format)
+        observers.append(exporter)
+    checkpointer = None
+    if args.checkpoint:
+        from Checkpoint import Checkpointer
+        checkpointer = Checkpointer(args.checkpoint, args.checkpoint_every)
+        observers.append(checkpointer)
+    profiler = Profiler(print_summary) if args.profile else None
+    if args.resume:
+        # Engine, field, spawner and seed state all come from the checkpoint,
+        # --tiles spreads a batched or tiled run over a new set of tiles
+        from Checkpoint import load_checkpoint
+        tiling = {}
+        if args.tiles:
+            tiling = {'engine': 'TiledSimulation', 'tiles': args.tiles, 'halo': args.halo}
+        s = load_checkpoint(args.resume, observers, profiler=profiler, **tiling)
+    else:
+        s = sim_class(field_space, observers, args.sense_limited, seed=args.seed,
+                      spawner=SPAWNERS[args.spawn](), profiler=profiler,
+                      selection=SELECTIONS[args.selection](), **engine_args)
+    try:
+        s.run(max(0, args.trials - s.generation), args.tick_rate)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if checkpointer is not None:
+            checkpointer.close()
+        if writer is not None:
+            writer.close()
+        if trajectory is not None:
+            trajectory.close()
+        if exporter is not None:
+            exporter.close()
+        if isinstance(s, TiledSimulation):
+            s.close()
+    print(f"Generation {s.generation}: {len(s.creatures)} creatures after {s.ticks} ticks")
     
 if __name__ == '__main__':
     main()
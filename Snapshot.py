@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from typing import NamedTuple
+import numpy as np
+
+class Snapshot(NamedTuple):
+    # Copy of everything needed to draw one tick, as flat arrays so it can
+    # be handed to a renderer without touching the live simulation
+    generation:         int
+    tick:               int
+    creature_positions: np.ndarray  # (n, 2)
+    creature_headings:  np.ndarray  # (n,)
+    food_positions:     np.ndarray  # (m, 2)
+    food_angles:        np.ndarray  # (m,)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from Observer import Observer
+from Snapshot import Snapshot
+from Stats import population_arrays
+from MapUtils import Vector
+from typing import Dict, NamedTuple, Optional, Tuple
+import numpy as np
+import tempfile
+import mmap
+import os
+
+MAGIC = b'EVORING1'
+VERSION = 1
+
+# Header states
+LIVE, CLOSED, SUPERSEDED = 0, 1, 2
+
+HEADER = np.dtype([
+    ('magic', 'S8'), ('version', '<u4'), ('state', '<u4'),
+    ('slots', '<u4'), ('_pad', '<u4'),
+    ('creature_capacity', '<i8'), ('food_capacity', '<i8'),
+    ('latest', '<u8'),         # sequence number of the newest complete snapshot, 0 for none
+    ('field', '<f8', (4,)),    # field_space as x0, y0, x1, y1
+])
+SLOT_HEADER = np.dtype([
+    ('seq', '<u8'),            # 2*sequence once written, odd while being written
+    ('generation', '<i8'), ('tick', '<i8'),
+    ('creatures', '<i8'), ('food', '<i8'),
+])
+CREATURE_COLUMNS = ('headings', 'energy', 'sense', 'size', 'turn_speed', 'move_speed')
+FOOD_COLUMNS = ('angles',)
+
+def default_path() -> str:
+    # Somewhere memory backed when there is one
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'evolution-snapshots')
+
+def _align(n: int) -> int:
+    return -(-n//64)*64
+
+def _layout(slots: int, creatures: int, food: int) -> Tuple[int, int, Dict[str, Tuple[int, tuple]]]:
+    # (offset of the first slot, size of a slot, {array: (offset in slot, shape)})
+    arrays, offset = {}, _align(SLOT_HEADER.itemsize)
+    for name, shape in ([('creature_positions', (creatures, 2))] +
+                        [(f'creature_{c}', (creatures,)) for c in CREATURE_COLUMNS] +
+                        [('food_positions', (food, 2))] +
+                        [(f'food_{c}', (food,)) for c in FOOD_COLUMNS]):
+        arrays[name] = (offset, shape)
+        offset = _align(offset + 8*int(np.prod(shape)))
+    return _align(HEADER.itemsize), offset, arrays
+
+class _Ring:
+    # Numpy views over a mapped ring file
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.header = np.ndarray((), HEADER, buffer=buffer)
+        slots = int(self.header['slots'])
+        start, slot_size, arrays = _layout(slots, int(self.header['creature_capacity']),
+                                           int(self.header['food_capacity']))
+        self.slots = []
+        for i in range(slots):
+            base = start + i*slot_size
+            slot = {name: np.ndarray(shape, np.float64, buffer=buffer, offset=base + offset)
+                    for name, (offset, shape) in arrays.items()}
+            slot['header'] = np.ndarray((), SLOT_HEADER, buffer=buffer, offset=base)
+            self.slots.append(slot)
+
+    @staticmethod
+    def size(slots: int, creatures: int, food: int) -> int:
+        start, slot_size, _ = _layout(slots, creatures, food)
+        return start + slots*slot_size
+
+class Frame(NamedTuple):
+    # One published snapshot. From SnapshotReader.latest() the arrays are
+    # views straight into shared memory and are only good until the writer
+    # comes round to the same slot again, see SnapshotReader.valid.
+    sequence:   int
+    generation: int
+    tick:       int
+    creatures:  Dict[str, np.ndarray]  # positions, headings, energy and the genes
+    food:       Dict[str, np.ndarray]  # positions, angles
+
+    def snapshot(self) -> Snapshot:
+        return Snapshot(self.generation, self.tick,
+                        self.creatures['positions'], self.creatures['headings'],
+                        self.food['positions'], self.food['angles'])
+
+class SnapshotWriter(Observer):
+    # Publishes the population and food every `every` ticks (and at the
+    # start of each generation) into a ring of `slots` snapshots in a
+    # memory mapped file, for viewers and notebooks in other processes to
+    # read with SnapshotReader. Writing is a copy into the next slot and
+    # never waits on readers.
+    #
+    # Each slot is guarded by a sequence number (odd while the slot is
+    # being written) so readers can tell a torn read. If the population
+    # outgrows the file a bigger one replaces it and the old one is marked
+    # SUPERSEDED, readers reopen the path when they see that.
+    def __init__(self, path: str = None, slots: int = 4, every: int = 1,
+                 creature_capacity: int = 1024, food_capacity: int = 1024):
+        self.path = path or default_path()
+        self.slots = slots
+        self.every = every
+        self.sequence = 0
+        self._ring = self._map = None
+        self._capacity = (creature_capacity, food_capacity)
+
+    def _create(self, field_space: Tuple[Vector, Vector], creatures: int, food: int):
+        size = _Ring.size(self.slots, creatures, food)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w+b') as f:
+            f.truncate(size)
+            new_map = mmap.mmap(f.fileno(), size)
+        ring = np.ndarray((), HEADER, buffer=new_map)
+        ring['magic'] = MAGIC
+        ring['version'] = VERSION
+        ring['state'] = LIVE
+        ring['slots'] = self.slots
+        ring['creature_capacity'] = creatures
+        ring['food_capacity'] = food
+        ring['latest'] = self.sequence
+        ring['field'] = (field_space[0].x, field_space[0].y, field_space[1].x, field_space[1].y)
+        del ring
+        os.replace(tmp, self.path)
+        if self._ring is not None:
+            self._ring.header['state'] = SUPERSEDED
+            self._release()
+        self._map = new_map
+        self._ring = _Ring(new_map)
+        self._capacity = (creatures, food)
+
+    def _release(self):
+        self._ring = None
+        self._map.close()
+        self._map = None
+
+    def publish(self, simulation: Simulation):
+        snapshot = simulation.snapshot()
+        genes = population_arrays(simulation)
+        n, m = len(snapshot.creature_headings), len(snapshot.food_angles)
+        creature_capacity, food_capacity = self._capacity
+        if self._ring is None or n > creature_capacity or m > food_capacity:
+            self._create(simulation.field_space,
+                         max(creature_capacity, n if self._ring is None else 2*n),
+                         max(food_capacity, m if self._ring is None else 2*m))
+
+        self.sequence += 1
+        slot = self._ring.slots[self.sequence % self.slots]
+        header = slot['header']
+        header['seq'] = 2*self.sequence + 1
+        slot['creature_positions'][:n] = snapshot.creature_positions
+        slot['creature_headings'][:n] = snapshot.creature_headings
+        for name in CREATURE_COLUMNS[1:]:
+            slot[f'creature_{name}'][:n] = genes[name]
+        slot['food_positions'][:m] = snapshot.food_positions
+        slot['food_angles'][:m] = snapshot.food_angles
+        header['generation'] = snapshot.generation
+        header['tick'] = snapshot.tick
+        header['creatures'] = n
+        header['food'] = m
+        header['seq'] = 2*self.sequence
+        self._ring.header['latest'] = self.sequence
+
+    def on_tick(self, simulation: Simulation):
+        if simulation.ticks % self.every == 0:
+            self.publish(simulation)
+
+    def on_generation(self, simulation: Simulation):
+        self.publish(simulation)
+
+    def close(self, unlink: bool = False):
+        if self._ring is not None:
+            self._ring.header['state'] = CLOSED
+            self._release()
+        if unlink and os.path.exists(self.path):
+            os.unlink(self.path)
+
+class SnapshotReader:
+    # Attaches to a SnapshotWriter's file read only
+    def __init__(self, path: str = None):
+        self.path = path or default_path()
+        self._file = self._map = self._ring = None
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = np.ndarray((), HEADER, buffer=self._map)
+        if bytes(header['magic']) != MAGIC or header['version'] != VERSION:
+            raise ValueError(f"{self.path} is not a snapshot ring")
+        self._ring = _Ring(self._map)
+
+    def close(self):
+        self._ring = None
+        try:
+            self._map.close()
+        except BufferError:
+            # Views from latest() are still around, unmapped once they go
+            pass
+        self._file.close()
+
+    @property
+    def field_space(self) -> Tuple[Vector, Vector]:
+        x0, y0, x1, y1 = self._ring.header['field'].tolist()
+        return (Vector(x0, y0), Vector(x1, y1))
+
+    @property
+    def closed(self) -> bool:
+        # The writer has finished, nothing newer will come
+        return int(self._ring.header['state']) == CLOSED
+
+    def _follow(self):
+        if int(self._ring.header['state']) == SUPERSEDED:
+            self.close()
+            self._open()
+
+    def latest(self) -> Optional[Frame]:
+        # The newest complete snapshot as views into shared memory, None if
+        # nothing has been published yet
+        self._follow()
+        ring = self._ring
+        sequence = int(ring.header['latest'])
+        while sequence:
+            slot = ring.slots[sequence % len(ring.slots)]
+            header = slot['header']
+            if int(header['seq']) == 2*sequence:
+                n, m = int(header['creatures']), int(header['food'])
+                creatures = {'positions': slot['creature_positions'][:n]}
+                creatures.update({name: slot[f'creature_{name}'][:n] for name in CREATURE_COLUMNS})
+                food = {'positions': slot['food_positions'][:m]}
+                food.update({name: slot[f'food_{name}'][:m] for name in FOOD_COLUMNS})
+                frame = Frame(sequence, int(header['generation']), int(header['tick']), creatures, food)
+                if int(header['seq']) == 2*sequence:
+                    return frame
+            # Overwritten under us, the writer has moved on
+            sequence = int(ring.header['latest'])
+        return None
+
+    def valid(self, frame: Frame) -> bool:
+        # Whether the views in frame still hold what was published
+        slot = self._ring.slots[frame.sequence % len(self._ring.slots)]
+        return int(slot['header']['seq']) == 2*frame.sequence
+
+    def read(self) -> Optional[Frame]:
+        # Like latest but copied out, so it stays good
+        while True:
+            frame = self.latest()
+            if frame is None:
+                return None
+            copied = frame._replace(creatures={k: v.copy() for k, v in frame.creatures.items()},
+                                    food={k: v.copy() for k, v in frame.food.items()})
+            if self.valid(frame):
+                return copied
+
+def main():
+    # Standalone viewer, draws whatever the simulation publishes
+    import argparse
+    from Graphics import Graphics
+    from time import sleep
+    import pygame
+    parser = argparse.ArgumentParser(description="Watch a simulation running with --share")
+    parser.add_argument('path', nargs='?', default=None)
+    parser.add_argument('--fps', type=float, default=60)
+    args = parser.parse_args()
+
+    reader = SnapshotReader(args.path)
+    graphics = Graphics(reader.field_space, Vector(1920, 1080), fps=args.fps)
+    shown = 0
+    try:
+        while True:
+            # Checked before reading so the writer's last frame is still shown
+            closed = reader.closed
+            frame = reader.latest()
+            if frame is not None and frame.sequence != shown and graphics.frame_due():
+                graphics.draw_snapshot(frame.snapshot())
+                shown = frame.sequence
+            elif closed and (frame is None or frame.sequence == shown):
+                print("The simulation has finished")
+                break
+            else:
+                graphics.handle_events()
+                graphics._exit_if_closed()
+                sleep(0.001)
+    finally:
+        reader.close()
+        pygame.quit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from MapUtils import Vector
+from typing import Dict, Iterable, Optional, Tuple
+import math
+
+class FoodGrid:
+    # Uniform grid over the field, each cell holds the food whose position
+    # falls inside it. Cells are dicts used as ordered sets so iteration
+    # order (and so tie breaking) is deterministic.
+    def __init__(self, field_space: Tuple[Vector, Vector], foods: Iterable[Food] = (),
+                 cell_size: float = None):
+        self.field_space = field_space
+        self.rebuild(foods, cell_size)
+
+    def rebuild(self, foods: Iterable[Food], cell_size: float = None):
+        foods = list(foods)
+        width  = abs(self.field_space[1].x - self.field_space[0].x)
+        height = abs(self.field_space[1].y - self.field_space[0].y)
+        if cell_size is None:
+            # Aim for roughly one food per cell
+            cell_size = math.sqrt(width*height/max(1, len(foods)))
+        self.cell_size = max(cell_size, 1e-9)
+        self.columns = max(1, math.ceil(width/self.cell_size))
+        self.rows    = max(1, math.ceil(height/self.cell_size))
+        self.cells: Dict[Tuple[int, int], Dict[Food, None]] = {}
+        self._count = 0
+        for food in foods:
+            self.insert(food)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        for cell in self.cells.values():
+            yield from cell
+
+    def _cell_of(self, position: Vector) -> Tuple[int, int]:
+        i = int((position.x - self.field_space[0].x)//self.cell_size)
+        j = int((position.y - self.field_space[0].y)//self.cell_size)
+        return (min(max(i, 0), self.columns - 1), min(max(j, 0), self.rows - 1))
+
+    def insert(self, food: Food):
+        self.cells.setdefault(self._cell_of(food.position), {})[food] = None
+        self._count += 1
+
+    def remove(self, food: Food):
+        key = self._cell_of(food.position)
+        cell = self.cells[key]
+        del cell[food]
+        if not cell:
+            del self.cells[key]
+        self._count -= 1
+
+    def _ring(self, ci: int, cj: int, r: int):
+        # Keys of the cells exactly r cells away (Chebyshev) from (ci, cj)
+        if r == 0:
+            yield (ci, cj)
+            return
+        for i in range(ci - r, ci + r + 1):
+            yield (i, cj - r)
+            yield (i, cj + r)
+        for j in range(cj - r + 1, cj + r):
+            yield (ci - r, j)
+            yield (ci + r, j)
+
+    def nearest(self, position: Vector, max_dist: float = None) -> Tuple[Optional[Food], float]:
+        # Closest food to position, only looking within max_dist if given.
+        # Returns (None, inf) if there is nothing in range.
+        closest, cdist = None, math.inf
+        if not self._count:
+            return closest, cdist
+        ci, cj = self._cell_of(position)
+        max_ring = max(ci, cj, self.columns - 1 - ci, self.rows - 1 - cj)
+        px, py = position.x, position.y
+        for r in range(max_ring + 1):
+            # Everything in ring r or further out is at least (r-1) cells away
+            reach = (r - 1)*self.cell_size
+            if cdist <= reach or (max_dist is not None and reach > max_dist):
+                break
+            for key in self._ring(ci, cj, r):
+                cell = self.cells.get(key)
+                if not cell:
+                    continue
+                for food in cell:
+                    new_dist = math.hypot(px - food.position.x, py - food.position.y)
+                    if new_dist < cdist:
+                        closest, cdist = food, new_dist
+        if max_dist is not None and cdist > max_dist:
+            return None, math.inf
+        return closest, cdist
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from MapUtils import Vector
+from abc import ABC, abstractmethod
+from typing import Tuple
+import numpy as np
+import math
+
+class FoodSpawner(ABC):
+    # Decides where a generation's food goes. spawn() returns an (n, 2)
+    # array of positions and an (n,) array of angles drawn in bulk from rng.
+    @abstractmethod
+    def spawn(self, field_space: Tuple[Vector, Vector], amount: int,
+              rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        pass
+
+    @staticmethod
+    def _bounds(field_space: Tuple[Vector, Vector], margin: float) -> Tuple[np.ndarray, np.ndarray]:
+        # Field corners pulled in by margin (a fraction of each side)
+        lo = np.array((field_space[0].x, field_space[0].y), dtype=np.float64)
+        hi = np.array((field_space[1].x, field_space[1].y), dtype=np.float64)
+        inset = margin*np.abs(hi - lo)
+        return lo + inset, hi - inset
+
+    @staticmethod
+    def _angles(amount: int, rng: np.random.Generator) -> np.ndarray:
+        return rng.uniform(0, 2*math.pi, size=amount)
+
+class UniformSpawner(FoodSpawner):
+    # Evenly spread, by default over the inner 80% of the field like
+    # generate_food_list
+    def __init__(self, margin: float = 0.1):
+        self.margin = margin
+
+    def spawn(self, field_space, amount, rng):
+        lo, hi = self._bounds(field_space, self.margin)
+        return rng.uniform(lo, hi, size=(amount, 2)), self._angles(amount, rng)
+
+class PatchSpawner(FoodSpawner):
+    # Food clumped into a few patches. Patch centres are drawn fresh every
+    # spawn, each food lands in a random patch with a normal spread of
+    # spread*field size around its centre.
+    def __init__(self, patches: int = 5, spread: float = 0.05, margin: float = 0.1):
+        self.patches = patches
+        self.spread = spread
+        self.margin = margin
+
+    def spawn(self, field_space, amount, rng):
+        lo, hi = self._bounds(field_space, self.margin)
+        centres = rng.uniform(lo, hi, size=(self.patches, 2))
+        which = rng.integers(0, self.patches, size=amount)
+        scale = self.spread*(hi - lo)
+        positions = centres[which] + rng.normal(0, 1, size=(amount, 2))*scale
+        np.clip(positions, lo, hi, out=positions)
+        return positions, self._angles(amount, rng)
+
+class DensitySpawner(FoodSpawner):
+    # Food placed according to a density map, a 2D array laid over the
+    # spawn area with rows along y and columns along x. Each food picks a
+    # cell with probability proportional to its value then lands uniformly
+    # inside that cell.
+    def __init__(self, density: np.ndarray, margin: float = 0.1):
+        density = np.asarray(density, dtype=np.float64)
+        if density.ndim != 2 or (density < 0).any() or density.sum() <= 0:
+            raise ValueError("density must be a 2D array of non-negative values with a positive sum")
+        self.density = density
+        self.margin = margin
+        # Divided by its own last value so it ends on exactly 1 and a draw
+        # can never land past the last cell with any food
+        cdf = np.cumsum(density.ravel())
+        self._cdf = cdf/cdf[-1]
+
+    def spawn(self, field_space, amount, rng):
+        lo, hi = self._bounds(field_space, self.margin)
+        rows, columns = self.density.shape
+        # side='right' skips over the cells with no density
+        cells = np.searchsorted(self._cdf, rng.random(amount), side='right')
+        j, i = np.divmod(cells, columns)
+        cell_size = (hi - lo)/(columns, rows)
+        corner = lo + np.stack((i, j), axis=1)*cell_size
+        positions = corner + rng.random((amount, 2))*cell_size
+        return positions, self._angles(amount, rng)
+
+SPAWNERS = {
+    'uniform': UniformSpawner,
+    'patches': PatchSpawner,
+}
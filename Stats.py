@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from Observer import Observer
+from typing import Dict, List
+import numpy as np
+
+# Per creature values summarised every generation
+GENE_COLUMNS = ('sense', 'size', 'turn_speed', 'move_speed', 'energy')
+
+def population_arrays(simulation: Simulation) -> Dict[str, np.ndarray]:
+    # Gene and energy values of every creature, straight from the arrays
+    # when the simulation is batched
+    population = getattr(simulation, 'population', None)
+    if population is not None:
+        return {name: getattr(population, name) for name in GENE_COLUMNS}
+    creatures = simulation.creatures
+    return {
+        'sense':      np.array([c.senseg.val for c in creatures], dtype=np.float64),
+        'size':       np.array([c.sizeg.val for c in creatures], dtype=np.float64),
+        'turn_speed': np.array([c.speedg.val.angle for c in creatures], dtype=np.float64),
+        'move_speed': np.array([c.speedg.val.magnitude for c in creatures], dtype=np.float64),
+        'energy':     np.array([c.energy for c in creatures], dtype=np.float64),
+    }
+
+def active_mask(simulation: Simulation) -> np.ndarray:
+    # Which creatures are still out looking for food or heading home
+    population = getattr(simulation, 'population', None)
+    if population is not None:
+        return population.active
+    return np.array([not c.task_finished and c.energy > 0 for c in simulation.creatures], dtype=bool)
+
+class FoodWatch:
+    # Finds which of a generation's food has been eaten since the last
+    # look, on any engine. Food is numbered by its place in positions and
+    # angles, taken at reset.
+    def __init__(self):
+        self.positions = self.angles = None
+        self._food = None
+
+    def reset(self, simulation: Simulation):
+        batch = getattr(simulation, 'food_batch', None)
+        if batch is not None:
+            # Everything counts as there, the next call to eaten picks up
+            # anything already gone
+            self.positions, self.angles = batch.positions, batch.angles
+            self._food = np.ones(len(batch.alive), dtype=bool)
+        else:
+            # Spawn order, so food is numbered the same as on the batch
+            # engine and anything already eaten is still there to be found
+            self._food = list(simulation.food.spawned)
+            self.positions = np.array([(f.position.x, f.position.y) for f in self._food],
+                                      dtype=np.float64).reshape(-1, 2)
+            self.angles = np.array([f.angle for f in self._food], dtype=np.float64)
+
+    def eaten(self, simulation: Simulation) -> np.ndarray:
+        batch = getattr(simulation, 'food_batch', None)
+        if batch is not None:
+            eaten = np.flatnonzero(self._food & ~batch.alive)
+            self._food[eaten] = False
+            return eaten
+        # Food leaves its FoodStore slot when eaten
+        eaten = [i for i, food in enumerate(self._food) if food is not None and food.slot is None]
+        for i in eaten:
+            self._food[i] = None
+        return np.array(eaten, dtype=np.int64)
+
+def generation_summary(simulation: Simulation) -> dict:
+    arrays = population_arrays(simulation)
+    row = {
+        'generation': simulation.generation,
+        'ticks':      simulation.ticks,
+        'population': len(arrays['energy']),
+        'food':       simulation.food_remaining(),
+    }
+    for name in GENE_COLUMNS:
+        values = arrays[name]
+        if len(values):
+            row[f'{name}_mean'] = float(values.mean())
+            row[f'{name}_std']  = float(values.std())
+            row[f'{name}_min']  = float(values.min())
+            row[f'{name}_max']  = float(values.max())
+        else:
+            row[f'{name}_mean'] = row[f'{name}_std'] = float('nan')
+            row[f'{name}_min']  = row[f'{name}_max'] = float('nan')
+    return row
+
+class StatsCollector(Observer):
+    # Keeps a generation_summary row for every generation in memory
+    def __init__(self):
+        self.rows: List[dict] = []
+
+    def on_generation(self, simulation: Simulation):
+        self.rows.append(generation_summary(simulation))
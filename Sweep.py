@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from Sim import Simulation, BatchSimulation, DEFAULT_START
+from Stats import StatsCollector, generation_summary
+from MapUtils import Vector
+from Spawning import FoodSpawner, SPAWNERS
+from typing import Iterable, List
+from itertools import product
+from multiprocessing import Pool
+import csv
+
+def run_trial(config: dict) -> List[dict]:
+    # Runs one independent simulation and returns a row per generation,
+    # each tagged with the trial's settings. Everything needed is in the
+    # config dict so it can be shipped to a worker process, and the
+    # simulation draws all its randomness from the config's seed.
+    field_space = (Vector(0, 0), Vector(config['width'], config['height']))
+    sim_class = BatchSimulation if config['batched'] else Simulation
+    collector = StatsCollector()
+    sim = sim_class(field_space, [collector], config['sense_limited'], config['start'],
+                    config['seed'], config['spawner'])
+    collector.rows.append(generation_summary(sim))
+    sim.run(config['generations'])
+
+    tags = {'trial': config['trial'], 'seed': config['seed']}
+    tags.update({f'start_{k}': v for k, v in config['start'].items()})
+    return [{**tags, **row} for row in collector.rows]
+
+def make_configs(seeds: Iterable[int], generations: int, starts: Iterable[dict],
+                 width: float = 200, height: float = 200,
+                 batched: bool = False, sense_limited: bool = False,
+                 spawner: FoodSpawner = None) -> List[dict]:
+    # One config per (start settings, seed) pair
+    configs = []
+    for trial, (start, seed) in enumerate(product(starts, seeds)):
+        configs.append({
+            'trial': trial,
+            'seed': seed,
+            'generations': generations,
+            'start': {**DEFAULT_START, **start},
+            'width': width,
+            'height': height,
+            'batched': batched,
+            'sense_limited': sense_limited,
+            'spawner': spawner,
+        })
+    return configs
+
+def sweep(configs: List[dict], processes: int = None) -> List[dict]:
+    # Fans the trials out over a process pool and gathers every row into
+    # one table ordered by trial then generation
+    rows = []
+    with Pool(processes) as pool:
+        for trial_rows in pool.imap_unordered(run_trial, configs, chunksize=1):
+            rows.extend(trial_rows)
+    rows.sort(key=lambda r: (r['trial'], r['generation']))
+    return rows
+
+def write_table(rows: List[dict], path: str):
+    columns = []
+    for row in rows:
+        columns.extend(k for k in row if k not in columns)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a parameter sweep over many seeds in parallel")
+    parser.add_argument('--seeds', type=int, default=8, help="number of seeds per setting")
+    parser.add_argument('--base-seed', type=int, default=0)
+    parser.add_argument('--generations', type=int, default=50)
+    parser.add_argument('--processes', type=int, default=None, help="defaults to the CPU count")
+    parser.add_argument('--count', type=int, nargs='+', default=[DEFAULT_START['count']])
+    parser.add_argument('--sense', type=float, nargs='+', default=[DEFAULT_START['sense']])
+    parser.add_argument('--size', type=float, nargs='+', default=[DEFAULT_START['size']])
+    parser.add_argument('--move-speed', type=float, nargs='+', default=[DEFAULT_START['move_speed']])
+    parser.add_argument('--batched', action='store_true')
+    parser.add_argument('--sense-limited', action='store_true')
+    parser.add_argument('--spawn', choices=sorted(SPAWNERS), default='uniform')
+    parser.add_argument('--out', default='sweep.csv')
+    args = parser.parse_args()
+
+    starts = [{'count': c, 'sense': se, 'size': si, 'move_speed': ms}
+              for c, se, si, ms in product(args.count, args.sense, args.size, args.move_speed)]
+    seeds = range(args.base_seed, args.base_seed + args.seeds)
+    configs = make_configs(seeds, args.generations, starts,
+                           batched=args.batched, sense_limited=args.sense_limited,
+                           spawner=SPAWNERS[args.spawn]())
+    rows = sweep(configs, args.processes)
+    write_table(rows, args.out)
+    print(f"{len(configs)} trials, {len(rows)} rows written to {args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from Observer import Observer
+from Stats import FoodWatch, active_mask, generation_summary
+from typing import Any, Deque, FrozenSet, Iterable, List, NamedTuple, Optional
+from collections import deque
+import asyncio
+import numpy as np
+
+# Event kinds
+TICK = 'tick'                            # {'active': creatures still going, 'food': food left}
+FOOD_EATEN = 'food_eaten'                # {'food': index this generation, 'position': (x, y)}
+CREATURE_FINISHED = 'creature_finished'  # {'creature': index, 'energy': ...}
+CREATURE_DIED = 'creature_died'          # {'creature': index}
+GENERATION = 'generation'                # Stats.generation_summary of the new generation
+KINDS = frozenset((TICK, FOOD_EATEN, CREATURE_FINISHED, CREATURE_DIED, GENERATION))
+
+# What a full subscription does with a new event
+DROP_OLDEST, DROP_NEWEST = 'drop_oldest', 'drop_newest'
+
+class Event(NamedTuple):
+    kind:       str
+    generation: int
+    tick:       int
+    data:       Any
+
+class Subscription:
+    # Bounded queue of events for one consumer, read with `async for`.
+    # A consumer that falls behind loses events (counted in `dropped`)
+    # instead of holding anything else up. Iteration stops when the stream
+    # closes.
+    def __init__(self, stream: EventStream, kinds: FrozenSet[str], maxsize: int, overflow: str):
+        if overflow not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"overflow must be {DROP_OLDEST!r} or {DROP_NEWEST!r}")
+        self.stream = stream
+        self.kinds = kinds
+        self.overflow = overflow
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._closed = self._ending = False
+
+    def put(self, event: Optional[Event]):
+        # Never waits, None marks the end of the stream
+        queue = self._queue
+        if queue.full():
+            if event is None:
+                # Nobody is waiting on a full queue, iteration stops once
+                # it has been read
+                self._ending = True
+                return
+            if self.overflow == DROP_NEWEST:
+                self.dropped += 1
+                return
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(event)
+
+    def __aiter__(self) -> Subscription:
+        return self
+
+    async def __anext__(self) -> Event:
+        if self._closed or (self._ending and self._queue.empty()):
+            self._closed = True
+            raise StopAsyncIteration
+        event = await self._queue.get()
+        if event is None:
+            self._closed = True
+            raise StopAsyncIteration
+        return event
+
+    def close(self):
+        self.stream.unsubscribe(self)
+        self.put(None)
+
+class EventStream(Observer):
+    # Turns simulation hooks into events for asyncio consumers. The
+    # simulation runs on its own thread (e.g. asyncio.to_thread(sim.run,
+    # n)), the consumers on the event loop's.
+    #
+    # The tick loop only ever appends to a bounded outbox and, if the loop
+    # hasn't been woken yet, wakes it. The loop then hands the events out to
+    # each subscription's own bounded queue. If the loop itself can't keep
+    # up the outbox drops its oldest events, counted in `dropped`. Events
+    # nobody subscribed to aren't worked out at all.
+    def __init__(self, loop: asyncio.AbstractEventLoop = None, buffer: int = 10000):
+        self.loop = loop
+        self.dropped = 0
+        self._outbox: Deque[Event] = deque()
+        self._buffer = buffer
+        self._woken = False
+        self._subscriptions: List[Subscription] = []
+        self._kinds: FrozenSet[str] = frozenset()
+        self._food = FoodWatch()
+        self._food_generation = None
+        self._active = None
+        # Whether any hook has run yet. Until one has the simulation is
+        # still at the start of a generation, as with a fresh run or one
+        # resumed from a checkpoint, and nothing has been missed.
+        self._hooked = False
+
+    def subscribe(self, kinds: Iterable[str] = KINDS, maxsize: int = 1000,
+                  overflow: str = DROP_OLDEST) -> Subscription:
+        # Call from the event loop
+        kinds = frozenset(kinds)
+        if kinds - KINDS:
+            raise ValueError(f"unknown event kinds {', '.join(sorted(kinds - KINDS))}")
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        subscription = Subscription(self, kinds, maxsize, overflow)
+        self._subscriptions = self._subscriptions + [subscription]
+        self._kinds = self._kinds | kinds
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+        self._kinds = frozenset().union(*(s.kinds for s in self._subscriptions))
+
+    def _publish(self, events: List[Event]):
+        # Simulation thread
+        outbox = self._outbox
+        outbox.extend(events)
+        while len(outbox) > self._buffer:
+            outbox.popleft()
+            self.dropped += 1
+        if not self._woken:
+            self._woken = True
+            self.loop.call_soon_threadsafe(self._deliver)
+
+    def _deliver(self):
+        # Event loop thread
+        self._woken = False
+        outbox = self._outbox
+        subscriptions = self._subscriptions
+        while outbox:
+            event = outbox.popleft()
+            for subscription in subscriptions:
+                if event.kind in subscription.kinds:
+                    subscription.put(event)
+
+    def _food_events(self, simulation: Simulation) -> List[Event]:
+        food = self._food
+        generation, tick = simulation.generation, simulation.ticks
+        if self._food_generation != generation:
+            food.reset(simulation)
+            self._food_generation = generation
+            if self._hooked:
+                # Subscribed mid-generation, what went before isn't news
+                food.eaten(simulation)
+        eaten = food.eaten(simulation)
+        return [Event(FOOD_EATEN, generation, tick, {'food': i, 'position': tuple(p)})
+                for i, p in zip(eaten.tolist(), food.positions[eaten].tolist())]
+
+    def _creature_events(self, simulation: Simulation) -> List[Event]:
+        active = active_mask(simulation)
+        before = self._active
+        self._active = active
+        if before is None or len(before) != len(active):
+            if self._hooked:
+                # Subscribed mid-generation, only changes from now on count
+                return []
+            # A generation starts with everyone active
+            before = np.ones(len(active), dtype=bool)
+        ended = np.flatnonzero(before & ~active)
+        if not len(ended):
+            return []
+        energy = getattr(simulation, 'population', None)
+        if energy is not None:
+            energy = energy.energy[ended].tolist()
+        else:
+            creatures = simulation.creatures
+            energy = [creatures[i].energy for i in ended.tolist()]
+        generation, tick = simulation.generation, simulation.ticks
+        return [Event(CREATURE_FINISHED, generation, tick, {'creature': i, 'energy': e}) if e > 0
+                else Event(CREATURE_DIED, generation, tick, {'creature': i})
+                for i, e in zip(ended.tolist(), energy)]
+
+    def on_tick(self, simulation: Simulation):
+        kinds = self._kinds
+        events = []
+        # What nobody is watching is seeded afresh by whoever subscribes next
+        if FOOD_EATEN in kinds:
+            events += self._food_events(simulation)
+        else:
+            self._food_generation = None
+        if CREATURE_FINISHED in kinds or CREATURE_DIED in kinds:
+            events += self._creature_events(simulation)
+        else:
+            self._active = None
+        if TICK in kinds:
+            active = getattr(simulation, 'population', None)
+            active = len(active.active_indices) if active is not None else int(active_mask(simulation).sum())
+            events.append(Event(TICK, simulation.generation, simulation.ticks,
+                                {'active': active, 'food': simulation.food_remaining()}))
+        self._hooked = True
+        if events:
+            self._publish(events)
+
+    def on_generation(self, simulation: Simulation):
+        kinds = self._kinds
+        self._hooked = True
+        # Both are taken here, before the generation's first tick
+        self._food_generation = None
+        if FOOD_EATEN in kinds:
+            self._food.reset(simulation)
+            self._food_generation = simulation.generation
+        self._active = active_mask(simulation) if CREATURE_FINISHED in kinds or CREATURE_DIED in kinds else None
+        if GENERATION in kinds:
+            self._publish([Event(GENERATION, simulation.generation, simulation.ticks,
+                                 generation_summary(simulation))])
+
+    def close(self):
+        # Ends every subscription once the events already sent are through,
+        # safe to call from the simulation thread
+        def finish():
+            self._deliver()
+            for subscription in self._subscriptions:
+                subscription.put(None)
+            self._subscriptions = []
+            self._kinds = frozenset()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(finish)
+
+def main():
+    # Runs a headless simulation on a thread and prints its events
+    import argparse
+    from Sim import Simulation, BatchSimulation
+    from MapUtils import Vector
+    parser = argparse.ArgumentParser(description="Stream simulation events")
+    parser.add_argument('--trials', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--batched', action='store_true')
+    parser.add_argument('--kinds', nargs='+', choices=sorted(KINDS), default=sorted(KINDS - {TICK}))
+    args = parser.parse_args()
+
+    async def run():
+        stream = EventStream()
+        subscription = stream.subscribe(args.kinds)
+        sim_class = BatchSimulation if args.batched else Simulation
+        sim = sim_class((Vector(0, 0), Vector(200, 200)), [stream], seed=args.seed)
+
+        def simulate():
+            try:
+                sim.run(args.trials)
+            finally:
+                stream.close()
+
+        async def consume():
+            async for event in subscription:
+                print(event.kind, event.generation, event.tick, event.data)
+        await asyncio.gather(asyncio.to_thread(simulate), consume())
+        if subscription.dropped or stream.dropped:
+            print(f"dropped {subscription.dropped + stream.dropped} events")
+    asyncio.run(run())
+
+if __name__ == '__main__':
+    main()
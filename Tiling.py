@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from Sim import BatchSimulation
+from Population import Population, FoodBatch
+from MapUtils import Vector, TrigTable
+from typing import Dict, List, Sequence, Tuple
+from multiprocessing import Pipe, Process, shared_memory
+from multiprocessing.connection import Connection
+from time import perf_counter
+import numpy as np
+import traceback
+
+# (name, dtype, shape of one row) of the arrays kept in shared memory
+CREATURE_FIELDS = (
+    ('positions',     np.float64, (2,)),
+    ('headings',      np.float64, ()),
+    ('energy',        np.float64, ()),
+    ('sense',         np.float64, ()),
+    ('size',          np.float64, ()),
+    ('turn_speed',    np.float64, ()),
+    ('move_speed',    np.float64, ()),
+    ('got_food',      np.bool_,   ()),
+    ('task_finished', np.bool_,   ()),
+)
+FOOD_FIELDS = (
+    ('positions', np.float64, (2,)),
+    ('angles',    np.float64, ()),
+    ('energy',    np.float64, ()),
+    ('alive',     np.bool_,   ()),
+)
+
+class SharedArrays:
+    # Arrays of `capacity` rows laid out one after another in a single
+    # shared memory block. Other processes attach with the block's name.
+    def __init__(self, fields: Sequence[Tuple[str, type, tuple]], capacity: int, name: str = None):
+        self.fields = fields
+        self.capacity = capacity
+        layout, size = [], 0
+        for field, dtype, shape in fields:
+            nbytes = np.dtype(dtype).itemsize*capacity*int(np.prod(shape))
+            layout.append((field, dtype, shape, size))
+            size += -(-nbytes//8)*8
+        self.shm = shared_memory.SharedMemory(name, create=name is None, size=max(size, 8))
+        self.name = self.shm.name
+        self.arrays: Dict[str, np.ndarray] = {
+            field: np.ndarray((capacity,) + shape, dtype, buffer=self.shm.buf, offset=offset)
+            for field, dtype, shape, offset in layout}
+
+    def close(self):
+        self.arrays = {}
+        try:
+            self.shm.close()
+        except BufferError:
+            # Someone still holds a view, the mapping goes when they do
+            pass
+
+    def unlink(self):
+        self.close()
+        self.shm.unlink()
+
+def _population_view(shared: SharedArrays, n: int, genome=None) -> Population:
+    # A Population whose arrays are the first n rows of the shared ones
+    arrays = shared.arrays
+    kwargs = {} if genome is None else {'genome': genome}
+    population = Population(arrays['positions'][:n], arrays['headings'][:n], arrays['energy'][:n],
+                            arrays['sense'][:n], arrays['size'][:n],
+                            arrays['turn_speed'][:n], arrays['move_speed'][:n], **kwargs)
+    population.got_food = arrays['got_food'][:n]
+    population.task_finished = arrays['task_finished'][:n]
+    return population
+
+def _food_view(shared: SharedArrays, n: int) -> FoodBatch:
+    arrays = shared.arrays
+    food = FoodBatch(arrays['positions'][:n], arrays['angles'][:n], arrays['energy'][:n])
+    food.alive = arrays['alive'][:n]
+    return food
+
+def tile_bounds(field_space: Tuple[Vector, Vector], tiles: Tuple[int, int]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    # (lo, hi) corners of each tile, row by row from field_space[0]
+    lo = np.array((field_space[0].x, field_space[0].y))
+    size = (np.array((field_space[1].x, field_space[1].y)) - lo)/tiles
+    return [(lo + size*(i, j), lo + size*(i + 1, j + 1))
+            for j in range(tiles[1]) for i in range(tiles[0])]
+
+def tile_of(positions: np.ndarray, field_space: Tuple[Vector, Vector], tiles: Tuple[int, int]) -> np.ndarray:
+    lo = np.array((field_space[0].x, field_space[0].y))
+    size = (np.array((field_space[1].x, field_space[1].y)) - lo)/tiles
+    cell = np.floor((positions - lo)/size).astype(np.intp)
+    np.clip(cell, 0, np.array(tiles) - 1, out=cell)
+    return cell[:, 1]*tiles[0] + cell[:, 0]
+
+def _tile_worker(conn: Connection, tile: int, field_space: Tuple[Vector, Vector],
+                 tiles: Tuple[int, int], sense_limited: bool, trig: TrigTable = None):
+    # Steps the creatures inside one tile. The coordinator sends a
+    # 'generation' message whenever the creatures or food are replaced,
+    # then each tick is a 'seek' (move, then report which food could be
+    # eaten) and a 'feed' (eat what the coordinator granted, go home,
+    # report creatures that left the tile).
+    creature_shm = food_shm = None
+    try:
+        lo = np.array((field_space[0].x, field_space[0].y))
+        hi = np.array((field_space[1].x, field_space[1].y))
+        tile_lo, tile_hi = tile_bounds(field_space, tiles)[tile]
+        population = food = food_idx = homers = None
+        active = np.zeros(0, dtype=np.intp)
+        while True:
+            message = conn.recv()
+            command = message[0]
+            if command == 'generation':
+                _, (creature_name, creature_capacity), (food_name, food_capacity), n, n_food, owned, halo = message
+                population = food = None
+                if creature_shm is None or creature_shm.name != creature_name:
+                    if creature_shm is not None:
+                        creature_shm.close()
+                    creature_shm = SharedArrays(CREATURE_FIELDS, creature_capacity, creature_name)
+                if food_shm is None or food_shm.name != food_name:
+                    if food_shm is not None:
+                        food_shm.close()
+                    food_shm = SharedArrays(FOOD_FIELDS, food_capacity, food_name)
+                population = _population_view(creature_shm, n)
+                # Only food in the tile and its halo is visible from here
+                positions = food_shm.arrays['positions'][:n_food]
+                if halo is None:
+                    food_idx = np.arange(n_food)
+                else:
+                    food_idx = np.flatnonzero(((positions >= tile_lo - halo) &
+                                               (positions <= tile_hi + halo)).all(axis=1))
+                food = FoodBatch(positions[food_idx], food_shm.arrays['angles'][food_idx],
+                                 food_shm.arrays['energy'][food_idx])
+                del positions
+                active = owned
+            elif command == 'seek':
+                _, immigrants, food_left = message
+                if len(immigrants):
+                    active = np.union1d(active, immigrants)
+                food.alive[:] = food_shm.arrays['alive'][food_idx]
+                population._active_idx = active
+                seekers, homers = population.split(food_left)
+                eaters, eaten = population.seek(food, seekers, lo, hi, sense_limited, trig=trig)
+                conn.send(('ok', (eaters, food_idx[eaten])))
+            elif command == 'feed':
+                _, eaters, eaten = message
+                population.feed(food, eaters, np.searchsorted(food_idx, eaten))
+                population.home(homers, lo, hi, trig=trig)
+                population.end_tick(lo, hi)
+                active = population.active_indices
+                moved = tile_of(population.positions[active], field_space, tiles) != tile
+                emigrants = active[moved]
+                active = active[~moved]
+                conn.send(('ok', (active, emigrants,
+                                  tile_of(population.positions[emigrants], field_space, tiles))))
+            elif command == 'close':
+                break
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        population = food = None
+        for shm in (creature_shm, food_shm):
+            if shm is not None:
+                shm.close()
+        conn.close()
+
+class TiledSimulation(BatchSimulation):
+    # The batched simulation split into tiles x[0] by tiles[1] spatial
+    # tiles, each stepped by its own worker process. Creature and food
+    # arrays live in shared memory so the workers read and write them in
+    # place, only index arrays go through the pipes.
+    #
+    # Each tick: every worker moves its creatures and reports which food
+    # they reached, the coordinator settles food wanted by several tiles
+    # (lowest creature index wins, as in BatchSimulation), then workers eat,
+    # head home and hand over creatures that crossed into another tile.
+    # Workers only see food within `halo` of their tile. With halo None it
+    # is the max sense when sense_limited (results then match
+    # BatchSimulation exactly) and the whole field otherwise.
+    #
+    # Call close() (or use as a context manager) to stop the workers and
+    # free the shared memory. A closed simulation can still be looked at
+    # but not stepped.
+    def __init__(self, *args, tiles: Tuple[int, int] = (2, 2), halo: float = None, **kwargs):
+        self.tiles = tuple(tiles)
+        self.halo = halo
+        self._creature_shm = self._food_shm = None
+        self._population = self._food_batch = None
+        self._workers: List[Tuple[Process, Connection]] = []
+        self._published = False
+        self._closed = False
+        super().__init__(*args, **kwargs)
+
+    def __enter__(self) -> TiledSimulation:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def population(self) -> Population:
+        return self._population
+
+    @population.setter
+    def population(self, population: Population):
+        n = len(population)
+        if self._creature_shm is None or self._creature_shm.capacity < n:
+            old = self._creature_shm
+            self._creature_shm = SharedArrays(CREATURE_FIELDS, max(n, 2*old.capacity if old else 1))
+            if old is not None:
+                self._population = None
+                old.unlink()
+        arrays = self._creature_shm.arrays
+        for name, _, _ in CREATURE_FIELDS:
+            arrays[name][:n] = getattr(population, name)
+        self._population = _population_view(self._creature_shm, n, population.genome)
+        self._published = False
+
+    @property
+    def food_batch(self) -> FoodBatch:
+        return self._food_batch
+
+    @food_batch.setter
+    def food_batch(self, food: FoodBatch):
+        n = len(food.alive)
+        if self._food_shm is None or self._food_shm.capacity < n:
+            old = self._food_shm
+            self._food_shm = SharedArrays(FOOD_FIELDS, max(n, 2*old.capacity if old else 1))
+            if old is not None:
+                self._food_batch = None
+                old.unlink()
+        arrays = self._food_shm.arrays
+        for name, _, _ in FOOD_FIELDS:
+            arrays[name][:n] = getattr(food, name)
+        self._food_batch = _food_view(self._food_shm, n)
+        self._published = False
+
+    def _request(self, messages: List[tuple]) -> list:
+        for (_, conn), message in zip(self._workers, messages):
+            conn.send(message)
+        replies = []
+        for _, conn in self._workers:
+            status, payload = conn.recv()
+            if status == 'error':
+                self.close()
+                raise RuntimeError(f"tile worker failed:\n{payload}")
+            replies.append(payload)
+        return replies
+
+    def _publish(self):
+        # Hands the current creatures and food to the workers
+        if self._closed:
+            raise RuntimeError("TiledSimulation is closed")
+        if not self._workers:
+            for tile in range(self.tiles[0]*self.tiles[1]):
+                parent, child = Pipe()
+                process = Process(target=_tile_worker, name=f'tile-{tile}', daemon=True,
+                                  args=(child, tile, self.field_space, self.tiles, self.sense_limited,
+                                        self.trig))
+                process.start()
+                child.close()
+                self._workers.append((process, parent))
+        population, food = self._population, self._food_batch
+        halo = self.halo
+        if halo is None and self.sense_limited:
+            halo = float(population.sense.max()) if len(population) else 0.0
+        active = population.active_indices
+        tiles = tile_of(population.positions[active], self.field_space, self.tiles)
+        creatures = (self._creature_shm.name, self._creature_shm.capacity)
+        foods = (self._food_shm.name, self._food_shm.capacity)
+        for tile, (_, conn) in enumerate(self._workers):
+            conn.send(('generation', creatures, foods, len(population), len(food.alive),
+                       active[tiles == tile], halo))
+        self._immigrants = [np.zeros(0, dtype=np.intp) for _ in self._workers]
+        self._published = True
+
+    def generation_finished(self) -> bool:
+        if not self._published and not self._closed:
+            self._publish()
+        return not len(self._population.active_indices)
+
+    def tick_once(self):
+        if not self._published:
+            self._publish()
+        profiler = self.profiler
+        if profiler is not None:
+            start = perf_counter()
+            profiler.count('creature_turns', len(self._population.active_indices))
+        food_left = bool(self._food_batch.alive.any())
+        claims = self._request([('seek', immigrants, food_left) for immigrants in self._immigrants])
+
+        # Food reached from several tiles goes to the lowest creature index
+        eaters = np.concatenate([eaters for eaters, _ in claims])
+        eaten = np.concatenate([eaten for _, eaten in claims])
+        order = np.argsort(eaters, kind='stable')
+        _, first = np.unique(eaten[order], return_index=True)
+        granted = np.zeros(len(eaters), dtype=bool)
+        granted[order[first]] = True
+        self._food_batch.alive[eaten[granted]] = False
+
+        messages, offset = [], 0
+        for tile_eaters, _ in claims:
+            mask = granted[offset:offset + len(tile_eaters)]
+            messages.append(('feed', tile_eaters[mask], eaten[offset:offset + len(tile_eaters)][mask]))
+            offset += len(tile_eaters)
+        results = self._request(messages)
+
+        emigrants = np.concatenate([emigrants for _, emigrants, _ in results])
+        destinations = np.concatenate([destinations for _, _, destinations in results])
+        self._immigrants = [emigrants[destinations == tile] for tile in range(len(self._workers))]
+        # The same creatures as the workers have, kept sorted like
+        # Population.active_indices
+        self._population._active_idx = np.sort(np.concatenate(
+            [staying for staying, _, _ in results] + [emigrants]))
+        if profiler is not None:
+            profiler.add('step', perf_counter() - start)
+        self.ticks += 1
+        if self.sensing:
+            self._sense()
+        self.notify('on_tick')
+
+    def close(self):
+        for process, conn in self._workers:
+            try:
+                conn.send(('close',))
+            except (BrokenPipeError, OSError):
+                pass
+        for process, conn in self._workers:
+            process.join()
+            conn.close()
+        self._workers = []
+        self._published = False
+        self._closed = True
+        # The arrays are copied out so the simulation can still be looked at
+        if self._population is not None:
+            shared = self._population
+            self._population = Population(*(getattr(shared, name).copy()
+                                            for name in ('positions', 'headings', 'energy', 'sense',
+                                                         'size', 'turn_speed', 'move_speed')),
+                                          genome=shared.genome)
+            self._population.got_food = shared.got_food.copy()
+            self._population.task_finished = shared.task_finished.copy()
+        if self._food_batch is not None:
+            food = self._food_batch
+            self._food_batch = FoodBatch(food.positions.copy(), food.angles.copy(), food.energy.copy())
+            self._food_batch.alive[:] = food.alive
+        for shm in (self._creature_shm, self._food_shm):
+            if shm is not None:
+                shm.unlink()
+        self._creature_shm = self._food_shm = None
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+
+from __future__ import annotations
+
+from Observer import Observer
+from Snapshot import Snapshot
+from Stats import FoodWatch
+from MapUtils import Vector
+from typing import Tuple
+from math import pi
+import numpy as np
+import struct
+import json
+
+MAGIC = b'EVOTRAJ1'
+
+# Record types. Every tick gets a KEYFRAME or DELTA of the creatures, plus
+# an EATEN record when food went. A generation starts with a GENERATION
+# record (its food) followed by a KEYFRAME.
+GENERATION, KEYFRAME, DELTA, EATEN = 1, 2, 3, 4
+RECORD = struct.Struct('<BxxxIq')  # type, payload bytes, tick
+
+# Positions are stored as uint16 fractions of the field and headings as
+# uint16 fractions of a turn, deltas between ticks as int16
+QUANTUM = 65535
+TURN = 65536
+
+def _pad(payload: bytes) -> bytes:
+    return payload + b'\0'*(-len(payload) % 8)
+
+class TrajectoryWriter(Observer):
+    # Appends every tick's creature positions and headings, and the food
+    # eaten, to a compact binary log for replaying later (see
+    # TrajectoryReader and Graphics.replay). Positions are quantised to
+    # 1/65535 of the field and written as deltas from the tick before,
+    # with a full keyframe every `keyframe_every` ticks so replay can seek.
+    def __init__(self, path: str, keyframe_every: int = 100):
+        self.path = path
+        self.keyframe_every = keyframe_every
+        self.file = open(path, 'wb')
+        self.lo = self.extent = None
+        self._food = FoodWatch()
+        self._previous = None
+        self._since_keyframe = 0
+
+    def __enter__(self) -> TrajectoryWriter:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _record(self, kind: int, tick: int, *parts: bytes):
+        payload = _pad(b''.join(parts))
+        self.file.write(RECORD.pack(kind, len(payload), tick))
+        self.file.write(payload)
+
+    def _quantise(self, snapshot: Snapshot) -> Tuple[np.ndarray, np.ndarray]:
+        positions = np.rint((snapshot.creature_positions - self.lo)/self.extent*QUANTUM)
+        positions = np.clip(positions, 0, QUANTUM).astype('<u2')
+        headings = (np.rint(snapshot.creature_headings/(2*pi)*TURN) % TURN).astype('<u2')
+        return positions, headings
+
+    def begin(self, simulation: Simulation):
+        # Writes the generation's food and starting positions, called
+        # automatically on the first tick and at every new generation
+        if self.lo is None:
+            field_space = simulation.field_space
+            self.lo = np.array((field_space[0].x, field_space[0].y))
+            self.extent = np.array((field_space[1].x, field_space[1].y)) - self.lo
+            header = json.dumps({'field_space': [[v.x, v.y] for v in field_space],
+                                 'keyframe_every': self.keyframe_every}).encode()
+            self.file.write(_pad(MAGIC + struct.pack('<I', len(header)) + header))
+        snapshot = simulation.snapshot()
+        food = self._food
+        food.reset(simulation)
+        quantised = np.clip(np.rint((food.positions - self.lo)/self.extent*QUANTUM), 0, QUANTUM).astype('<u2')
+        angles = (np.rint(food.angles/(2*pi)*TURN) % TURN).astype('<u2')
+        self._record(GENERATION, simulation.ticks,
+                     struct.pack('<qq', simulation.generation, len(angles)),
+                     quantised.tobytes(), angles.tobytes())
+        self._write_eaten(simulation)
+        self._keyframe(simulation.ticks, *self._quantise(snapshot))
+
+    def _write_eaten(self, simulation: Simulation):
+        eaten = self._food.eaten(simulation)
+        if len(eaten):
+            self._record(EATEN, simulation.ticks, struct.pack('<q', len(eaten)),
+                         eaten.astype('<u4').tobytes())
+
+    def _keyframe(self, tick: int, positions: np.ndarray, headings: np.ndarray):
+        self._record(KEYFRAME, tick, struct.pack('<q', len(headings)),
+                     positions.tobytes(), headings.tobytes())
+        self._previous = (positions, headings)
+        self._since_keyframe = 0
+
+    def on_tick(self, simulation: Simulation):
+        if self.lo is None:
+            self.begin(simulation)
+            return
+        self._write_eaten(simulation)
+        positions, headings = self._quantise(simulation.snapshot())
+        previous_positions, previous_headings = self._previous
+        self._since_keyframe += 1
+        delta = positions.astype(np.int32) - previous_positions
+        if (self._since_keyframe >= self.keyframe_every or len(headings) != len(previous_headings)
+                or np.abs(delta).max(initial=0) > 32767):
+            self._keyframe(simulation.ticks, positions, headings)
+            return
+        # Heading deltas wrap round, which uint16 arithmetic does for us
+        turned = (headings - previous_headings).view('<i2')
+        self._record(DELTA, simulation.ticks, struct.pack('<q', len(headings)),
+                     delta.astype('<i2').tobytes(), turned.tobytes())
+        self._previous = (positions, headings)
+
+    def on_generation(self, simulation: Simulation):
+        self.begin(simulation)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+class TrajectoryReader:
+    # Memory maps a TrajectoryWriter log and rebuilds the Snapshot of any
+    # tick in it. Stepping forward a tick at a time is incremental, jumping
+    # around decodes from the nearest keyframe.
+    def __init__(self, path: str):
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a trajectory log")
+        length, = struct.unpack_from('<I', self.data, len(MAGIC))
+        header = json.loads(bytes(self.data[len(MAGIC) + 4:len(MAGIC) + 4 + length]))
+        (x0, y0), (x1, y1) = header['field_space']
+        self.field_space = (Vector(x0, y0), Vector(x1, y1))
+        self.lo = np.array((x0, y0))
+        self.extent = np.array((x1, y1)) - self.lo
+
+        # One pass over the record headers to index the file
+        offset = len(MAGIC) + 4 + length
+        offset += -offset % 8
+        kinds, ticks, offsets = [], [], []
+        size = len(self.data)
+        while offset + RECORD.size <= size:
+            kind, payload, tick = RECORD.unpack_from(self.data, offset)
+            if offset + RECORD.size + payload > size:
+                break  # cut short, e.g. still being written
+            kinds.append(kind)
+            ticks.append(tick)
+            offsets.append(offset + RECORD.size)
+            offset += RECORD.size + payload
+        self.kinds = np.array(kinds, dtype=np.uint8)
+        self.record_ticks = np.array(ticks, dtype=np.int64)
+        self.offsets = np.array(offsets, dtype=np.int64)
+
+        # Frames are the KEYFRAME/DELTA records, one per tick
+        self.frames = np.flatnonzero((self.kinds == KEYFRAME) | (self.kinds == DELTA))
+        self.ticks = self.record_ticks[self.frames]
+        self._keyframes = np.flatnonzero(self.kinds[self.frames] == KEYFRAME)
+        self._generation_records = np.flatnonzero(self.kinds == GENERATION)
+        self.generations = np.array([struct.unpack_from('<q', self.data, self.offsets[r])[0]
+                                     for r in self._generation_records], dtype=np.int64)
+        self._cursor = None
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def generation_start(self, generation: int) -> int:
+        # Index of the first frame of a generation
+        i = np.searchsorted(self.generations, generation)
+        i = min(i, len(self.generations) - 1)
+        return int(np.searchsorted(self.frames, self._generation_records[i]))
+
+    def generation_of(self, frame: int) -> int:
+        i = np.searchsorted(self._generation_records, self.frames[frame], side='right') - 1
+        return int(self.generations[max(i, 0)])
+
+    def _array(self, offset: int, dtype: str, shape: tuple) -> np.ndarray:
+        count = int(np.prod(shape))
+        return np.frombuffer(self.data, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    def _creatures(self, record: int) -> Tuple[int, np.ndarray, np.ndarray]:
+        offset = int(self.offsets[record])
+        n, = struct.unpack_from('<q', self.data, offset)
+        if self.kinds[record] == KEYFRAME:
+            positions = self._array(offset + 8, '<u2', (n, 2))
+            headings = self._array(offset + 8 + 4*n, '<u2', (n,))
+        else:
+            positions = self._array(offset + 8, '<i2', (n, 2))
+            headings = self._array(offset + 8 + 4*n, '<i2', (n,))
+        return n, positions, headings
+
+    def _seek(self, frame: int):
+        record = self.frames[frame]
+        generation = self._generation_records[np.searchsorted(self._generation_records, record, side='right') - 1]
+        offset = int(self.offsets[generation])
+        _, m = struct.unpack_from('<qq', self.data, offset)
+        food_positions = self._array(offset + 16, '<u2', (m, 2))
+        food_angles = self._array(offset + 16 + 4*m, '<u2', (m,))
+        alive = np.ones(m, dtype=bool)
+        for r in np.flatnonzero(self.kinds[generation:record + 1] == EATEN) + generation:
+            alive[self._eaten(r)] = False
+
+        start = int(self._keyframes[np.searchsorted(self._keyframes, frame, side='right') - 1])
+        _, positions, headings = self._creatures(self.frames[start])
+        positions, headings = positions.astype(np.int32), headings.copy()
+        for f in range(start + 1, frame + 1):
+            _, dpos, dheading = self._creatures(self.frames[f])
+            positions += dpos
+            headings += dheading.view('<u2')
+        self._cursor = [frame, record, positions, headings, food_positions, food_angles, alive,
+                        self.generation_of(frame)]
+
+    def _eaten(self, record: int) -> np.ndarray:
+        offset = int(self.offsets[record])
+        count, = struct.unpack_from('<q', self.data, offset)
+        return self._array(offset + 8, '<u4', (count,))
+
+    def _step(self):
+        # Cursor on to the next frame
+        frame, record, positions, headings, food_positions, food_angles, alive, generation = self._cursor
+        next_record = self.frames[frame + 1]
+        for r in range(record + 1, next_record):
+            if self.kinds[r] == GENERATION:
+                self._seek(frame + 1)
+                return
+            if self.kinds[r] == EATEN:
+                alive[self._eaten(r)] = False
+        n, dpos, dheading = self._creatures(next_record)
+        if self.kinds[next_record] == KEYFRAME:
+            positions, headings = dpos.astype(np.int32), dheading.copy()
+        else:
+            positions += dpos
+            headings += dheading.view('<u2')
+        self._cursor = [frame + 1, next_record, positions, headings, food_positions, food_angles,
+                        alive, generation]
+
+    def frame(self, frame: int) -> Snapshot:
+        if self._cursor is not None and self._cursor[0] + 1 == frame:
+            self._step()
+        elif self._cursor is None or self._cursor[0] != frame:
+            self._seek(frame)
+        _, record, positions, headings, food_positions, food_angles, alive, generation = self._cursor
+        scale = self.extent/QUANTUM
+        return Snapshot(generation, int(self.record_ticks[record]),
+                        positions*scale + self.lo, headings*(2*pi/TURN),
+                        food_positions[alive]*scale + self.lo, food_angles[alive]*(2*pi/TURN))
+
+def export(reader: TrajectoryReader, exporter: FrameExporter, start: int = 0, every: int = 1):
+    # Renders the log from frame `start` on without a window
+    try:
+        for frame in range(start, len(reader), every):
+            exporter.submit(reader.frame(frame), reader.field_space)
+    finally:
+        exporter.close()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Replay a trajectory log written with --trajectory")
+    parser.add_argument('path')
+    parser.add_argument('--speed', type=float, default=60, help="ticks per second to start at")
+    parser.add_argument('--generation', type=int, default=0, help="generation to start from")
+    parser.add_argument('--frames', metavar='DIR',
+                        help="render to images in this directory instead of opening a window")
+    parser.add_argument('--frames-every', type=int, default=1, metavar='N')
+    parser.add_argument('--frames-format', choices=('png', 'raw'), default='png')
+    args = parser.parse_args()
+    if args.frames:
+        from FrameExport import FrameExporter
+        reader = TrajectoryReader(args.path)
+        export(reader, FrameExporter(args.frames, format=args.frames_format),
+               reader.generation_start(args.generation), args.frames_every)
+        return
+    from Graphics import replay
+    replay(args.path, speed=args.speed, generation=args.generation)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from Creature import Creature
+from Sim import Simulation, BatchSimulation
+from MapUtils import Vector
+import numpy as np
+import pytest
+
+FIELD = (Vector(0, 0), Vector(100, 100))
+START = {'count': 12, 'food': 12}
+
+def sidelined(sim):
+    # Finishes the first two creatures and kills the next two before the
+    # generation starts
+    creatures = sim.creatures
+    for creature in creatures[:2]:
+        creature.task_finished = True
+    for creature in creatures[2:4]:
+        creature.energy = 0
+    sim.creatures = creatures
+
+def test_object_engine_only_steps_active_creatures(monkeypatch):
+    stepped = []
+    calculate_turn = Creature.calculate_turn
+    def counting(self, *args, **kwargs):
+        stepped.append(self)
+        return calculate_turn(self, *args, **kwargs)
+    monkeypatch.setattr(Creature, 'calculate_turn', counting)
+    sim = Simulation(FIELD, seed=1, start=START)
+    sidelined(sim)
+    while not sim.generation_finished():
+        active = [c for c in sim.creatures if not c.task_finished and c.energy > 0]
+        stepped.clear()
+        sim.tick_once()
+        assert stepped == active
+    assert not any(c in stepped for c in sim.creatures[:4])
+    assert all(c.task_finished or c.energy <= 0 for c in sim.creatures)
+
+def test_batched_active_indices_follow_the_population():
+    sim = BatchSimulation(FIELD, seed=1, start=START)
+    sidelined(sim)
+    population = sim.population
+    before = population.positions[:4].copy()
+    while not sim.generation_finished():
+        np.testing.assert_array_equal(population.active_indices, np.flatnonzero(population.active))
+        sim.tick_once()
+    assert not len(population.active_indices) and not population.active.any()
+    np.testing.assert_array_equal(population.positions[:4], before)
+
+@pytest.mark.parametrize('sim_class', [Simulation, BatchSimulation])
+def test_new_population_is_all_active(sim_class):
+    sim = sim_class(FIELD, seed=3, start=START)
+    while not sim.generation_finished():
+        sim.tick_once()
+    sim.next_generation()
+    assert sim.creatures and not sim.generation_finished()
+    if sim_class is BatchSimulation:
+        np.testing.assert_array_equal(sim.population.active_indices, np.arange(len(sim.population)))
+    # Replacing the creatures by hand resets the active set too
+    creatures = sim.creatures
+    for creature in creatures:
+        creature.task_finished = True
+    sim.creatures = creatures
+    assert sim.generation_finished()
+    creatures[0].task_finished = False
+    sim.creatures = creatures
+    assert not sim.generation_finished()
+
+def test_refresh_active_after_outside_changes():
+    sim = BatchSimulation(FIELD, seed=2, start=START)
+    population = sim.population
+    assert len(population.active_indices) == START['count']
+    population.energy[5] = 0
+    population.refresh_active()
+    assert 5 not in population.active_indices
+    assert len(population.active_indices) == START['count'] - 1
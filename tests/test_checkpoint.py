@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from Checkpoint import Checkpointer, capture, load_checkpoint, save_checkpoint
+from Sim import Simulation, BatchSimulation
+from Tiling import TiledSimulation
+from MapUtils import Vector
+import numpy as np
+import pytest
+
+FIELD = (Vector(0, 0), Vector(150, 150))
+START = {'count': 20, 'food': 30, 'energy': 3000}
+
+def assert_same_state(a, b):
+    arrays_a, meta_a = capture(a)
+    arrays_b, meta_b = capture(b)
+    assert arrays_a.keys() == arrays_b.keys()
+    for name in arrays_a:
+        np.testing.assert_array_equal(arrays_a[name], arrays_b[name], err_msg=name)
+    for key in ('generation', 'ticks', 'rng', 'np_rng', 'start', 'genome'):
+        assert meta_a[key] == meta_b[key], key
+
+@pytest.mark.parametrize('sim_class, kwargs', [
+    (Simulation, {}),
+    (Simulation, {'fast_forward': True}),
+    (BatchSimulation, {}),
+    (BatchSimulation, {'trig_table': True, 'sense_limited': True}),
+])
+def test_resume_matches_uninterrupted_run(tmp_path, sim_class, kwargs):
+    path = str(tmp_path/'state.npz')
+    straight = sim_class(FIELD, seed=4, start=START, **kwargs)
+    straight.run(4)
+
+    first = sim_class(FIELD, seed=4, start=START, **kwargs)
+    first.run(2)
+    save_checkpoint(first, path)
+    resumed = load_checkpoint(path)
+    assert type(resumed) is sim_class
+    assert resumed.sense_limited == straight.sense_limited
+    assert getattr(resumed, 'trig_table', False) == kwargs.get('trig_table', False)
+    resumed.run(2)
+    assert_same_state(straight, resumed)
+
+@pytest.mark.parametrize('sim_class', [Simulation, BatchSimulation])
+def test_resume_mid_generation(tmp_path, sim_class):
+    path = str(tmp_path/'state.npz')
+    def part_way(sim, ticks):
+        sim.run(1)
+        for _ in range(ticks):
+            sim.tick_once()
+    straight = sim_class(FIELD, seed=6, start=START)
+    part_way(straight, 80)
+    first = sim_class(FIELD, seed=6, start=START)
+    part_way(first, 40)
+    slots = capture(first)[0]['food_slots']
+    assert (slots < 0).any() and (slots >= 0).any()
+    save_checkpoint(first, path)
+    resumed = load_checkpoint(path)
+    # Eaten food is kept so the food is numbered as before
+    assert_same_state(first, resumed)
+    for _ in range(40):
+        resumed.tick_once()
+    assert_same_state(straight, resumed)
+
+def test_round_trip_keeps_state(tmp_path):
+    path = str(tmp_path/'state.npz')
+    sim = BatchSimulation(FIELD, seed=1, start=START)
+    sim.run(1)
+    # Mid generation too, not only at a boundary
+    for _ in range(30):
+        sim.tick_once()
+    save_checkpoint(sim, path)
+    assert_same_state(sim, load_checkpoint(path))
+
+def test_tiled_resumes_tiled(tmp_path):
+    path = str(tmp_path/'state.npz')
+    straight = BatchSimulation(FIELD, seed=2, start=START)
+    straight.run(3)
+    with TiledSimulation(FIELD, seed=2, start=START, tiles=(2, 1), halo=40) as tiled:
+        tiled.run(1)
+        save_checkpoint(tiled, path)
+    with load_checkpoint(path) as resumed:
+        assert type(resumed) is TiledSimulation
+        assert resumed.tiles == (2, 1) and resumed.halo == 40
+        resumed.run(2)
+    assert_same_state(straight, resumed)
+
+def test_batched_resumes_over_tiles(tmp_path):
+    path = str(tmp_path/'state.npz')
+    straight = BatchSimulation(FIELD, seed=2, start=START)
+    straight.run(3)
+    batched = BatchSimulation(FIELD, seed=2, start=START)
+    batched.run(1)
+    save_checkpoint(batched, path)
+    with load_checkpoint(path, engine='TiledSimulation', tiles=(1, 2)) as resumed:
+        assert resumed.tiles == (1, 2)
+        resumed.run(2)
+    assert_same_state(straight, resumed)
+    with pytest.raises(ValueError):
+        load_checkpoint(path, engine='Simulation')
+
+def test_checkpointer_writes_in_background(tmp_path):
+    path = str(tmp_path/'state.npz')
+    checkpointer = Checkpointer(path, every=2)
+    sim = BatchSimulation(FIELD, [checkpointer], seed=3, start=START)
+    sim.run(4)
+    checkpointer.close()
+    assert_same_state(sim, load_checkpoint(path))
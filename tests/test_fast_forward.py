@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from Checkpoint import capture
+from Instrumentation import Profiler
+from Sim import Simulation, BatchSimulation
+from MapUtils import Vector
+import numpy as np
+import pytest
+
+FIELD = (Vector(0, 0), Vector(300, 300))
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_single_creature_matches_stepping(seed):
+    start = {'count': 1, 'food': 20, 'energy': 5000}
+    stepped = Simulation(FIELD, seed=seed, start=start)
+    fast = Simulation(FIELD, seed=seed, start=start, fast_forward=True)
+    stepped.run(3)
+    fast.run(3)
+    assert fast.generation == stepped.generation and fast.ticks == stepped.ticks
+    a, b = capture(stepped)[0], capture(fast)[0]
+    for name in ('positions', 'headings', 'energy', 'got_food', 'task_finished', 'food_positions'):
+        np.testing.assert_allclose(b[name], a[name], err_msg=name)
+
+def test_skips_most_creature_turns():
+    start = {'count': 50, 'food': 50, 'energy': 5000}
+    turns = []
+    for fast_forward in (False, True):
+        profiler = Profiler()
+        sim = Simulation(FIELD, seed=0, start=start, fast_forward=fast_forward, profiler=profiler)
+        sim.run(2)
+        turns.append(sum(s['counters']['creature_turns'] for s in profiler.summaries))
+    assert turns[1] < turns[0]/3
+
+def test_batched_engine_rejects_it():
+    with pytest.raises(ValueError):
+        BatchSimulation(FIELD, fast_forward=True)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from Creature import Food
+from FoodStore import FoodStore
+from MapUtils import Vector, RadianAngle
+from random import Random
+
+FIELD = (Vector(0, 0), Vector(100, 100))
+
+def make_food(n: int, seed: int = 0):
+    rng = Random(seed)
+    return [Food(Vector(rng.uniform(0, 100), rng.uniform(0, 100)), RadianAngle(0)) for _ in range(n)]
+
+def check_consistent(store: FoodStore):
+    for slot, food in enumerate(store.items):
+        assert food.slot == slot
+        assert food in store
+    assert len(store.index) == len(store)
+    assert set(map(id, store.index)) == set(map(id, store.items))
+
+def test_remove_swaps_in_last():
+    foods = make_food(10)
+    store = FoodStore(FIELD, foods)
+    store.remove(foods[2])
+    assert foods[2].slot is None
+    assert foods[2] not in store
+    assert store[2] is foods[9]
+    assert len(store) == 9 and store.eaten == 1
+    check_consistent(store)
+
+def test_remove_everything_in_any_order():
+    foods = make_food(50)
+    store = FoodStore(FIELD, foods)
+    order = list(foods)
+    Random(3).shuffle(order)
+    for i, food in enumerate(order):
+        store.remove(food)
+        assert len(store) == len(foods) - i - 1
+        check_consistent(store)
+    assert store.eaten == len(foods)
+    assert store.nearest(Vector(50, 50))[0] is None
+
+def test_reset_keeps_spawn_order():
+    store = FoodStore(FIELD, make_food(5))
+    foods = make_food(20, seed=1)
+    store.reset(foods)
+    for food in foods[:10]:
+        store.remove(food)
+    assert store.eaten == 10
+    assert store.spawned == foods
+    check_consistent(store)
+
+def test_restore_puts_back_slots_and_spawn_order():
+    foods = make_food(30, seed=2)
+    store = FoodStore(FIELD, foods)
+    for food in Random(4).sample(foods, 12):
+        store.remove(food)
+    slots = [-1 if food.slot is None else food.slot for food in store.spawned]
+
+    copies = make_food(30, seed=2)
+    restored = FoodStore(FIELD)
+    restored.restore(copies, slots)
+    assert restored.eaten == 12
+    assert [food.slot for food in restored.spawned] == [food.slot for food in foods]
+    assert [copies.index(food) for food in restored] == [foods.index(food) for food in store]
+    check_consistent(restored)
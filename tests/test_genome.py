@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from Genome import DEFAULT_GENOME, Genome, GeneColumn, GeneSpec
+from Sim import Simulation
+from MapUtils import Vector
+from math import pi
+import numpy as np
+import pickle
+
+GENOME = Genome([
+    GeneSpec('a', 100, (GeneColumn('count', 'int', 3, low=0, high=10),)),
+    GeneSpec('b', 100, (GeneColumn('turn', 'angle', 2, 0.5),
+                        GeneColumn('speed', 'float', 1, 0.25, low=0.1))),
+    GeneSpec('c', 0,   (GeneColumn('fixed', 'float', 5),)),
+])
+
+def test_mutate_respects_bounds_and_steps():
+    rng = np.random.default_rng(0)
+    values = np.tile([5.0, 6.0, 0.2, 1.0], (5000, 1))
+    mutated = GENOME.mutate(values, rng)
+    count, turn, speed, fixed = mutated.T
+    assert np.all((count >= 0) & (count <= 10)) and np.all(count == np.round(count))
+    assert np.all(np.abs(count - 5) <= 3)
+    assert np.all((turn >= 0) & (turn < 2*pi))
+    # 6 + up to two half steps either way, wrapped
+    steps = np.round(((turn - 6 + pi) % (2*pi) - pi)/0.5, 9)
+    assert set(steps.tolist()) <= {-2, -1, 0, 1, 2}
+    assert np.all(speed >= 0.1)
+    np.testing.assert_array_equal(fixed, 1.0)
+    # Every possible step shows up
+    assert set(np.unique(count).tolist()) == set(range(2, 9))
+
+def test_mutate_leaves_input_alone_and_is_seeded():
+    values = np.tile([5.0, 6.0, 0.2, 1.0], (100, 1))
+    before = values.copy()
+    a = GENOME.mutate(values, np.random.default_rng(7))
+    b = GENOME.mutate(values, np.random.default_rng(7))
+    np.testing.assert_array_equal(values, before)
+    np.testing.assert_array_equal(a, b)
+
+def test_mutation_chance():
+    genome = Genome([GeneSpec('a', 50, (GeneColumn('x', 'float', 1, low=-10, high=10),))])
+    mutated = genome.mutate(np.zeros((20000, 1)), np.random.default_rng(1))
+    # 50 of 101 mutate, and a third of those draw a zero step
+    changed = np.count_nonzero(mutated)/len(mutated)
+    assert abs(changed - 50/101*2/3) < 0.02
+
+def test_pack_unpack_round_trip():
+    sim = Simulation((Vector(0, 0), Vector(100, 100)), seed=0, start={'count': 10})
+    creatures = sim.creatures
+    packed = DEFAULT_GENOME.pack(creatures)
+    assert packed.shape == (10, len(DEFAULT_GENOME.columns))
+    for creature, row in zip(creatures, packed):
+        genes = DEFAULT_GENOME.unpack(row)
+        assert genes['senseg'].val == creature.senseg.val
+        assert genes['sizeg'].val == creature.sizeg.val
+        assert genes['speedg'].val.angle == creature.speedg.val.angle
+        assert genes['speedg'].val.magnitude == creature.speedg.val.magnitude
+
+def test_json_and_pickle_round_trip():
+    assert Genome.from_json(GENOME.to_json()) == GENOME
+    assert Genome.from_json(DEFAULT_GENOME.to_json()) == DEFAULT_GENOME
+    assert pickle.loads(pickle.dumps(GENOME)) == GENOME
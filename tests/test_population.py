@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from Population import Population
+from Sim import Simulation, BatchSimulation
+from MapUtils import Vector
+import numpy as np
+import pytest
+
+FIELD = (Vector(0, 0), Vector(150, 150))
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('sense_limited', [False, True])
+def test_lone_creature_matches_object_engine(seed, sense_limited):
+    start = {'count': 1, 'food': 15, 'energy': 5000, 'sense': 40}
+    objects = Simulation(FIELD, seed=seed, start=start, sense_limited=sense_limited)
+    arrays = BatchSimulation(FIELD, seed=seed, start=start, sense_limited=sense_limited)
+    while not objects.generation_finished():
+        objects.tick_once()
+        arrays.tick_once()
+        creature, = objects.creatures
+        np.testing.assert_allclose(arrays.population.positions[0],
+                                   (creature.position.x, creature.position.y), atol=1e-9)
+        assert arrays.population.energy[0] == pytest.approx(creature.energy)
+        assert arrays.food_remaining() == objects.food_remaining()
+    assert arrays.generation_finished()
+    assert bool(arrays.population.got_food[0]) == creature.got_food
+
+def test_creature_round_trip():
+    sim = Simulation(FIELD, seed=1, start={'count': 12})
+    sim.run(1)
+    creatures = sim.creatures
+    population = Population.from_creatures(creatures, sim.genome)
+    back = population.to_creatures()
+    for a, b in zip(creatures, back):
+        assert (a.position, a.heading, a.energy) == (b.position, b.heading, b.energy)
+        assert a.senseg.val == b.senseg.val and a.sizeg.val == b.sizeg.val
+        assert a.speedg.val.angle == b.speedg.val.angle
+        assert a.speedg.val.magnitude == b.speedg.val.magnitude
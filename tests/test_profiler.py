@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from Instrumentation import Profiler, format_summary
+from Observer import Observer
+from Sim import Simulation, BatchSimulation
+from MapUtils import Vector
+import pytest
+
+FIELD = (Vector(0, 0), Vector(100, 100))
+
+def test_phases_and_counters():
+    seen = []
+    profiler = Profiler(seen.append)
+    profiler.add('move', 0.25)
+    profiler.add('move', 0.5)
+    with profiler.phase('eat'):
+        pass
+    profiler.count('ticks', 3)
+    profiler.count('ticks')
+    summary = profiler.end_generation(1)
+    assert seen == [summary] and list(profiler.summaries) == [summary]
+    assert summary['generation'] == 1 and summary['wall'] >= 0
+    assert summary['phases']['move'] == {'seconds': 0.75, 'calls': 2}
+    assert summary['phases']['eat']['calls'] == 1 and summary['phases']['eat']['seconds'] >= 0
+    assert summary['counters'] == {'ticks': 4}
+    assert 'move' in format_summary(summary)
+    # Everything starts again for the next generation
+    assert profiler.end_generation(2)['phases'] == {}
+
+def test_keeps_the_last_summaries():
+    profiler = Profiler(keep=2)
+    for generation in range(5):
+        profiler.end_generation(generation)
+    assert [s['generation'] for s in profiler.summaries] == [3, 4]
+
+class Quiet(Observer):
+    pass
+
+@pytest.mark.parametrize('sim_class', [Simulation, BatchSimulation])
+def test_simulation_summaries(sim_class):
+    profiler = Profiler()
+    sim = sim_class(FIELD, [Quiet()], seed=2, start={'count': 8, 'food': 10}, profiler=profiler)
+    sim.run(3)
+    summaries = list(profiler.summaries)
+    assert [s['generation'] for s in summaries] == [1, 2, 3]
+    assert sum(s['counters']['ticks'] for s in summaries) == sim.ticks
+    assert summaries[-1]['counters']['population'] == len(sim.creatures)
+    turns = 'calculate_turn' if sim_class is Simulation else 'step'
+    for summary in summaries:
+        phases = summary['phases']
+        assert phases[turns]['calls'] == summary['counters']['ticks']
+        assert phases['reproduction']['calls'] == 1
+        assert phases['on_tick:Quiet']['calls'] == summary['counters']['ticks']
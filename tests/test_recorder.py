@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from Recorder import GenerationRecorder, histogram_edges, read_generations
+from Sim import BatchSimulation
+from MapUtils import Vector
+import numpy as np
+import pytest
+
+FIELD = (Vector(0, 0), Vector(150, 150))
+
+def test_records_and_appends(tmp_path):
+    path = str(tmp_path/'stats.bin')
+    with GenerationRecorder(path, buffer_rows=2) as recorder:
+        BatchSimulation(FIELD, [recorder], seed=0, start={'count': 10}).run(3)
+    with GenerationRecorder(path) as recorder:
+        sim = BatchSimulation(FIELD, [recorder], seed=1, start={'count': 10})
+        sim.run(2)
+    rows = read_generations(path)
+    assert rows['generation'].tolist() == [1, 2, 3, 1, 2]
+    assert rows['population'][-1] == len(sim.population)
+    assert rows['sense_hist'][-1].sum() == len(sim.population)
+    np.testing.assert_array_equal(histogram_edges(path, 'sense'), np.linspace(0, 50, 51))
+
+def test_refuses_other_layouts(tmp_path):
+    path = str(tmp_path/'stats.bin')
+    GenerationRecorder(path).close()
+    with pytest.raises(ValueError, match='layout'):
+        GenerationRecorder(path, bins={'sense': (0, 50, 10)})
+    # Same number of bins over another range
+    with pytest.raises(ValueError, match='sense'):
+        GenerationRecorder(path, bins={'sense': (0, 100, 50)})
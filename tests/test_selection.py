@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from Selection import (SelectionPolicy, TournamentSelection, ProportionalSelection,
+                       SELECTIONS, REPRODUCE_ENERGY, affordable)
+from Population import Population
+from Creature import BIRTH_COST
+from Sim import Simulation, BatchSimulation
+from MapUtils import Vector
+import numpy as np
+import pytest
+
+FIELD = (Vector(0, 0), Vector(150, 150))
+
+def random_population(seed: int, n: int = 200):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 400, n), rng.random(n) < 0.7
+
+@pytest.mark.parametrize('name', sorted(SELECTIONS))
+@pytest.mark.parametrize('seed', range(3))
+def test_survivors_and_births(name, seed):
+    energy, finished = random_population(seed)
+    policy = SELECTIONS[name]()
+    survived, counts = policy.select(energy, finished, np.random.default_rng(seed))
+    np.testing.assert_array_equal(survived, finished)
+    eligible = finished & (energy >= policy.min_energy)
+    # One birth per eligible creature, only eligible creatures breed, and
+    # none of them more often than it can afford
+    assert counts.sum() == eligible.sum()
+    assert not counts[~eligible].any()
+    assert (energy - counts*BIRTH_COST)[eligible].min() > 0
+
+@pytest.mark.parametrize('name', sorted(SELECTIONS))
+def test_seeded(name):
+    energy, finished = random_population(5)
+    policy = SELECTIONS[name]()
+    _, a = policy.select(energy, finished, np.random.default_rng(8))
+    _, b = policy.select(energy, finished, np.random.default_rng(8))
+    np.testing.assert_array_equal(a, b)
+
+def test_policy_must_implement_offspring():
+    with pytest.raises(TypeError):
+        SelectionPolicy()
+
+def test_affordable():
+    np.testing.assert_array_equal(affordable(np.array([0., 40, 50, 51, 100, 160])),
+                                  [1, 1, 1, 1, 1, 3])
+
+def test_tournament_spreads_births_nobody_can_afford():
+    # The strongest creature wins every tournament it is in but can only
+    # pay for three children
+    energy = np.array([190.] + [150.]*9)
+    counts = TournamentSelection(size=10).offspring(energy, np.ones(10, dtype=bool),
+                                                    np.random.default_rng(0))
+    assert counts[0] == 3
+    assert counts.sum() == 10
+
+def test_proportional_without_energy():
+    energy = np.zeros(6)
+    eligible = np.array([True, True, False, True, False, True])
+    counts = ProportionalSelection(min_energy=0).offspring(energy, eligible,
+                                                           np.random.default_rng(1))
+    assert counts.sum() == 4
+    assert not counts[~eligible].any()
+
+@pytest.mark.parametrize('name', sorted(SELECTIONS))
+def test_object_and_batched_engines_agree(name):
+    objects = Simulation(FIELD, seed=3, start={'count': 40}, selection=SELECTIONS[name]())
+    energy, finished = random_population(3, len(objects.creatures))
+    for creature, e, f in zip(objects.creatures, energy.tolist(), finished.tolist()):
+        creature.energy = e
+        creature.task_finished = f
+    arrays = BatchSimulation(FIELD, seed=3, start={'count': 40}, selection=SELECTIONS[name]())
+    arrays.creatures = objects.creatures
+    arrays.np_rng.bit_generator.state = objects.np_rng.bit_generator.state
+    objects.next_generation()
+    arrays.next_generation()
+    expected = Population.from_creatures(objects.creatures)
+    result = arrays.population
+    births = (finished & (energy >= REPRODUCE_ENERGY)).sum()
+    assert len(result) == len(expected) == finished.sum() + births
+    np.testing.assert_array_equal(result.positions, expected.positions)
+    np.testing.assert_array_equal(result.headings, expected.headings)
+    np.testing.assert_array_equal(result.energy, expected.energy)
+    np.testing.assert_array_equal(result.genes(), expected.genes())
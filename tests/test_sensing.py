@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from Observer import Observer
+from Population import FoodBatch
+from Sensing import PointGrid, brute_nearest, sense
+from Sim import BatchSimulation
+from MapUtils import Vector
+import numpy as np
+import pytest
+
+FIELD = (Vector(0, 0), Vector(100, 100))
+
+def brute_within(centers, positions, radii, mask):
+    pairs = []
+    for q, (center, radius) in enumerate(zip(centers, np.broadcast_to(radii, len(centers)))):
+        distance = np.hypot(*(positions - center).T)
+        for p in np.flatnonzero((distance <= radius) & mask):
+            pairs.append((q, p, distance[p]))
+    return sorted(pairs)
+
+def cases():
+    # Random points, some rounded so there are exact ties, some all on a line
+    rng = np.random.default_rng(0)
+    for i in range(30):
+        n = int(rng.integers(1, 2000))
+        positions = rng.uniform(0, 100, (n, 2))
+        if i % 3 == 0:
+            positions = np.round(positions)
+        if i % 10 == 1:
+            positions[:, 1] = 50
+        centers = rng.uniform(-10, 110, (int(rng.integers(1, 300)), 2))
+        mask = rng.random(n) < 0.8
+        yield positions, centers, mask, rng
+
+@pytest.mark.parametrize('limited', [False, True])
+def test_nearest_matches_brute_force(limited):
+    for positions, centers, mask, rng in cases():
+        max_dist = rng.uniform(0, 30, len(centers)) if limited else None
+        for grid in (PointGrid(positions), PointGrid(positions, FIELD)):
+            closest, distance = grid.nearest(centers, max_dist, mask)
+            expected, expected_distance = brute_nearest(centers, positions, np.flatnonzero(mask), max_dist)
+            np.testing.assert_array_equal(closest, expected)
+            np.testing.assert_allclose(distance, expected_distance)
+
+def test_within_matches_brute_force():
+    for positions, centers, mask, rng in cases():
+        radii = rng.uniform(0, 15, len(centers))
+        query, point, distance = PointGrid(positions, FIELD).within(centers, radii, mask)
+        assert np.all(np.diff(query) >= 0)
+        found = sorted(zip(query.tolist(), point.tolist(), distance.tolist()))
+        expected = brute_within(centers, positions, radii, mask)
+        assert [(q, p) for q, p, _ in found] == [(q, p) for q, p, _ in expected]
+        np.testing.assert_allclose([d for *_, d in found], [d for *_, d in expected])
+
+def test_food_batch_grid_matches_brute_force():
+    rng = np.random.default_rng(1)
+    food = FoodBatch(rng.uniform(0, 100, (3000, 2)), np.zeros(3000), np.ones(3000))
+    points = rng.uniform(0, 100, (400, 2))
+    # Eat in rounds so the grid gets rebuilt along the way
+    for _ in range(4):
+        food.alive[rng.choice(len(food.alive), 500, replace=False)] = False
+        closest, distance = food.nearest(points, 8.0)
+        expected, expected_distance = brute_nearest(points, food.positions, np.flatnonzero(food.alive), 8.0)
+        np.testing.assert_array_equal(closest, expected)
+        np.testing.assert_allclose(distance, expected_distance)
+        point, index, _ = food.within(points, 5.0)
+        assert food.alive[index].all()
+        assert np.all(np.hypot(*(food.positions[index] - points[point]).T) <= 5.0)
+
+def test_sense_finds_food_and_other_creatures():
+    sim = BatchSimulation(FIELD, seed=0, start={'count': 200, 'food': 300, 'sense': 12})
+    population, food = sim.population, sim.food_batch
+    population.positions[:] = sim.np_rng.uniform(0, 100, (len(population), 2))
+    population.energy[::7] = 0
+    food.alive[::5] = False
+    sensed = sense(population, food, sim.field_space)
+    idx = population.active_indices
+    centers = population.positions[idx]
+
+    expected = brute_within(centers, food.positions, 12, food.alive)
+    found = sorted(zip(*sensed.food))
+    assert [(c, f) for c, f, _ in found] == [(idx[q], f) for q, f, _ in expected]
+
+    expected = [(idx[q], p, d) for q, p, d in
+                brute_within(centers, population.positions, 12, population.energy > 0) if idx[q] != p]
+    found = sorted(zip(*sensed.creatures))
+    assert [(c, o) for c, o, _ in found] == [(c, o) for c, o, _ in expected]
+
+class SenseCheck(Observer):
+    def __init__(self):
+        self.ticks = 0
+
+    def on_tick(self, simulation):
+        creature, food, distance = simulation.sensed.food
+        assert np.all(distance <= simulation.population.sense[creature])
+        assert simulation.food_batch.alive[food].all()
+        self.ticks += 1
+
+def test_sensing_option_leaves_results_alone():
+    start = {'count': 40, 'food': 40, 'energy': 2000}
+    plain = BatchSimulation(FIELD, seed=2, start=start)
+    watcher = SenseCheck()
+    sensing = BatchSimulation(FIELD, [watcher], seed=2, start=start, sensing=True)
+    plain.run(2)
+    sensing.run(2)
+    assert watcher.ticks == sensing.ticks
+    assert sensing.sensed is None
+    np.testing.assert_array_equal(plain.population.positions, sensing.population.positions)
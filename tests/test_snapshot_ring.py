@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from SnapshotRing import SnapshotReader, SnapshotWriter
+from Sim import BatchSimulation
+from MapUtils import Vector
+import numpy as np
+import pytest
+
+FIELD = (Vector(0, 0), Vector(200, 200))
+
+@pytest.fixture
+def ring(tmp_path):
+    writer = SnapshotWriter(str(tmp_path/'ring'), slots=3, creature_capacity=8, food_capacity=8)
+    yield writer
+    writer.close(unlink=True)
+
+def test_reader_sees_the_latest_snapshot(ring):
+    sim = BatchSimulation(FIELD, [ring], seed=0, start={'count': 5, 'food': 6})
+    for _ in range(10):
+        sim.tick_once()
+    reader = SnapshotReader(ring.path)
+    try:
+        assert reader.field_space == FIELD
+        frame = reader.read()
+        assert frame.sequence == ring.sequence
+        assert (frame.generation, frame.tick) == (sim.generation, sim.ticks)
+        snapshot, expected = frame.snapshot(), sim.snapshot()
+        np.testing.assert_array_equal(snapshot.creature_positions, expected.creature_positions)
+        np.testing.assert_array_equal(snapshot.creature_headings, expected.creature_headings)
+        np.testing.assert_array_equal(snapshot.food_positions, expected.food_positions)
+        np.testing.assert_array_equal(frame.creatures['energy'], sim.population.energy)
+        assert not reader.closed
+    finally:
+        reader.close()
+
+def test_overwritten_views_are_invalid(ring):
+    sim = BatchSimulation(FIELD, [ring], seed=0, start={'count': 5, 'food': 6})
+    sim.tick_once()
+    positions = sim.population.positions.copy()
+    reader = SnapshotReader(ring.path)
+    try:
+        frame = reader.latest()
+        copied = reader.read()
+        assert reader.valid(frame)
+        # Going once round the ring reuses the slot, the copy is unaffected
+        for _ in range(ring.slots):
+            sim.tick_once()
+        assert not reader.valid(frame)
+        np.testing.assert_array_equal(copied.creatures['positions'], positions)
+    finally:
+        del frame
+        reader.close()
+
+def test_reader_follows_a_grown_ring(ring):
+    sim = BatchSimulation(FIELD, [ring], seed=0, start={'count': 5, 'food': 6})
+    sim.tick_once()
+    reader = SnapshotReader(ring.path)
+    try:
+        assert reader.read().tick == 1
+        # More food than the ring was made for, so it is replaced
+        sim.respawn_food(50)
+        sim.tick_once()
+        frame = reader.read()
+        assert frame.tick == 2
+        assert len(frame.food['positions']) == sim.food_remaining()
+    finally:
+        reader.close()
+
+def test_closed_flag(ring):
+    sim = BatchSimulation(FIELD, [ring], seed=0, start={'count': 5, 'food': 6})
+    sim.tick_once()
+    reader = SnapshotReader(ring.path)
+    try:
+        ring.close()
+        assert reader.closed
+        assert reader.read().tick == 1
+    finally:
+        reader.close()
+
+def test_nothing_published_yet(ring):
+    ring._create(FIELD, 4, 4)
+    reader = SnapshotReader(ring.path)
+    try:
+        assert reader.latest() is None and reader.read() is None
+    finally:
+        reader.close()
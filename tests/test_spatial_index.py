@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from Creature import Food
+from MapUtils import Vector, RadianAngle
+from SpatialIndex import FoodGrid
+from random import Random
+import math
+import pytest
+
+FIELD = (Vector(0, 0), Vector(200, 100))
+
+def random_food(rng: Random, n: int):
+    return [Food(Vector(rng.uniform(0, 200), rng.uniform(0, 100)), RadianAngle(0)) for _ in range(n)]
+
+def brute_nearest(foods, position: Vector, max_dist: float = None):
+    best, best_dist = None, math.inf
+    for food in foods:
+        d = math.hypot(position.x - food.position.x, position.y - food.position.y)
+        if d < best_dist:
+            best, best_dist = food, d
+    if max_dist is not None and best_dist > max_dist:
+        return None, math.inf
+    return best, best_dist
+
+@pytest.mark.parametrize('count', [1, 7, 200])
+@pytest.mark.parametrize('max_dist', [None, 5.0, 30.0])
+def test_nearest_matches_brute_force(count, max_dist):
+    rng = Random(count)
+    foods = random_food(rng, count)
+    grid = FoodGrid(FIELD, foods)
+    for _ in range(200):
+        # Some queries from outside the field too
+        position = Vector(rng.uniform(-20, 220), rng.uniform(-20, 120))
+        food, dist = grid.nearest(position, max_dist)
+        expected, expected_dist = brute_nearest(foods, position, max_dist)
+        assert dist == pytest.approx(expected_dist)
+        if expected is None:
+            assert food is None
+        else:
+            assert food.position == expected.position
+
+def test_nearest_after_removal():
+    rng = Random(1)
+    foods = random_food(rng, 100)
+    grid = FoodGrid(FIELD, foods)
+    for food in foods[::2]:
+        grid.remove(food)
+    left = foods[1::2]
+    assert len(grid) == len(left)
+    assert set(map(id, grid)) == set(map(id, left))
+    for _ in range(100):
+        position = Vector(rng.uniform(0, 200), rng.uniform(0, 100))
+        assert grid.nearest(position)[1] == pytest.approx(brute_nearest(left, position)[1])
+
+def test_empty_grid():
+    grid = FoodGrid(FIELD)
+    assert grid.nearest(Vector(10, 10)) == (None, math.inf)
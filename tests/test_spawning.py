@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from Spawning import FoodSpawner, UniformSpawner, PatchSpawner, DensitySpawner
+from MapUtils import Vector
+import numpy as np
+import pytest
+import math
+
+# Off the origin and not square so mixed up axes show
+FIELD = (Vector(10, 20), Vector(210, 120))
+# The inner 80% of FIELD
+LO, HI = np.array((30., 30.)), np.array((190., 110.))
+
+SPAWNERS = [
+    UniformSpawner(),
+    PatchSpawner(),
+    PatchSpawner(patches=2, spread=0.5),
+    DensitySpawner(np.random.default_rng(0).random((4, 7))),
+]
+
+@pytest.mark.parametrize('spawner', SPAWNERS, ids=lambda s: type(s).__name__)
+def test_inside_inner_field(spawner):
+    positions, angles = spawner.spawn(FIELD, 2000, np.random.default_rng(1))
+    assert positions.shape == (2000, 2) and angles.shape == (2000,)
+    assert (positions >= LO).all() and (positions <= HI).all()
+    assert (angles >= 0).all() and (angles < 2*math.pi).all()
+
+@pytest.mark.parametrize('spawner', SPAWNERS, ids=lambda s: type(s).__name__)
+def test_nothing_to_spawn(spawner):
+    positions, angles = spawner.spawn(FIELD, 0, np.random.default_rng(1))
+    assert positions.shape == (0, 2) and angles.shape == (0,)
+
+@pytest.mark.parametrize('spawner', SPAWNERS, ids=lambda s: type(s).__name__)
+def test_seeded(spawner):
+    a = spawner.spawn(FIELD, 50, np.random.default_rng(7))
+    b = spawner.spawn(FIELD, 50, np.random.default_rng(7))
+    for x, y in zip(a, b):
+        np.testing.assert_array_equal(x, y)
+
+def cell_counts(positions: np.ndarray, shape) -> np.ndarray:
+    rows, columns = shape
+    i = np.floor((positions[:, 0] - LO[0])/(HI[0] - LO[0])*columns).astype(int)
+    j = np.floor((positions[:, 1] - LO[1])/(HI[1] - LO[1])*rows).astype(int)
+    counts = np.zeros(shape, dtype=int)
+    np.add.at(counts, (j, i), 1)
+    return counts
+
+def test_density_rows_are_y_and_columns_are_x():
+    density = np.zeros((2, 3))
+    density[0, 2] = 1
+    positions, _ = DensitySpawner(density).spawn(FIELD, 500, np.random.default_rng(2))
+    # Low y, high x
+    assert (positions[:, 0] >= LO[0] + (HI[0] - LO[0])*2/3).all()
+    assert (positions[:, 1] <= LO[1] + (HI[1] - LO[1])/2).all()
+
+def test_density_skips_empty_cells():
+    # Empty cells first, last and in between, where an off by one in the
+    # cell search would put food
+    density = np.array([[0, 1, 0, 0],
+                        [2, 0, 0, 1],
+                        [0, 0, 3, 0]], dtype=float)
+    positions, _ = DensitySpawner(density).spawn(FIELD, 5000, np.random.default_rng(3))
+    counts = cell_counts(positions, density.shape)
+    assert not counts[density == 0].any()
+    np.testing.assert_allclose(counts/counts.sum(), density/density.sum(), atol=0.02)
+
+def test_density_validation():
+    for density in (np.ones(3), -np.ones((2, 2)), np.zeros((2, 2))):
+        with pytest.raises(ValueError):
+            DensitySpawner(density)
+
+def test_spawn_is_abstract():
+    with pytest.raises(TypeError):
+        FoodSpawner()
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from Sweep import make_configs, run_trial, sweep, write_table
+from Sim import DEFAULT_START
+import csv
+
+def test_make_configs_expands_starts_and_seeds():
+    starts = [{'count': 5}, {'count': 8, 'sense': 30}]
+    configs = make_configs([3, 4, 5], 2, starts, width=80, batched=True)
+    assert len(configs) == 6
+    assert [c['trial'] for c in configs] == list(range(6))
+    # Every seed for the first settings, then every seed for the next
+    assert [(c['start']['count'], c['seed']) for c in configs] == \
+        [(5, 3), (5, 4), (5, 5), (8, 3), (8, 4), (8, 5)]
+    assert configs[0]['start'] == {**DEFAULT_START, 'count': 5}
+    assert configs[3]['start']['sense'] == 30
+    assert all(c['width'] == 80 and c['height'] == 200 and c['batched'] for c in configs)
+
+def test_results_do_not_depend_on_process_count(tmp_path):
+    configs = make_configs(range(3), 2, [{'count': 6, 'food': 10}, {'count': 10, 'food': 10}],
+                           width=80, height=80, batched=True)
+    serial = [row for config in configs for row in run_trial(config)]
+    assert len(serial) == 3*len(configs)
+    assert sweep(configs, 1) == serial
+    assert sweep(configs, 3) == serial
+
+    path = str(tmp_path/'sweep.csv')
+    write_table(serial, path)
+    with open(path, newline='') as f:
+        table = list(csv.DictReader(f))
+    assert len(table) == len(serial)
+    assert [int(row['trial']) for row in table] == [row['trial'] for row in serial]
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from Observer import Observer
+from Telemetry import (CREATURE_DIED, CREATURE_FINISHED, DROP_NEWEST, FOOD_EATEN, GENERATION,
+                       TICK, EventStream)
+from Sim import Simulation, BatchSimulation
+from Checkpoint import save_checkpoint, load_checkpoint
+from MapUtils import Vector
+import asyncio
+import pytest
+
+FIELD = (Vector(0, 0), Vector(60, 60))
+
+class EatenCount(Observer):
+    # Food eaten going by food_remaining, tick by tick
+    def __init__(self):
+        self.eaten = 0
+        self.before = None
+
+    def on_tick(self, simulation):
+        self.eaten += self.before - simulation.food_remaining()
+        self.before = simulation.food_remaining()
+
+    def on_generation(self, simulation):
+        self.before = simulation.food_remaining()
+
+async def drain(subscription):
+    return [event async for event in subscription]
+
+def run_with(sim_class, seed, steer, resume=None):
+    # Runs the simulation (or carries on from the checkpoint at resume) on
+    # the event loop's thread, steer(sim, stream) is called before every
+    # tick and can subscribe
+    async def main():
+        stream = EventStream()
+        count = EatenCount()
+        if resume:
+            sim = load_checkpoint(resume, [count, stream])
+        else:
+            sim = sim_class(FIELD, [count, stream], seed=seed)
+        count.before = sim.food_remaining()
+        subscriptions = []
+        for generation in range(4):
+            while not sim.generation_finished():
+                subscriptions += steer(sim, stream)
+                sim.tick_once()
+            sim.next_generation()
+            sim.notify('on_generation')
+        stream.close()
+        await asyncio.sleep(0)
+        return count, [await drain(s) for s in subscriptions]
+    return asyncio.run(main())
+
+@pytest.mark.parametrize('sim_class', [Simulation, BatchSimulation])
+@pytest.mark.parametrize('seed', [0, 3])
+def test_every_eaten_food_reported_once(sim_class, seed):
+    def steer(sim, stream):
+        return [stream.subscribe([FOOD_EATEN], maxsize=100000)] if sim.ticks == 0 else []
+    count, (events,) = run_with(sim_class, seed, steer)
+    assert len(events) == count.eaten
+    keys = [(e.generation, e.data['food']) for e in events]
+    assert len(set(keys)) == len(keys)
+
+@pytest.mark.parametrize('sim_class', [Simulation, BatchSimulation])
+def test_resumed_run_reports_from_its_first_tick(tmp_path, sim_class):
+    path = str(tmp_path/'state.npz')
+    sim = sim_class(FIELD, seed=1)
+    sim.run(2)
+    # Half of them die on the first tick after resuming
+    creatures = sim.creatures
+    for creature in creatures[::2]:
+        creature.energy = 1
+    sim.creatures = creatures
+    save_checkpoint(sim, path)
+    first = {}
+    def steer(sim, stream):
+        if not first:
+            first['generation'], first['tick'] = sim.generation, sim.ticks
+            first['population'] = len(sim.creatures)
+            return [stream.subscribe([FOOD_EATEN, CREATURE_FINISHED, CREATURE_DIED], maxsize=100000)]
+        return []
+    count, (events,) = run_with(sim_class, 1, steer, resume=path)
+    assert first['generation'] == 2
+    assert len([e for e in events if e.kind == FOOD_EATEN]) == count.eaten
+    ended = [e for e in events if e.kind != FOOD_EATEN and e.generation == 2]
+    assert sorted(e.data['creature'] for e in ended) == list(range(first['population']))
+
+def test_food_numbered_the_same_on_both_engines():
+    def steer(sim, stream):
+        return [stream.subscribe([FOOD_EATEN], maxsize=100000)] if sim.ticks == 0 else []
+    # Only the first generation, the engines drift apart after that
+    first = []
+    for sim_class in (Simulation, BatchSimulation):
+        _, (events,) = run_with(sim_class, 0, steer)
+        first.append([(e.data['food'], e.data['position']) for e in events if e.generation == 0][:5])
+    assert first[0] == first[1]
+
+@pytest.mark.parametrize('sim_class', [Simulation, BatchSimulation])
+def test_late_subscriber_gets_no_backlog(sim_class):
+    late = {}
+    def steer(sim, stream):
+        if sim.generation == 1 and not late and sim.food_remaining() < len(sim.creatures)//2:
+            late['tick'] = sim.ticks
+            return [stream.subscribe([FOOD_EATEN, CREATURE_FINISHED, CREATURE_DIED], maxsize=100000)]
+        return []
+    _, (events,) = run_with(sim_class, 0, steer)
+    assert late
+    assert events and all(e.tick > late['tick'] for e in events)
+    generation_one = [e for e in events if e.generation == 1]
+    assert len(generation_one) < len(events)
+
+def test_drop_newest_keeps_the_first():
+    def steer(sim, stream):
+        return [stream.subscribe([TICK], maxsize=5, overflow=DROP_NEWEST)] if sim.ticks == 0 else []
+    _, (events,) = run_with(BatchSimulation, 0, steer)
+    assert [e.tick for e in events] == [1, 2, 3, 4, 5]
+
+def test_generation_events():
+    def steer(sim, stream):
+        return [stream.subscribe([GENERATION])] if sim.ticks == 0 else []
+    _, (events,) = run_with(BatchSimulation, 0, steer)
+    assert [e.data['generation'] for e in events] == [1, 2, 3, 4]
+
+def test_unknown_kind():
+    async def main():
+        with pytest.raises(ValueError):
+            EventStream().subscribe(['nope'])
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from Observer import Observer
+from Sim import BatchSimulation
+from Tiling import TiledSimulation, tile_of
+from MapUtils import Vector
+import numpy as np
+import pytest
+
+FIELD = (Vector(0, 0), Vector(300, 300))
+START = {'count': 60, 'food': 80, 'energy': 2000}
+
+def assert_same(tiled, batched):
+    assert tiled.generation == batched.generation and tiled.ticks == batched.ticks
+    a, b = tiled.population, batched.population
+    for name in ('positions', 'headings', 'energy', 'sense', 'size', 'turn_speed', 'move_speed',
+                 'got_food', 'task_finished'):
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name), err_msg=name)
+    np.testing.assert_array_equal(tiled.food_batch.alive, batched.food_batch.alive)
+
+@pytest.mark.parametrize('tiles', [(2, 2), (3, 1)])
+@pytest.mark.parametrize('sense_limited', [False, True])
+def test_matches_batched(tiles, sense_limited):
+    batched = BatchSimulation(FIELD, seed=1, start=START, sense_limited=sense_limited)
+    with TiledSimulation(FIELD, seed=1, start=START, sense_limited=sense_limited, tiles=tiles) as tiled:
+        tiled.run(2)
+        batched.run(2)
+        assert_same(tiled, batched)
+        # And tick by tick part way through a generation
+        for _ in range(25):
+            tiled.tick_once()
+            batched.tick_once()
+            assert_same(tiled, batched)
+
+class ActiveCheck(Observer):
+    def __init__(self):
+        self.ticks = 0
+
+    def on_tick(self, simulation):
+        population = simulation.population
+        np.testing.assert_array_equal(population.active_indices, np.flatnonzero(population.active))
+        self.ticks += 1
+
+def test_active_indices_stay_in_sync():
+    check = ActiveCheck()
+    with TiledSimulation(FIELD, [check], seed=3, start=START, tiles=(2, 2)) as tiled:
+        tiled.run(1)
+    assert check.ticks
+
+def test_state_survives_close():
+    tiled = TiledSimulation(FIELD, seed=2, start=START, tiles=(2, 2))
+    tiled.run(1)
+    while not tiled.generation_finished():
+        tiled.tick_once()
+    finished = tiled.population.task_finished.copy()
+    fed = tiled.population.got_food.copy()
+    assert finished.any()
+    tiled.close()
+    np.testing.assert_array_equal(tiled.population.task_finished, finished)
+    np.testing.assert_array_equal(tiled.population.got_food, fed)
+    assert tiled.generation_finished()
+    with pytest.raises(RuntimeError):
+        tiled.tick_once()
+
+def test_tile_of_clamps_to_the_field():
+    positions = np.array([[0, 0], [299.9, 0], [0, 299.9], [300, 300], [-5, 150], [150, 400]])
+    np.testing.assert_array_equal(tile_of(positions, FIELD, (2, 2)), [0, 1, 2, 3, 2, 3])
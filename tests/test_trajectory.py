@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from Observer import Observer
+from Trajectory import QUANTUM, TURN, TrajectoryReader, TrajectoryWriter
+from Sim import Simulation, BatchSimulation
+from MapUtils import Vector
+from math import pi
+from random import Random
+import numpy as np
+import pytest
+
+FIELD = (Vector(0, 0), Vector(120, 90))
+START = {'count': 15, 'food': 25, 'energy': 3000}
+
+class Recorder(Observer):
+    # Snapshots at the same points the writer writes a frame
+    def __init__(self):
+        self.snapshots = []
+
+    def on_tick(self, simulation):
+        self.snapshots.append(simulation.snapshot())
+
+    def on_generation(self, simulation):
+        self.snapshots.append(simulation.snapshot())
+
+def assert_close(frame, expected):
+    quantum = np.array((120, 90))/QUANTUM
+    assert (frame.generation, frame.tick) == (expected.generation, expected.tick)
+    assert np.all(np.abs(frame.creature_positions - expected.creature_positions) <= quantum/2 + 1e-9)
+    turn = (frame.creature_headings - expected.creature_headings + pi) % (2*pi) - pi
+    assert np.all(np.abs(turn) <= pi/TURN + 1e-9)
+    # Food is compared as a set, the object engine doesn't keep its order
+    found = np.sort(np.round(frame.food_positions/quantum), axis=0)
+    wanted = np.sort(np.round(expected.food_positions/quantum), axis=0)
+    assert np.all(np.abs(found - wanted) <= 1)
+
+@pytest.fixture(params=[Simulation, BatchSimulation])
+def recorded(request, tmp_path):
+    path = str(tmp_path/'run.traj')
+    recorder = Recorder()
+    with TrajectoryWriter(path, keyframe_every=7) as writer:
+        sim = request.param(FIELD, [writer, recorder], seed=3, start=START)
+        sim.run(3)
+    return TrajectoryReader(path), recorder.snapshots
+
+def test_replay_in_order(recorded):
+    reader, snapshots = recorded
+    assert len(reader) == len(snapshots)
+    for i, expected in enumerate(snapshots):
+        assert_close(reader.frame(i), expected)
+
+def test_seeking(recorded):
+    reader, snapshots = recorded
+    frames = list(range(len(snapshots)))
+    Random(0).shuffle(frames)
+    for i in frames[:60]:
+        assert_close(reader.frame(i), snapshots[i])
+
+def test_generations(recorded):
+    reader, snapshots = recorded
+    assert reader.generations.tolist() == [0, 1, 2, 3]
+    for generation in range(4):
+        start = reader.generation_start(generation)
+        assert reader.generation_of(start) == generation
+        assert snapshots[start].generation == generation
+
+def test_cut_short(tmp_path):
+    path = str(tmp_path/'run.traj')
+    with TrajectoryWriter(path) as writer:
+        BatchSimulation(FIELD, [writer], seed=3, start=START).run(1)
+    whole = TrajectoryReader(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-5])
+    cut = TrajectoryReader(path)
+    assert len(cut) == len(whole) - 1
+    np.testing.assert_array_equal(cut.frame(len(cut) - 1).creature_positions,
+                                  whole.frame(len(cut) - 1).creature_positions)
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from MapUtils import TrigTable, UnitHeading, Vector
+from Sim import BatchSimulation
+from Tiling import TiledSimulation
+from types import SimpleNamespace
+import MapUtils
+from math import cos, sin, pi
+import numpy as np
+import pickle
+import pytest
+
+@pytest.mark.parametrize('bits', [8, 16])
+def test_table_accuracy(bits):
+    table = TrigTable(bits)
+    angles = np.random.default_rng(0).uniform(-20, 20, 100000)
+    c, s = table.cos_sin(angles)
+    # Off by at most half a table step, wherever the angle is
+    error = pi/(1 << bits)
+    assert np.max(np.abs(c - np.cos(angles))) <= error
+    assert np.max(np.abs(s - np.sin(angles))) <= error
+
+def test_table_pickles_small():
+    table = TrigTable()
+    data = pickle.dumps(table)
+    assert len(data) < 200
+    copy = pickle.loads(data)
+    np.testing.assert_array_equal(copy.cos, table.cos)
+
+class Heading(UnitHeading):
+    def __init__(self, heading: float):
+        self.heading = heading
+
+def test_heading_vector_follows_heading(monkeypatch):
+    calls = []
+    def counted_cos(x):
+        calls.append(x)
+        return cos(x)
+    monkeypatch.setattr(MapUtils, 'math', SimpleNamespace(cos=counted_cos, sin=sin))
+    thing = Heading(0.5)
+    assert thing.heading_vector() == (cos(0.5), sin(0.5))
+    assert thing.heading_vector() == (cos(0.5), sin(0.5))
+    thing.heading = 2.0
+    assert thing.heading_vector() == (cos(2.0), sin(2.0))
+    # Worked out again only when the heading changed
+    assert calls == [0.5, 2.0]
+
+def test_tiled_matches_batched_with_table():
+    field = (Vector(0, 0), Vector(200, 200))
+    start = {'count': 30, 'food': 40, 'energy': 2000}
+    batched = BatchSimulation(field, seed=0, start=start, trig_table=True)
+    with TiledSimulation(field, seed=0, start=start, tiles=(2, 2), trig_table=True) as tiled:
+        tiled.run(2)
+        batched.run(2)
+        np.testing.assert_array_equal(tiled.population.positions, batched.population.positions)
+        np.testing.assert_array_equal(tiled.population.energy, batched.population.energy)